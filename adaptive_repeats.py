@@ -0,0 +1,230 @@
+"""
+Adaptive repetition of benchmark scenarios.
+
+Agent runs are non-deterministic, so one run per scenario is a noisy
+estimate. Instead of repeating every scenario a fixed number of times,
+AdaptiveScheduler runs each scenario min_repeats times, then keeps giving
+the next run to the scenario whose key metrics have the widest bootstrap
+confidence interval (relative to their mean), until every scenario's CI is
+narrower than the target, reaches max_repeats, or the run/time budget is
+spent. The per-run samples are written in the format regression_gate.py
+reads, so an adaptive run can be gated directly.
+
+Used by ciso_vllm_benchmark.py and sre_benchmark_runner.py (--adaptive).
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Metrics whose confidence intervals decide when a scenario has enough runs
+DEFAULT_CONVERGENCE_METRICS = [
+    "end_to_end_latency_ms",
+    "llm_stats.total_calls",
+    "llm_stats.total_input_tokens",
+    "llm_stats.total_output_tokens",
+]
+
+SAMPLES_FILENAME = "repeat_samples.json"
+
+
+@dataclass
+class RepeatPolicy:
+    """When to stop repeating scenarios."""
+    metrics: List[str] = field(default_factory=lambda: list(DEFAULT_CONVERGENCE_METRICS))
+    min_repeats: int = 3
+    max_repeats: int = 10
+    # Stop once every metric's CI is at most this wide, in percent of its mean
+    target_ci_width_percent: float = 20.0
+    confidence: float = 0.95
+    resamples: int = 2000
+    # Total runs / wall time across all scenarios (None = unlimited)
+    budget_runs: Optional[int] = None
+    budget_seconds: Optional[float] = None
+    seed: int = 0
+
+
+def bootstrap_mean_ci(values: List[float], confidence: float, resamples: int,
+                      rng: random.Random) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of the mean."""
+    means = sorted(sum(rng.choices(values, k=len(values))) / len(values) for _ in range(resamples))
+    tail = (1 - confidence) / 2
+    return means[int(tail * (resamples - 1))], means[int(math.ceil((1 - tail) * (resamples - 1)))]
+
+
+class AdaptiveScheduler:
+    """Decides which scenario runs next, from the metrics of the runs so far."""
+
+    def __init__(self, scenarios: List[str], policy: RepeatPolicy):
+        self.scenarios = list(scenarios)
+        self.policy = policy
+        self.samples: Dict[str, Dict[str, List[float]]] = {s: {} for s in scenarios}
+        self.attempts = {s: 0 for s in scenarios}
+        self.failures = {s: 0 for s in scenarios}
+        self.total_runs = 0
+        self.started = time.monotonic()
+
+    def runs(self, scenario: str) -> int:
+        """Successful runs of a scenario."""
+        return self.attempts[scenario] - self.failures[scenario]
+
+    def ci_width_percent(self, scenario: str) -> Optional[Dict[str, float]]:
+        """
+        Relative CI width of each convergence metric, or None with fewer than
+        two runs. A metric missing from every run is not considered.
+        """
+        if self.runs(scenario) < 2:
+            return None
+        # Same seed on every call, so the same samples always give the same widths
+        rng = random.Random(self.policy.seed)
+        widths = {}
+        for name in self.policy.metrics:
+            values = self.samples[scenario].get(name)
+            if not values or len(values) < 2:
+                continue
+            low, high = bootstrap_mean_ci(values, self.policy.confidence, self.policy.resamples, rng)
+            mean = sum(values) / len(values)
+            if mean:
+                widths[name] = (high - low) / abs(mean) * 100
+            else:
+                widths[name] = 0.0 if high == low else math.inf
+        return widths
+
+    def converged(self, scenario: str) -> bool:
+        if self.runs(scenario) < self.policy.min_repeats:
+            return False
+        widths = self.ci_width_percent(scenario)
+        return widths is not None and all(w <= self.policy.target_ci_width_percent for w in widths.values())
+
+    def budget_left(self) -> bool:
+        if self.policy.budget_runs is not None and self.total_runs >= self.policy.budget_runs:
+            return False
+        if (self.policy.budget_seconds is not None
+                and time.monotonic() - self.started >= self.policy.budget_seconds):
+            return False
+        return True
+
+    def next_scenario(self) -> Optional[str]:
+        """The scenario to run next, or None when all have converged or the budget is spent."""
+        if not self.budget_left():
+            return None
+        open_scenarios = [s for s in self.scenarios if self.attempts[s] < self.policy.max_repeats]
+        # Every scenario first gets its minimum number of runs, round-robin
+        below_min = [s for s in open_scenarios if self.runs(s) < self.policy.min_repeats]
+        if below_min:
+            return min(below_min, key=lambda s: self.attempts[s])
+        widest, widest_width = None, -1.0
+        for scenario in open_scenarios:
+            if self.converged(scenario):
+                continue
+            widths = self.ci_width_percent(scenario) or {}
+            width = max(widths.values(), default=math.inf)
+            if width > widest_width:
+                widest, widest_width = scenario, width
+        return widest
+
+    def record(self, scenario: str, metrics: Optional[Dict[str, float]]) -> None:
+        """Add a run's metrics (None for a failed run, which still uses up a repeat)."""
+        self.attempts[scenario] += 1
+        self.total_runs += 1
+        if metrics is None:
+            self.failures[scenario] += 1
+            return
+        for name, value in metrics.items():
+            self.samples[scenario].setdefault(name, []).append(value)
+
+    def print_status(self) -> None:
+        print(f"\n--- Adaptive Repeats ({self.total_runs} runs, "
+              f"{(time.monotonic() - self.started) / 3600:.2f} h) ---")
+        for scenario in self.scenarios:
+            widths = self.ci_width_percent(scenario)
+            if widths:
+                widest = max(widths, key=widths.get)
+                detail = f"widest CI {widths[widest]:.1f}% ({widest})"
+            else:
+                detail = "CI needs 2+ runs"
+            state = "converged" if self.converged(scenario) else "open"
+            failed = f", {self.failures[scenario]} failed" if self.failures[scenario] else ""
+            print(f"  {scenario}: {self.runs(scenario)} runs{failed}, {detail}, {state}")
+
+    def save(self, path: str) -> None:
+        """Write the samples as a regression_gate.py baseline, plus the stopping state."""
+        with open(path, "w") as f:
+            json.dump({
+                "baseline_samples": self.samples,
+                "runs": {s: self.runs(s) for s in self.scenarios},
+                "failures": self.failures,
+                "converged": {s: self.converged(s) for s in self.scenarios},
+                "policy": {"metrics": self.policy.metrics,
+                           "target_ci_width_percent": self.policy.target_ci_width_percent,
+                           "confidence": self.policy.confidence},
+            }, f, indent=2)
+
+
+def analyze_repeat(dump_path: str, export_path: str) -> Optional[Dict[str, float]]:
+    """
+    Analyze one run's observation dump, export its TraceMetrics next to it
+    and return them flattened to dotted names, or None if it has no dump.
+    """
+    from analyze_traces import analyze_trace, export_metrics
+    from results_store import flatten_metrics
+
+    try:
+        metrics = analyze_trace(dump_path)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Could not analyze {dump_path}: {e}")
+        return None
+    export_metrics(metrics, export_path)
+    return flatten_metrics(metrics.to_dict())
+
+
+def run_adaptive(scenarios: List[str], run_once: Callable[[str, int], Optional[Dict[str, float]]],
+                 policy: RepeatPolicy, samples_path: Optional[str] = None) -> AdaptiveScheduler:
+    """
+    Repeat scenarios until they converge or the budget runs out. run_once
+    gets the scenario and its 1-based repeat number and returns the run's
+    metrics, or None if the run failed. Samples are saved after every run.
+    """
+    scheduler = AdaptiveScheduler(scenarios, policy)
+    while True:
+        scenario = scheduler.next_scenario()
+        if scenario is None:
+            break
+        repeat = scheduler.attempts[scenario] + 1
+        print(f"\n[INFO] Adaptive run {scheduler.total_runs + 1}: {scenario} repeat {repeat}")
+        scheduler.record(scenario, run_once(scenario, repeat))
+        scheduler.print_status()
+        if samples_path:
+            scheduler.save(samples_path)
+    if not scheduler.budget_left():
+        print("[INFO] Repeat budget exhausted")
+    unconverged = [s for s in scenarios if not scheduler.converged(s)]
+    if unconverged:
+        print(f"[WARN] Not converged: {', '.join(unconverged)}")
+    return scheduler
+
+
+def add_repeat_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("adaptive repeats")
+    group.add_argument("--adaptive", action="store_true",
+                       help="repeat scenarios until their metric CIs converge or the budget is spent")
+    group.add_argument("--min-repeats", type=int, default=RepeatPolicy.min_repeats)
+    group.add_argument("--max-repeats", type=int, default=RepeatPolicy.max_repeats)
+    group.add_argument("--target-ci-width", type=float, default=RepeatPolicy.target_ci_width_percent,
+                       help="target CI width, in percent of the metric's mean")
+    group.add_argument("--budget-runs", type=int, help="total runs across all scenarios")
+    group.add_argument("--budget-hours", type=float, help="total wall time across all scenarios")
+
+
+def policy_from_args(args: argparse.Namespace) -> RepeatPolicy:
+    return RepeatPolicy(
+        min_repeats=args.min_repeats,
+        max_repeats=args.max_repeats,
+        target_ci_width_percent=args.target_ci_width,
+        budget_runs=args.budget_runs,
+        budget_seconds=args.budget_hours * 3600 if args.budget_hours is not None else None,
+    )
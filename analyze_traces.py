@@ -1,42 +1,1142 @@
+import ast
 import json
 import os
 import sys
 import math
+import heapq
+import hashlib
 from collections import defaultdict
-from datetime import datetime
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
 import re
 
-# Context window size for Gemini 2.5 Pro
+# Fallback context window size for models missing from MODEL_SPECS
 CONTEXT_WINDOW_SIZE = 1000000
 
+# Per-model context window (tokens) and list price (USD per 1M tokens).
+# Keys are matched as substrings of the lowercased observation model name, so
+# the most specific keys must come first. prefill_tokens_per_sec is only known
+# for the self-hosted vLLM models (rough single-GPU figure) and is used to
+# estimate the latency of re-encoding history; API models leave it as None.
+MODEL_SPECS = [
+    ("gemini-2.5-pro", {'context_window': 1048576, 'input_price': 1.25,
+                        'output_price': 10.0, 'prefill_tokens_per_sec': None}),
+    ("gemini-2.5-flash", {'context_window': 1048576, 'input_price': 0.30,
+                          'output_price': 2.50, 'prefill_tokens_per_sec': None}),
+    ("gpt-4o-mini", {'context_window': 128000, 'input_price': 0.15,
+                     'output_price': 0.60, 'prefill_tokens_per_sec': None}),
+    ("gpt-4o", {'context_window': 128000, 'input_price': 2.50,
+                'output_price': 10.0, 'prefill_tokens_per_sec': None}),
+    # Served locally through vLLM with VLLM_CONFIG['context_window']
+    ("qwen2.5-14b-instruct", {'context_window': 32768, 'input_price': 0.0,
+                              'output_price': 0.0, 'prefill_tokens_per_sec': 4000}),
+    ("qwen2.5-7b-instruct", {'context_window': 32768, 'input_price': 0.0,
+                             'output_price': 0.0, 'prefill_tokens_per_sec': 8000}),
+]
 
-def load_and_print_observations(json_path, output_json_path=None):
+DEFAULT_MODEL_SPEC = {'context_window': CONTEXT_WINDOW_SIZE, 'input_price': 0.0,
+                      'output_price': 0.0, 'prefill_tokens_per_sec': None}
+
+# Root span of a CrewAI run, e.g. "Crew_1a2b-3c4d.kickoff"
+CREW_KICKOFF_PATTERN = r'^(Crew_[A-Za-z0-9]+(-[A-Za-z0-9]+)*\.kickoff)$'
+
+# Number of spans listed in the self-time breakdown
+TOP_SELF_TIME_SPANS = 10
+
+# Number of idle gaps listed in the timeline breakdown
+TOP_IDLE_GAPS = 10
+
+# Number of repeated tool calls listed in the duplicate breakdown
+TOP_DUPLICATE_TOOL_CALLS = 10
+
+# Number of tool batches listed in the parallel tool call breakdown
+TOP_PARALLEL_TOOL_BATCHES = 10
+
+# Number of evenly spaced calls printed from the input token growth curve
+TOKEN_GROWTH_POINTS = 10
+
+# Commands that change cluster or workspace state
+MUTATING_COMMAND_RE = re.compile(
+    r"\b(kubectl\s+(apply|create|delete|patch|edit|replace|scale|rollout|label|annotate|set|drain|cordon|uncordon)"
+    r"|helm\s+(install|upgrade|uninstall|rollback)"
+    r"|kyverno\s+apply|opa\s+run)\b"
+)
+
+# Error categories of tool and LLM outputs, most specific first. All of them
+# are matched in one pass of ERROR_RE; "other" only catches generic markers.
+ERROR_CATEGORY_PATTERNS = [
+    ("timeout", r"timed out|deadline exceeded|i/o timeout|request timeout|timeout (?:error|expired|exceeded)"),
+    ("auth", r"unauthori[sz]ed|forbidden|permission denied|access denied|not authorized"
+             r"|invalid api key|authentication failed"),
+    ("not_found", r"not found|no such file or directory|does not exist"),
+    ("policy_rejected", r"admission webhook|denied the request|policy violation|violates polic|blocked by polic"),
+    ("llm_format", r"invalid format|i did it wrong|could not parse|failed to parse|outputparserexception"
+                   r"|jsondecodeerror|invalid json"),
+    ("other", r"^\s*(?:error|exception|fatal|traceback)\b|\berror:|\bexception:|error from server"
+              r"|\bfailed with\b|exit (?:code|status):? [1-9]"),
+]
+ERROR_RE = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in ERROR_CATEGORY_PATTERNS),
+                      re.IGNORECASE | re.MULTILINE)
+# Observation statuses that mark a failed call
+ERROR_STATUSES = ("error", "failed", "failure")
+ERROR_CATEGORY_RANK = {name: rank for rank, (name, _) in enumerate(ERROR_CATEGORY_PATTERNS)}
+
+# Only this many characters from each end of a large output are scanned for errors
+ERROR_WINDOW_CHARS = 4096
+
+NS_PER_MS = 1_000_000
+NS_PER_SEC = 1_000_000_000
+
+# Langfuse timestamps, e.g. "2025-11-01T12:00:00.123456Z" or "...+00:00"
+ISO_TIMESTAMP_RE = re.compile(
+    r'(\d{4}-\d{2}-\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,9}))?(Z|[+-]\d{2}:?\d{2})?')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Read size when streaming observation dumps
+JSON_CHUNK_SIZE = 1 << 20
+JSON_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+NUMBER_RE = re.compile(r'\d+(\.\d+)?')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def parse_datetime(dt):
+    """Parse a datetime from an ISO format string or return the datetime object."""
+    if dt is None:
+        return None
+    if isinstance(dt, datetime):
+        return dt
+    if isinstance(dt, str):
+        try:
+            return datetime.fromisoformat(dt.replace('Z', '+00:00'))
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+
+_epoch_day_ns = {}  # "YYYY-MM-DD" -> epoch nanoseconds at midnight UTC
+
+
+def parse_timestamp_ns(value):
     """
-    Loads observations from a JSON file and prints them in a readable format using pandas.
+    Convert a timestamp to integer nanoseconds since the epoch.
+
+    Langfuse's fixed ISO format is parsed with one regex match, with the date
+    part cached across calls; anything else goes through parse_datetime.
+    Timestamps without a UTC offset are taken to be UTC.
     """
-    if not os.path.exists(json_path):
-        print(f"Error: File not found at {json_path}")
-        return
+    if isinstance(value, str):
+        match = ISO_TIMESTAMP_RE.fullmatch(value)
+        if match is not None:
+            day, hours, minutes, seconds, fraction, offset = match.groups()
+            day_ns = _epoch_day_ns.get(day)
+            if day_ns is None:
+                try:
+                    day_ns = (date.fromisoformat(day).toordinal() - EPOCH_ORDINAL) * 86400 * NS_PER_SEC
+                except ValueError:
+                    return None
+                _epoch_day_ns[day] = day_ns
+            ns = day_ns + (int(hours) * 3600 + int(minutes) * 60 + int(seconds)) * NS_PER_SEC
+            if fraction:
+                ns += int(fraction.ljust(9, '0'))
+            if offset and offset != 'Z':
+                sign = -1 if offset[0] == '-' else 1
+                offset_minutes = int(offset[1:3]) * 60 + int(offset[-2:])
+                ns -= sign * offset_minutes * 60 * NS_PER_SEC
+            return ns
+    dt = parse_datetime(value)
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * NS_PER_SEC + delta.microseconds * 1000
 
-    print(f"Loading observations from: {json_path}")
+
+def model_spec(model):
+    """Look up the context window and pricing of a model name."""
+    name = (model or "").lower()
+    for key, spec in MODEL_SPECS:
+        if key in name:
+            return spec
+    return DEFAULT_MODEL_SPEC
+
+
+def tool_name_of(observation):
+    """Extract the tool name from a TOOL observation."""
+    tool_name = (observation.get('name') or '').replace('._use', '')
+    if not tool_name:
+        metadata = observation.get('metadata') or {}
+        attributes = metadata.get('attributes') or {}
+        tool_name = attributes.get('tool.name', 'Unknown')
+    return tool_name
+
+
+def classify_error_text(text):
+    """
+    Error category of a tool or LLM output, or None if it shows no error.
+    Large outputs are scanned only in their head and tail, where commands
+    and frameworks report failures.
+    """
+    if not text:
+        return None
+    if len(text) > 2 * ERROR_WINDOW_CHARS:
+        text = text[:ERROR_WINDOW_CHARS] + "\n" + text[-ERROR_WINDOW_CHARS:]
+    best = None
+    for match in ERROR_RE.finditer(text):
+        category = match.lastgroup
+        if best is None or ERROR_CATEGORY_RANK[category] < ERROR_CATEGORY_RANK[best]:
+            best = category
+            if ERROR_CATEGORY_RANK[best] == 0:
+                break
+    return best
+
+
+def observation_errored(obs):
+    """Whether Langfuse marks an observation as failed: ERROR level or an error status."""
+    status = obs.get("status")
+    level = obs.get("level")
+    return ((isinstance(status, str) and status.lower() in ERROR_STATUSES)
+            or (isinstance(level, str) and level.upper() == "ERROR"))
+
+
+def _error_category(*texts):
+    """Category of the first text that shows one, or "other"."""
+    for text in texts:
+        if isinstance(text, str):
+            category = classify_error_text(text)
+            if category:
+                return category
+    return "other"
+
+
+def classify_tool_output(obs):
+    """
+    Error category of a TOOL observation, or None if the call succeeded. A
+    call fails when Langfuse marks it errored or its structured output has a
+    non-zero return code (or stderr without any return code); the output
+    text only picks the category, so "No resources found" in a successful
+    kubectl listing is not an error.
+    """
+    output = obs.get("output")
+    failed = observation_errored(obs)
+    if isinstance(output, dict):
+        return_code = output.get("return_code")
+        stderr = output.get("stderr") or ""
+        if return_code is not None:
+            failed = failed or return_code != 0
+        else:
+            failed = failed or bool(stderr.strip())
+        if failed:
+            return _error_category(stderr, output.get("stdout"), obs.get("status_message"))
+        return None
+    return _error_category(obs.get("status_message"), output) if failed else None
+
+
+def classify_llm_call(obs):
+    """
+    Error category of an LLM call, or None if it succeeded. Only calls
+    Langfuse marks as errored fail; error text in a model's answer is
+    content, not a failure.
+    """
+    if not observation_errored(obs):
+        return None
+    return _error_category(obs.get("status_message"), obs.get("output"))
+
+
+def canonical_tool_arguments(tool_input):
+    """Serialize tool arguments deterministically, independent of key order."""
+    if isinstance(tool_input, str):
+        # CrewAI records the call as "Tool: name, arguments={...}"
+        index = tool_input.find('arguments=')
+        return tool_input[index:] if index >= 0 else tool_input
+    if isinstance(tool_input, dict) and isinstance(tool_input.get('calling'), str):
+        return canonical_tool_arguments(tool_input['calling'])
+    return json.dumps(tool_input, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def loose_tool_arguments(canonical):
+    """Normalize arguments for near-duplicate matching: case, quotes, whitespace and numbers."""
+    loose = canonical.lower().replace('"', '').replace("'", '')
+    loose = NUMBER_RE.sub('#', loose)
+    return WHITESPACE_RE.sub(' ', loose).strip()
+
+
+def _joined_values(value):
+    """The leaf values of nested dicts and lists, joined by spaces."""
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        return ' '.join(_joined_values(v) for v in value)
+    return value if isinstance(value, str) else json.dumps(value, default=str)
+
+
+def tool_argument_values(arguments):
+    """
+    The values of canonical tool arguments joined into one string, e.g.
+    "apply -f x.yaml" for CrewAI's "arguments={'query': 'apply -f x.yaml'}"
+    or for ToolResultCache.wrap's {"args": ["apply", "-f", "x.yaml"], ...}.
+    Arguments that do not parse are returned as they are.
+    """
+    text = arguments[len('arguments='):] if arguments.startswith('arguments=') else arguments
     try:
-        with open(json_path, "r") as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON: {e}")
-        return
-    except Exception as e:
-        print(f"Error reading file: {e}")
-        return
+        parsed = json.loads(text)
+    except ValueError:
+        try:
+            parsed = ast.literal_eval(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            return text
+    if isinstance(parsed, (dict, list)):
+        return _joined_values(parsed)
+    return parsed if isinstance(parsed, str) else text
 
-    if not data:
-        print("No data found in JSON file.")
-        return
 
-    observations = {observation['id']: observation for observation in data}
+def is_mutating_call(tool_name, arguments):
+    """
+    A known state-changing command in the call, e.g. kubectl apply or helm
+    upgrade. The command may be split between the tool name and its
+    arguments, as in a "kubectl" tool called with "apply -f ...":
+
+    >>> is_mutating_call("kubectl", "arguments={'query': 'apply -f policy-1.yaml'}")
+    True
+    >>> is_mutating_call("kubectl", "arguments={'query': 'get pods -n otel-demo'}")
+    False
+    >>> is_mutating_call("shell", '{"command":"helm upgrade checkout ./chart"}')
+    True
+    """
+    return bool(MUTATING_COMMAND_RE.search(f"{tool_name} {tool_argument_values(arguments)}"))
+
+
+def _tool_call_key(tool_name, arguments):
+    return hashlib.blake2b(f"{tool_name}\0{arguments}".encode(), digest_size=16).digest()
+
+
+def analyze_duplicate_tool_calls(spans, top_n=TOP_DUPLICATE_TOOL_CALLS, cache_policy=None):
+    """
+    Detects repeated tool invocations directly from the TOOL observations,
+    without relying on framework-specific "Tool Repeated Usage" spans.
+
+    Every call is indexed by a hash of its tool name and canonical arguments
+    (exact duplicates) and of a loosened form of the arguments that ignores
+    case, quoting, whitespace and numbers (near duplicates). The cacheable
+    calls are the ones tool_cache.ToolResultCache would have served under
+    cache_policy (default: its default policy), so its TTL and invalidation
+    on mutating calls apply. Returns None if the trace has no timed tool calls.
+    """
+    from tool_cache import cached_tool_calls
+
+    tool_calls = sorted(
+        ((start, end, obs) for start, end, obs in spans.values()
+         if span_category(obs) == "tool"),
+        key=lambda c: (c[0], c[1]))
+    if not tool_calls:
+        return None
+
+    cached = set(cached_tool_calls(spans, cache_policy))
+    exact_index = {}  # key -> [tool, arguments, count, wasted_ns]
+    near_index = set()
+    per_tool = defaultdict(lambda: defaultdict(float))
+    totals = defaultdict(float)
+    for start, end, obs in tool_calls:
+        tool_name = obs.tool_name
+        arguments = obs.arguments
+        exact_key = _tool_call_key(tool_name, arguments)
+        near_key = _tool_call_key(tool_name, loose_tool_arguments(arguments))
+        duration = end - start
+
+        stats = per_tool[tool_name]
+        stats['calls'] += 1
+        totals['calls'] += 1
+        if obs.id in cached:
+            for bucket in (stats, totals):
+                bucket['cacheable_calls'] += 1
+                bucket['cacheable_trtt_ms'] += duration / NS_PER_MS
+        entry = exact_index.get(exact_key)
+        if entry is not None:
+            entry[2] += 1
+            entry[3] += duration
+            for bucket in (stats, totals):
+                bucket['exact_duplicates'] += 1
+                bucket['wasted_trtt_ms'] += duration / NS_PER_MS
+        else:
+            exact_index[exact_key] = [tool_name, arguments, 1, 0]
+            if near_key in near_index:
+                for bucket in (stats, totals):
+                    bucket['near_duplicates'] += 1
+                    bucket['near_duplicate_trtt_ms'] += duration / NS_PER_MS
+        near_index.add(near_key)
+
+    def summarize(bucket):
+        summary = {key: bucket.get(key, 0) for key in (
+            'calls', 'exact_duplicates', 'near_duplicates', 'wasted_trtt_ms',
+            'near_duplicate_trtt_ms', 'cacheable_calls', 'cacheable_trtt_ms')}
+        summary['duplicate_rate_percent'] = (
+            summary['exact_duplicates'] / summary['calls'] * 100 if summary['calls'] else None)
+        return summary
+
+    repeated = [entry for entry in exact_index.values() if entry[2] > 1]
+    top = heapq.nlargest(top_n, repeated, key=lambda e: e[3])
+    return dict(
+        summarize(totals),
+        unique_calls=len(exact_index),
+        per_tool={tool: summarize(bucket) for tool, bucket in per_tool.items()},
+        top_duplicates=[{
+            'tool': tool_name,
+            'arguments': arguments[:200],
+            'count': count,
+            'wasted_trtt_ms': wasted / NS_PER_MS,
+        } for tool_name, arguments, count, wasted in top],
+    )
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Observation:
+    """
+    The metric fields of one Langfuse observation.
+
+    Raw observation dicts carry large nested input/output/metadata payloads.
+    Only the fields the analyzer reads are kept here (error checks on outputs
+    are done once at load time), and repeated strings such as ids, names,
+    types and models are interned so every record shares one copy. Start and
+    end times are epoch nanoseconds, or None if missing or unparseable.
+    """
+    __slots__ = (
+        'id', 'parent_id', 'type', 'name', 'model', 'start_ns', 'end_ns',
+        'latency_sec', 'level', 'status', 'has_usage', 'input_tokens',
+        'output_tokens', 'reasoning_tokens', 'total_tokens', 'tool_name',
+        'arguments', 'calling', 'attr_tool_name', 'task_id', 'error_category', 'failed',
+    )
+
+    def __init__(self, obs):
+        self.id = _intern(obs.get("id"))
+        self.parent_id = _intern(obs.get("parent_observation_id"))
+        self.type = _intern(obs.get("type"))
+        self.name = _intern(obs.get("name"))
+        self.model = _intern(obs.get("model"))
+        self.start_ns = parse_timestamp_ns(obs.get("start_time"))
+        self.end_ns = parse_timestamp_ns(obs.get("end_time"))
+        # Langfuse reports latency in seconds
+        self.latency_sec = obs.get("latency")
+        self.level = _intern(obs.get("level"))
+        self.status = _intern(obs.get("status"))
+
+        usage = obs.get("usage_details") or {}
+        self.has_usage = bool(usage)
+        self.input_tokens = usage.get("input", 0)
+        self.output_tokens = usage.get("output", 0)
+        self.reasoning_tokens = usage.get("completion_details.reasoning", 0)
+        self.total_tokens = usage.get("total", 0)
+
+        metadata = obs.get("metadata")
+        attributes = metadata.get("attributes") if isinstance(metadata, dict) else None
+        if not isinstance(attributes, dict):
+            attributes = {}
+        self.attr_tool_name = _intern(attributes.get("tool_name"))
+        self.task_id = None
+        for key, value in attributes.items():
+            if "task_id" in key.lower():
+                self.task_id = _intern(value)
+                break
+
+        # CrewAI records the tool call on the span a "Tool Repeated Usage" hangs off
+        tool_input = obs.get("input")
+        calling = tool_input.get("calling") if isinstance(tool_input, dict) else None
+        self.calling = _intern(calling) if isinstance(calling, str) else None
+
+        self.error_category = None
+        if self.type == "TOOL":
+            self.tool_name = _intern(tool_name_of(obs))
+            self.arguments = _intern(canonical_tool_arguments(tool_input))
+            self.error_category = classify_tool_output(obs)
+            self.failed = self.error_category is not None
+        else:
+            self.tool_name = None
+            self.arguments = None
+            self.failed = False
+        if self.model and self.error_category is None:
+            self.error_category = classify_llm_call(obs)
+
+
+def iter_json_array(f, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yields the elements of a top-level JSON array read from a file object in
+    chunks, so only one element is held as a dict at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    state = "start"
+    while True:
+        pos = JSON_WHITESPACE_RE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            chunk = f.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise json.JSONDecodeError("Expecting '['", buffer, pos)
+            pos += 1
+            state = "first"
+            continue
+        if state == "after":
+            if char == "]":
+                return
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            state = "value"
+            continue
+        if state == "first" and char == "]":
+            return
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        if end is None or (end == len(buffer) and not eof):
+            # The element may continue in the next chunk
+            chunk = f.read(chunk_size)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        yield value
+        pos = end
+        state = "after"
+
+
+def load_observations(json_path):
+    """Load an observations dump as a list of Observation records."""
+    with open(json_path, "r") as f:
+        return [Observation(obs) for obs in iter_json_array(f)]
+
+
+def span_category(observation):
+    """Classify an observation as 'llm', 'tool' or 'framework' time."""
+    if observation.model or observation.type == "GENERATION":
+        return "llm"
+    if observation.type == "TOOL":
+        return "tool"
+    return "framework"
+
+
+def build_span_tree(data):
+    """
+    Builds the span tree of a list of Observation records in a single pass.
+
+    Returns (spans, children, roots) where spans maps observation id to
+    (start_ns, end_ns, observation) for every observation with valid timing,
+    children maps a parent id to its child ids sorted by start time, and roots
+    lists the ids whose parent is missing from the trace.
+    """
+    spans = {}
+    for obs in data:
+        start, end = obs.start_ns, obs.end_ns
+        if start is None or end is None:
+            continue
+        spans[obs.id] = (start, max(end, start), obs)
+
+    children = defaultdict(list)
+    roots = []
+    for obs_id, (_, _, obs) in spans.items():
+        parent_id = obs.parent_id
+        if parent_id and parent_id in spans:
+            children[parent_id].append(obs_id)
+        else:
+            roots.append(obs_id)
+
+    for child_ids in children.values():
+        child_ids.sort(key=lambda c: spans[c][0])
+    roots.sort(key=lambda c: spans[c][0])
+    return spans, children, roots
+
+
+def compute_self_times(spans, children):
+    """
+    Splits every span's duration into child time (union of its children's
+    intervals, clipped to the span) and self time (the remainder).
+
+    Returns a dict of observation id -> (self_ns, child_ns).
+    """
+    result = {}
+    for obs_id, (start, end, _) in spans.items():
+        covered = 0
+        cursor = start
+        # Children are sorted by start time, so one sweep merges their intervals
+        for child_id in children.get(obs_id, ()):
+            child_start, child_end, _ = spans[child_id]
+            child_start = max(child_start, cursor)
+            child_end = min(child_end, end)
+            if child_end > child_start:
+                covered += child_end - child_start
+                cursor = child_end
+        result[obs_id] = (end - start - covered, covered)
+    return result
+
+
+def compute_critical_path(root_id, spans, children):
+    """
+    Walks the critical path of the span tree below root_id.
+
+    Starting at the end of a span, the child that finished last is taken to be
+    on the critical path, then the child that finished last before that one
+    started, and so on. Time not covered by such a child is the span's own
+    (self) time. Returns chronological (obs_id, start_ns, end_ns) segments.
+    """
+    segments = []
+    _, root_end, _ = spans[root_id]
+    stack = [("walk", root_id, root_end)]
+    while stack:
+        kind, obs_id, value = stack.pop()
+        if kind == "self":
+            segments.append((obs_id, value[0], value[1]))
+            continue
+
+        start, end, _ = spans[obs_id]
+        cursor = min(end, value)
+        steps = []  # reverse chronological
+        by_end = sorted(children.get(obs_id, ()),
+                        key=lambda c: spans[c][1], reverse=True)
+        for child_id in by_end:
+            child_start, child_end, _ = spans[child_id]
+            if child_start >= cursor:
+                # Runs concurrently with a child already on the path
+                continue
+            child_end = min(child_end, cursor)
+            if cursor > child_end:
+                steps.append(("self", obs_id, (child_end, cursor)))
+            steps.append(("walk", child_id, child_end))
+            cursor = max(child_start, start)
+        if cursor > start:
+            steps.append(("self", obs_id, (start, cursor)))
+        # Segments are collected newest first, so push the oldest step last
+        stack.extend(reversed(steps))
+
+    segments.reverse()
+    return segments
+
+
+def select_root(spans, roots):
+    """Prefer the crew kickoff span as root, falling back to the earliest root."""
+    return next((r for r in roots
+                 if re.fullmatch(CREW_KICKOFF_PATTERN, spans[r][2].name or "")),
+                roots[0])
+
+
+def analyze_span_tree(spans, children, roots):
+    """
+    Computes critical-path, self-time and parallelism metrics over the tree
+    returned by build_span_tree. Returns None if the trace has no timed spans.
+    """
+    if not spans:
+        return None
+
+    root_id = select_root(spans, roots)
+    root_start, root_end, root_obs = spans[root_id]
+    wall_time = root_end - root_start
+
+    self_times = compute_self_times(spans, children)
+
+    # Only spans under the chosen root contribute to its parallelism
+    subtree = []
+    pending = [root_id]
+    while pending:
+        obs_id = pending.pop()
+        subtree.append(obs_id)
+        pending.extend(children.get(obs_id, ()))
+
+    self_by_category = defaultdict(int)
+    for obs_id in subtree:
+        self_by_category[span_category(spans[obs_id][2])] += self_times[obs_id][0]
+    total_self = sum(self_by_category.values())
+
+    segments = compute_critical_path(root_id, spans, children)
+    path_by_category = defaultdict(int)
+    for obs_id, seg_start, seg_end in segments:
+        path_by_category[span_category(spans[obs_id][2])] += seg_end - seg_start
+
+    # Collapse consecutive segments of the same span into one entry
+    path = []
+    for obs_id, seg_start, seg_end in segments:
+        if path and path[-1]['id'] == obs_id:
+            path[-1]['duration_ms'] += (seg_end - seg_start) / NS_PER_MS
+            continue
+        obs = spans[obs_id][2]
+        path.append({
+            'id': obs_id,
+            'name': obs.name,
+            'category': span_category(obs),
+            'offset_ms': (seg_start - root_start) / NS_PER_MS,
+            'duration_ms': (seg_end - seg_start) / NS_PER_MS,
+        })
+
+    top_spans = sorted(subtree, key=lambda o: self_times[o][0], reverse=True)
+    top_spans = [{
+        'id': obs_id,
+        'name': spans[obs_id][2].name,
+        'category': span_category(spans[obs_id][2]),
+        'self_ms': self_times[obs_id][0] / NS_PER_MS,
+        'child_ms': self_times[obs_id][1] / NS_PER_MS,
+    } for obs_id in top_spans[:TOP_SELF_TIME_SPANS]]
+
+    return {
+        'root': {'id': root_id, 'name': root_obs.name},
+        'span_count': len(subtree),
+        'wall_time_ms': wall_time / NS_PER_MS,
+        'parallelism_factor': total_self / wall_time if wall_time > 0 else None,
+        'self_time_ms_by_category': {k: v / NS_PER_MS for k, v in self_by_category.items()},
+        'critical_path': {
+            'total_ms': sum(path_by_category.values()) / NS_PER_MS,
+            'by_category_ms': {k: v / NS_PER_MS for k, v in path_by_category.items()},
+            'spans': path,
+        },
+        'top_self_time_spans': top_spans,
+    }
+
+
+def analyze_token_costs(spans):
+    """
+    Builds per-call input-token growth curves and estimates how much of each
+    prompt is history re-sent from earlier turns.
+
+    LLM calls are grouped into conversations by their parent span. Within a
+    conversation, call k re-encodes at most the previous call's prompt plus
+    its completion, so min(input_k, input_{k-1} + output_{k-1}) tokens are
+    counted as redundant prefill. Returns None if no LLM call has usage data.
+    """
+    llm_calls = sorted(
+        ((start, end, obs) for start, end, obs in spans.values()
+         if span_category(obs) == "llm" and obs.has_usage),
+        key=lambda c: (c[0], c[1]))
+    if not llm_calls:
+        return None
+    trace_start = llm_calls[0][0]
+
+    previous = {}  # parent id -> (input, output) of the last call
+    cumulative_input = 0
+    totals = defaultdict(float)
+    per_model = defaultdict(lambda: defaultdict(float))
+    calls = []
+    for start, end, obs in llm_calls:
+        call_input = obs.input_tokens or 0
+        call_output = obs.output_tokens or 0
+        model = obs.model or "unknown"
+        spec = model_spec(model)
+
+        parent_id = obs.parent_id
+        if parent_id in previous:
+            last_input, last_output = previous[parent_id]
+            redundant = min(call_input, last_input + last_output)
+        else:
+            redundant = 0
+        previous[parent_id] = (call_input, call_output)
+        cumulative_input += call_input
+
+        cost = (call_input * spec['input_price'] + call_output * spec['output_price']) / 1e6
+        redundant_cost = redundant * spec['input_price'] / 1e6
+        redundant_sec = (redundant / spec['prefill_tokens_per_sec']
+                         if spec['prefill_tokens_per_sec'] else None)
+
+        calls.append({
+            'id': obs.id,
+            'model': model,
+            'offset_ms': (start - trace_start) / NS_PER_MS,
+            'input_tokens': call_input,
+            'output_tokens': call_output,
+            'cumulative_input_tokens': cumulative_input,
+            'redundant_prefill_tokens': redundant,
+            'context_utilization': (call_input + call_output) / spec['context_window'],
+            'cost_usd': cost,
+        })
+
+        for bucket in (totals, per_model[model]):
+            bucket['calls'] += 1
+            bucket['input_tokens'] += call_input
+            bucket['output_tokens'] += call_output
+            bucket['redundant_prefill_tokens'] += redundant
+            bucket['cost_usd'] += cost
+            bucket['redundant_cost_usd'] += redundant_cost
+            if redundant_sec is not None:
+                bucket['redundant_prefill_sec'] += redundant_sec
+
+    def summarize(bucket):
+        summary = dict(bucket)
+        summary['redundant_prefill_percent'] = (
+            bucket['redundant_prefill_tokens'] / bucket['input_tokens'] * 100
+            if bucket['input_tokens'] > 0 else None)
+        return summary
+
+    return {
+        'totals': summarize(totals),
+        'per_model': {model: dict(summarize(bucket), context_window=model_spec(model)['context_window'])
+                      for model, bucket in per_model.items()},
+        'calls': calls,
+    }
+
+
+def _gap_neighbour(spans, obs_id):
+    if obs_id is None:
+        return None
+    obs = spans[obs_id][2]
+    return {'id': obs_id, 'name': obs.name, 'category': span_category(obs),
+            'parent_id': obs.parent_id}
+
+
+def analyze_timeline(spans, roots, top_n=TOP_IDLE_GAPS):
+    """
+    Sweeps the LLM and tool intervals of a trace once, in start order, and
+    splits the root span's wall time into LLM-only, tool-only, overlapping
+    and idle segments. Idle time is when neither an LLM nor a tool call is
+    running, i.e. time spent in the agent framework between steps.
+
+    Returns None if the trace has no timed spans.
+    """
+    if not spans:
+        return None
+
+    root_start, root_end, _ = spans[select_root(spans, roots)]
+
+    events = []
+    for obs_id, (start, end, obs) in spans.items():
+        category = span_category(obs)
+        if category == "framework":
+            continue
+        start = max(start, root_start)
+        end = min(end, root_end)
+        if end <= start:
+            continue
+        events.append((start, 1, category, obs_id))
+        events.append((end, -1, category, obs_id))
+    # Ends sort before starts at equal times so back-to-back calls leave no gap
+    events.sort(key=lambda e: (e[0], e[1]))
+    events.append((root_end, 1, None, None))
+
+    busy = {"llm": 0, "tool": 0, "overlap": 0, "idle": 0}
+    active = {"llm": 0, "tool": 0}
+    gaps = []
+    cursor = root_start
+    last_ended = None
+    for time, delta, category, obs_id in events:
+        if time > cursor:
+            if active["llm"] and active["tool"]:
+                state = "overlap"
+            elif active["llm"]:
+                state = "llm"
+            elif active["tool"]:
+                state = "tool"
+            else:
+                state = "idle"
+                gaps.append((time - cursor, cursor, last_ended, obs_id))
+            busy[state] += time - cursor
+            cursor = time
+        if category is None:
+            continue
+        active[category] += delta
+        if delta < 0:
+            last_ended = obs_id
+
+    window = root_end - root_start
+    transitions = defaultdict(lambda: {'count': 0, 'total_ms': 0.0})
+    idle_between_parents = 0
+    for duration, _, before_id, after_id in gaps:
+        before = spans[before_id][2] if before_id else None
+        after = spans[after_id][2] if after_id else None
+        key = (f"{span_category(before) if before else 'start'}->"
+               f"{span_category(after) if after else 'end'}")
+        transitions[key]['count'] += 1
+        transitions[key]['total_ms'] += duration / NS_PER_MS
+        if before and after and before.parent_id != after.parent_id:
+            idle_between_parents += duration
+
+    largest = heapq.nlargest(top_n, gaps, key=lambda g: g[0])
+    largest_gaps = [{
+        'offset_ms': (gap_start - root_start) / NS_PER_MS,
+        'duration_ms': duration / NS_PER_MS,
+        'before': _gap_neighbour(spans, before_id),
+        'after': _gap_neighbour(spans, after_id),
+    } for duration, gap_start, before_id, after_id in largest]
+
+    return {
+        'wall_time_ms': window / NS_PER_MS,
+        'llm_only_ms': busy["llm"] / NS_PER_MS,
+        'tool_only_ms': busy["tool"] / NS_PER_MS,
+        'overlap_ms': busy["overlap"] / NS_PER_MS,
+        'idle_ms': busy["idle"] / NS_PER_MS,
+        'idle_percent': (busy["idle"] / window * 100) if window > 0 else None,
+        'idle_gap_count': len(gaps),
+        'idle_between_parents_ms': idle_between_parents / NS_PER_MS,
+        'idle_by_transition': dict(transitions),
+        'largest_gaps': largest_gaps,
+    }
+
+
+def find_parallel_tool_batches(spans, children):
+    """
+    Finds runs of consecutive tool calls that could have run concurrently.
+
+    The agent decides on every tool call of a run before it sees any of their
+    outputs (the next LLM call does), so consecutive TOOL children of a span
+    with no LLM call between them do not depend on each other's output. A
+    call that changes cluster state (kubectl apply, helm upgrade, ...) orders
+    the calls around it and ends the run. Returns lists of span ids, each
+    with at least two calls, in start order.
+    """
+    batches = []
+    for child_ids in children.values():
+        batch = []
+        for child_id in child_ids:
+            obs = spans[child_id][2]
+            category = span_category(obs)
+            if category == "tool" and not is_mutating_call(obs.tool_name, obs.arguments):
+                batch.append(child_id)
+                continue
+            if category in ("tool", "llm"):
+                if len(batch) > 1:
+                    batches.append(batch)
+                batch = []
+        if len(batch) > 1:
+            batches.append(batch)
+    batches.sort(key=lambda b: spans[b[0]][0])
+    return batches
+
+
+def analyze_parallel_tool_calls(spans, children, top_n=TOP_PARALLEL_TOOL_BATCHES):
+    """
+    Estimates the latency saved by running each batch of independent tool
+    calls (see find_parallel_tool_batches) concurrently: the batch takes its
+    longest call instead of the sum of its calls. Savings are also attributed
+    to each pair of consecutive tools in a batch, as the shorter call of the
+    pair. Returns None if the trace has no timed tool calls.
+    """
+    tool_trtt_ns = sum(end - start for start, end, obs in spans.values()
+                       if span_category(obs) == "tool")
+    if not tool_trtt_ns:
+        return None
+
+    batches = []
+    per_pair = defaultdict(lambda: defaultdict(float))
+    parallelizable_calls = 0
+    saved_ns = 0
+    for batch in find_parallel_tool_batches(spans, children):
+        durations = [spans[call_id][1] - spans[call_id][0] for call_id in batch]
+        batch_saved = sum(durations) - max(durations)
+        saved_ns += batch_saved
+        parallelizable_calls += len(batch)
+        names = [spans[call_id][2].tool_name for call_id in batch]
+        for i in range(1, len(batch)):
+            pair = per_pair[" + ".join(sorted((names[i - 1], names[i])))]
+            pair['count'] += 1
+            pair['saved_ms'] += min(durations[i - 1], durations[i]) / NS_PER_MS
+        batches.append({
+            'parent_id': spans[batch[0]][2].parent_id,
+            'tools': names,
+            'calls': len(batch),
+            'sum_trtt_ms': sum(durations) / NS_PER_MS,
+            'max_trtt_ms': max(durations) / NS_PER_MS,
+            'saved_ms': batch_saved / NS_PER_MS,
+        })
+
+    return {
+        'tool_trtt_ms': tool_trtt_ns / NS_PER_MS,
+        'batches': len(batches),
+        'parallelizable_calls': parallelizable_calls,
+        'saved_ms': saved_ns / NS_PER_MS,
+        'saved_percent_of_trtt': saved_ns / tool_trtt_ns * 100,
+        'per_pair': {pair: dict(stats) for pair, stats in
+                     sorted(per_pair.items(), key=lambda p: p[1]['saved_ms'], reverse=True)},
+        'top_batches': heapq.nlargest(top_n, batches, key=lambda b: b['saved_ms']),
+    }
+
+
+def analyze_error_categories(data, spans, children, total_operations):
+    """
+    Error rates per category (see ERROR_CATEGORY_PATTERNS) and the latency
+    their retries cost. A failed tool call is retried by the next call of the
+    same tool under the same parent, a failed LLM call by the next LLM call;
+    the retry latency runs from the start of the failed call to the start of
+    its retry. Returns None if the trace has no LLM or tool calls.
+    """
+    if not total_operations:
+        return None
+    per_category = {}
+    # Position of every span among its siblings, built on the first error
+    position = None
+    for obs in data:
+        category = obs.error_category
+        if category is None:
+            continue
+        stats = per_category.setdefault(category, {'errors': 0, 'retries': 0, 'retry_latency_ms': 0.0})
+        stats['errors'] += 1
+        # Roots and calls whose parent has no timing have no siblings to retry them
+        if obs.id not in spans or obs.parent_id not in children:
+            continue
+        if position is None:
+            position = {child_id: index for child_ids in children.values()
+                        for index, child_id in enumerate(child_ids)}
+        siblings = children[obs.parent_id]
+        # Siblings are in start order, so the retry is the first match after the failed call
+        for sibling_id in siblings[position[obs.id] + 1:]:
+            sibling = spans[sibling_id][2]
+            if (sibling.tool_name == obs.tool_name if obs.type == "TOOL"
+                    else sibling.model is not None and sibling.type != "TOOL"):
+                stats['retries'] += 1
+                stats['retry_latency_ms'] += (spans[sibling_id][0] - spans[obs.id][0]) / NS_PER_MS
+                break
+
+    for stats in per_category.values():
+        stats['rate_percent'] = stats['errors'] / total_operations * 100
+    return {
+        'total_errors': sum(stats['errors'] for stats in per_category.values()),
+        'retry_latency_ms': sum(stats['retry_latency_ms'] for stats in per_category.values()),
+        'per_category': {category: per_category[category] for category in ERROR_CATEGORY_RANK
+                         if category in per_category},
+    }
+
+
+@dataclass
+class DistributionStats:
+    """Summary of a set of durations, in ms."""
+    count: int
+    avg: float
+    min: float
+    max: float
+    total: float
+    p50: float
+    p95: float
+    p99: float
+
+    @classmethod
+    def from_values(cls, values):
+        if not values:
+            return None
+        ordered = sorted(values)
+        total = sum(values)
+        return cls(
+            count=len(values),
+            avg=total / len(values),
+            min=ordered[0],
+            max=ordered[-1],
+            total=total,
+            p50=ordered[len(ordered) // 2],
+            p95=ordered[int(len(ordered) * 0.95)],
+            p99=ordered[int(len(ordered) * 0.99)],
+        )
+
+
+@dataclass
+class LLMStats:
+    total_calls: int
+    total_input_tokens: int
+    total_output_tokens: int
+    total_reasoning_tokens: int
+    # Token usage of the last task in token_usage_per_task
+    total_usage: int
+    planning_overhead_percent: float | None
+
+
+@dataclass
+class ToolReuseStats:
+    total_usages: int
+    repeated_usages: int
+    overall_rate_percent: float | None
+    per_tool: dict[str, float | None]
+    per_tool_usages: dict[str, int]
+    per_tool_repeated: dict[str, int]
+
+
+@dataclass
+class ToolErrorStats:
+    successful: int
+    errors: int
+    rate_percent: float | None
+
+
+@dataclass
+class ErrorRateStats:
+    total_operations: int  # LLM calls + tool calls
+    total_errors: int
+    rate_percent: float | None
+
+
+@dataclass
+class ContextUtilizationStats:
+    context_windows: dict[str, int]  # model -> context window size
+    calls: int
+    average: float
+    geometric_mean: float
+    max: float
+
+
+@dataclass
+class ThroughputStats:
+    total_llm_time_sec: float | None
+    average_per_call_tokens_per_sec: float | None
+    ultimate_tokens_per_sec: float | None
+
+
+@dataclass
+class TraceMetrics:
+    """
+    All NFR metrics of one trace. Field names match the keys of the exported
+    JSON; the span tree, timeline, token cost and duplicate tool call
+    analyses are kept as the dicts their passes return.
+    """
+    observation_count: int
+    end_to_end_latency_ms: float | None
+    token_usage_per_task: dict[str, int]
+    llm_stats: LLMStats
+    repeated_tool_calls: dict[str, dict[str, int]]
+    prompt_completion_ratio: float | None
+    tool_reuse_rate: ToolReuseStats
+    tool_error_rate: ToolErrorStats
+    error_rate: ErrorRateStats
+    context_window_utilization: ContextUtilizationStats | None
+    throughput: ThroughputStats
+    trtt_stats: DistributionStats | None
+    processing_stats: DistributionStats | None
+    llm_execution_stats: DistributionStats | None
+    span_tree: dict | None = None
+    error_categories: dict | None = None
+    duplicate_tool_calls: dict | None = None
+    parallel_tool_calls: dict | None = None
+    token_costs: dict | None = None
+    timeline: dict | None = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _find_root_span(data):
+    # Try to find the root span (usually the one with no parent or named 'crewai-index-trace')
+    root_span = next(
+        (o for o in data if not o.parent_id), None)
+    root_span_patterns = [
+        CREW_KICKOFF_PATTERN,
+        r'^crewai-index-trace$'
+    ]
+    if not root_span:
+        # Fallback: check for specific name
+        for pattern in root_span_patterns:
+            root_span = next(
+                (o for o in data if re.fullmatch(pattern, o.name or "")), None)
+            if root_span:
+                break
+    return root_span
+
+
+def analyze_observations(data):
+    """
+    Computes all metrics of a trace from its Observation records, without
+    printing or writing anything. Returns a TraceMetrics.
+    """
+    observations = {observation.id: observation for observation in data}
     repeated_tool_calls = defaultdict(dict)
-    
-    metrics = {}
 
     total_input = 0
     total_output = 0
@@ -47,7 +1147,7 @@ def load_and_print_observations(json_path, output_json_path=None):
     
     # Track per-LLM-call metrics for context window utilization and throughput
     context_window_utilizations = []
-    total_llm_latency_ms = 0
+    total_llm_ns = 0
     
     # Track per-tool usages for individual reuse rates
     per_tool_usages = defaultdict(int)
@@ -62,204 +1162,278 @@ def load_and_print_observations(json_path, output_json_path=None):
     total_operations = 0  # LLM calls + tool calls
 
     for obs_id, observation in observations.items():
+        # Tool and LLM output errors are classified once, when the record is built
+        if observation.error_category is not None:
+            total_errors += 1
+
         # Count tool usages
-        if observation.get('type') == 'TOOL':
+        if observation.type == 'TOOL':
             total_tool_usages += 1
             total_operations += 1
-            # Extract tool name from the observation
-            tool_name = observation.get('name', '').replace('._use', '')
-            if not tool_name:
-                metadata = observation.get('metadata', {})
-                attributes = metadata.get('attributes', {})
-                tool_name = attributes.get('tool.name', 'Unknown')
-            per_tool_usages[tool_name] += 1
-
-            # Check for tool errors
-            output = observation.get("output", {})
-            if isinstance(output, dict):
-                # Check for return_code indicating failure
-                return_code = output.get("return_code")
-                if return_code is not None and return_code != 0:
-                    total_errors += 1
-                # Check for error in stderr
-                stderr = output.get("stderr", "")
-                if stderr and len(stderr.strip()) > 0:
-                    total_errors += 1
-            elif isinstance(output, str):
-                # Check if output contains error indicators
-                output_lower = output.lower()
-                if any(keyword in output_lower for keyword in ["error", "exception", "failed", "failure"]):
-                    total_errors += 1
+            per_tool_usages[observation.tool_name] += 1
         
-        if observation['name'] == 'Tool Repeated Usage':
+        if observation.name == 'Tool Repeated Usage':
             repeated_tool_usages += 1
-            repeated_tool_name = observation['metadata']['attributes']['tool_name']
+            repeated_tool_name = observation.attr_tool_name or 'Unknown'
             per_tool_repeated[repeated_tool_name] += 1
-            parent_observation = observations[observation['parent_observation_id']]
-            command = parent_observation['input']['calling']
-            tool_stats = repeated_tool_calls[observation['metadata']
-                                             ['attributes']['tool_name']]
-            tool_stats[command] = tool_stats.get(command, 0) + 1
+            # Not every framework records the call on the parent span
+            parent_observation = observations.get(observation.parent_id)
+            if parent_observation is not None and parent_observation.calling:
+                command = parent_observation.calling
+                tool_stats = repeated_tool_calls[repeated_tool_name]
+                tool_stats[command] = tool_stats.get(command, 0) + 1
         
         # Count tool usage success and error for error rate calculation
-        if observation['name'] == 'Tool Usage':
+        if observation.name == 'Tool Usage':
             tool_usage_success_count += 1
-        elif observation['name'] == 'Tool Usage Error':
+        elif observation.name == 'Tool Usage Error':
             tool_usage_error_count += 1
 
-        usage = observation.get("usage_details", {})
-        if usage:
-            total_input += usage.get("input", 0)
-            total_output += usage.get("output", 0)
-            total_reasoning += usage.get("completion_details.reasoning", 0)
+        if observation.has_usage:
+            total_input += observation.input_tokens
+            total_output += observation.output_tokens
+            total_reasoning += observation.reasoning_tokens
         
         # Check if this is an LLM call (has model field)
-        if observation.get("model"):
+        if observation.model:
             total_llm_calls += 1
             total_operations += 1
 
-            # Check for LLM errors
-            status = observation.get("status")
-            level = observation.get("level")
-            if status and status.lower() in ["error", "failed", "failure"]:
-                total_errors += 1
-            elif level and level.upper() == "ERROR":
-                total_errors += 1
-            else:
-                # Check output for error indicators
-                output = observation.get("output", "")
-                if isinstance(output, str):
-                    output_lower = output.lower()
-                    if any(keyword in output_lower for keyword in ["error:", "exception:", "failed", "failure"]):
-                        total_errors += 1
-            
             # Get token counts for this call
-            call_input = usage.get("input", 0) if usage else 0
-            call_output = usage.get("output", 0) if usage else 0
-            call_total = call_input + call_output
+            call_total = observation.input_tokens + observation.output_tokens
             
             # Calculate context window utilization for this call
             if call_total > 0:
-                utilization = call_total / CONTEXT_WINDOW_SIZE
+                utilization = call_total / model_spec(observation.model)['context_window']
                 context_window_utilizations.append(utilization)
             
-            # Track total LLM latency for throughput calculation
-            latency_ms = observation.get("latency", 0)
-            if latency_ms and latency_ms > 0:
-                total_llm_latency_ms += latency_ms
+            # Track total LLM time for throughput calculation
+            if observation.start_ns is not None and observation.end_ns is not None:
+                total_llm_ns += max(observation.end_ns - observation.start_ns, 0)
+            elif observation.latency_sec and observation.latency_sec > 0:
+                total_llm_ns += int(observation.latency_sec * NS_PER_SEC)
 
     # 1. Global Latency (End-to-End)
-    # Try to find the root span (usually the one with no parent or named 'crewai-index-trace')
-    root_span = next(
-        (o for o in data if not o.get("parent_observation_id")), None)
-    root_span_patterns = [
-        r'^(Crew_[A-Za-z0-9]+(-[A-Za-z0-9]+)*\.kickoff)$',
-        r'^crewai-index-trace$'
-    ]
-    if not root_span:
-        # Fallback: check for specific name
-        for pattern in root_span_patterns:
-            root_span = next(
-                (o for o in data if re.fullmatch(pattern, o.get("name"))), None)
-            if root_span:
-                break
-
+    root_span = _find_root_span(data)
+    e2e_latency_ms = None
     if root_span:
-        latency_sec = 0.0
-        if root_span.get("latency"):
-            latency_sec = root_span.get("latency")
-        elif root_span.get("end_time") and root_span.get("start_time"):
-            # Parse iso strings if needed
-            start = root_span.get("start_time")
-            end = root_span.get("end_time")
-            if isinstance(start, str):
-                try:
-                    start = datetime.fromisoformat(start)
-                except ValueError:
-                    pass
-            if isinstance(end, str):
-                try:
-                    end = datetime.fromisoformat(end)
-                except ValueError:
-                    pass
-
-            if isinstance(start, datetime) and isinstance(end, datetime):
-                latency_sec = (end - start).total_seconds()
-
-        print(f"{'End to End Latency':<25} {latency_sec:.2f} ms")
-        metrics['end_to_end_latency_ms'] = latency_sec
+        e2e_latency_ms = 0.0
+        if root_span.start_ns is not None and root_span.end_ns is not None:
+            e2e_latency_ms = (root_span.end_ns - root_span.start_ns) / NS_PER_MS
+        elif root_span.latency_sec:
+            # Langfuse's latency field, in seconds
+            e2e_latency_ms = root_span.latency_sec * 1000.0
 
     task_map = {}  # map observation_id -> task_id
     for obs in data:
-        # Check metadata for task_id
-        t_id = None
-        metadata = obs.get("metadata", {})
-        if metadata and isinstance(metadata, dict):
-            attributes = metadata.get("attributes", {})
-            if attributes and isinstance(attributes, dict):
-                for k, v in attributes.items():
-                    if "task_id" in k.lower():
-                        t_id = v
-                        break
-
-        if t_id:
-            task_map[obs.get("id")] = t_id
+        if obs.task_id:
+            task_map[obs.id] = obs.task_id
 
     # Now aggregate usage for each task_id
     task_usages = {}  # task_id -> list of total_tokens
 
     for obs in data:
-        parent_id = obs.get("parent_observation_id")
+        parent_id = obs.parent_id
         if parent_id and parent_id in task_map:
             # This observation is a child of a task
-            usage = obs.get("usage_details", {})
-            total = usage.get("total", 0)
+            total = obs.total_tokens
             if total > 0:
                 t_id = task_map[parent_id]
                 if t_id not in task_usages:
                     task_usages[t_id] = []
                 task_usages[t_id].append(total)
+
     total_usage = 0
+    token_usage_per_task = {}
+    for task_id, usages in task_usages.items():
+        total_usage = sum(usages) if usages else 0
+        token_usage_per_task[task_id] = total_usage
+
+    llm_stats = LLMStats(
+        total_calls=total_llm_calls,
+        total_input_tokens=total_input,
+        total_output_tokens=total_output,
+        total_reasoning_tokens=total_reasoning,
+        total_usage=total_usage,
+        planning_overhead_percent=(total_reasoning / total_output) * 100 if total_output > 0 else None,
+    )
+
+    per_tool_rates = {}
+    for tool in sorted(per_tool_usages):
+        usages = per_tool_usages[tool]
+        repeated = per_tool_repeated.get(tool, 0)
+        per_tool_rates[tool] = (repeated / usages) * 100 if usages > 0 else None
+    tool_reuse = ToolReuseStats(
+        total_usages=total_tool_usages,
+        repeated_usages=repeated_tool_usages,
+        overall_rate_percent=(repeated_tool_usages / total_tool_usages) * 100 if total_tool_usages > 0 else None,
+        per_tool=per_tool_rates,
+        per_tool_usages=dict(per_tool_usages),
+        per_tool_repeated=dict(per_tool_repeated),
+    )
+
+    total_tool_invocations = tool_usage_success_count + tool_usage_error_count
+    tool_errors = ToolErrorStats(
+        successful=tool_usage_success_count,
+        errors=tool_usage_error_count,
+        rate_percent=(tool_usage_error_count / total_tool_invocations) * 100 if total_tool_invocations > 0 else None,
+    )
+
+    errors = ErrorRateStats(
+        total_operations=total_operations,
+        total_errors=total_errors,
+        rate_percent=(total_errors / total_operations) * 100 if total_operations > 0 else None,
+    )
+
+    context_utilization = None
+    if context_window_utilizations:
+        # Geometric mean: exp(mean(log(x))) - more robust for products
+        log_sum = sum(math.log(u) for u in context_window_utilizations)
+        context_utilization = ContextUtilizationStats(
+            context_windows={model: model_spec(model)['context_window']
+                             for model in sorted({o.model for o in data if o.model})},
+            calls=len(context_window_utilizations),
+            average=sum(context_window_utilizations) / len(context_window_utilizations),
+            geometric_mean=math.exp(log_sum / len(context_window_utilizations)),
+            max=max(context_window_utilizations),
+        )
+
+    throughput = ThroughputStats(None, None, None)
+    if total_llm_ns > 0 and total_output > 0:
+        throughput.total_llm_time_sec = total_llm_ns / NS_PER_SEC
+        throughput.average_per_call_tokens_per_sec = total_output / throughput.total_llm_time_sec
+    # Ultimate token throughput: total output tokens / end-to-end latency
+    if e2e_latency_ms and e2e_latency_ms > 0 and total_output > 0:
+        throughput.ultimate_tokens_per_sec = total_output / (e2e_latency_ms / 1000.0)
+    
+    # Performance metrics: TRTT, Processing Time, LLM Execution Time
+    # Sort observations by start time for chronological processing
+    sorted_observations = sorted((obs for obs in data if obs.start_ns is not None),
+                                 key=lambda obs: obs.start_ns)
+
+    # Start of the next LLM call after each position, filled in one reverse pass
+    next_llm_start = [None] * (len(sorted_observations) + 1)
+    for i in range(len(sorted_observations) - 1, -1, -1):
+        obs = sorted_observations[i]
+        next_llm_start[i] = obs.start_ns if obs.model else next_llm_start[i + 1]
     
+    # Track metrics
+    tool_round_trip_times = []  # TRTT: tool end_time - tool start_time
+    processing_times = []  # Time between tool end and next LLM start
+    llm_execution_times = []  # LLM end_time - LLM start_time
+    
+    # Process observations chronologically
+    for i, obs in enumerate(sorted_observations):
+        start_ns = obs.start_ns
+        end_ns = obs.end_ns
+        if end_ns is None:
+            continue
+        
+        # 1. Tool Round-Trip Time (TRTT)
+        if obs.type == "TOOL":
+            trtt_ms = (end_ns - start_ns) / NS_PER_MS
+            if trtt_ms >= 0:  # Only count valid times
+                tool_round_trip_times.append(trtt_ms)
+
+            # 3. Processing Time: time between tool completion and next LLM call start
+            next_start_ns = next_llm_start[i + 1]
+            if next_start_ns is not None:
+                processing_time_ms = (next_start_ns - end_ns) / NS_PER_MS
+                if processing_time_ms >= 0:  # Only count valid times
+                    processing_times.append(processing_time_ms)
+        
+        # 2. LLM Execution Time
+        if obs.model:
+            llm_time_ms = (end_ns - start_ns) / NS_PER_MS
+            if llm_time_ms >= 0:  # Only count valid times
+                llm_execution_times.append(llm_time_ms)
+
+    spans, children, roots = build_span_tree(data)
+
+    return TraceMetrics(
+        observation_count=len(data),
+        end_to_end_latency_ms=e2e_latency_ms,
+        token_usage_per_task=token_usage_per_task,
+        llm_stats=llm_stats,
+        repeated_tool_calls=dict(repeated_tool_calls),
+        prompt_completion_ratio=total_input / total_output if total_output > 0 else None,
+        tool_reuse_rate=tool_reuse,
+        tool_error_rate=tool_errors,
+        error_rate=errors,
+        context_window_utilization=context_utilization,
+        throughput=throughput,
+        trtt_stats=DistributionStats.from_values(tool_round_trip_times),
+        processing_stats=DistributionStats.from_values(processing_times),
+        llm_execution_stats=DistributionStats.from_values(llm_execution_times),
+        error_categories=analyze_error_categories(data, spans, children, total_operations),
+        span_tree=analyze_span_tree(spans, children, roots),
+        duplicate_tool_calls=analyze_duplicate_tool_calls(spans),
+        parallel_tool_calls=analyze_parallel_tool_calls(spans, children),
+        token_costs=analyze_token_costs(spans),
+        timeline=analyze_timeline(spans, roots),
+    )
+
+
+def analyze_trace(json_path):
+    """
+    Loads an observations dump and returns its TraceMetrics.
+
+    Raises OSError if the file cannot be read and json.JSONDecodeError if it
+    is not a JSON array of observations.
+    """
+    return analyze_observations(load_observations(json_path))
+
+
+def _print_distribution(stats, label, count_label, empty_message, total_in_seconds=False):
+    if stats is None:
+        print(empty_message)
+        return
+    print(f"{count_label}: {stats.count}")
+    print(f"Average {label}: {stats.avg:.2f} ms")
+    print(f"Min {label}: {stats.min:.2f} ms")
+    print(f"Max {label}: {stats.max:.2f} ms")
+    if total_in_seconds:
+        print(f"Total {label}: {stats.total:.2f} ms ({stats.total/1000:.2f} sec)")
+    else:
+        print(f"Total {label}: {stats.total:.2f} ms")
+    print(f"{label} P50: {stats.p50:.2f} ms")
+    print(f"{label} P95: {stats.p95:.2f} ms")
+    print(f"{label} P99: {stats.p99:.2f} ms")
+
+
+def print_metrics(metrics):
+    """Prints a TraceMetrics in the analyzer's human-readable report format."""
+    if metrics.end_to_end_latency_ms is not None:
+        e2e_latency_ms = metrics.end_to_end_latency_ms
+        print(f"{'End to End Latency':<25} {e2e_latency_ms:.2f} ms ({e2e_latency_ms / 1000:.2f} s)")
+
     # Token Usage per Task
     print("\n--- Token Usage per Task ---")
-    metrics['token_usage_per_task'] = {}
-    if task_usages:
-        for task_id, usages in task_usages.items():
-            total_usage = sum(usages) if usages else 0
+    if metrics.token_usage_per_task:
+        for task_id, total_usage in metrics.token_usage_per_task.items():
             print(f"Task ID: {task_id}")
             print(f"Total Token Usage: {total_usage}")
-            metrics['token_usage_per_task'][task_id] = total_usage
     else:
         print("No token usage associated with tasks.")
 
     # LLM Calls and Token Breakdown
+    llm = metrics.llm_stats
     print("\n--- LLM Calls & Token Breakdown ---")
-    print(f"Total LLM Calls: {total_llm_calls}")
-    print(f"Total Reasoning Tokens: {total_reasoning}")
-    print(f"Total Output Tokens: {total_output}")
-    metrics['llm_stats'] = {
-        'total_calls': total_llm_calls,
-        'total_reasoning_tokens': total_reasoning,
-        'total_output_tokens': total_output,
-        'total_usage': total_usage
-    }
-    if total_output > 0:
-        planning_overhead = (total_reasoning / total_output) * 100
-        print(f"Planning Overhead (Reasoning/Output): {planning_overhead:.2f}% ({total_reasoning}/{total_output})")
-        metrics['llm_stats']['planning_overhead_percent'] = planning_overhead
+    print(f"Total LLM Calls: {llm.total_calls}")
+    print(f"Total Reasoning Tokens: {llm.total_reasoning_tokens}")
+    print(f"Total Output Tokens: {llm.total_output_tokens}")
+    if llm.planning_overhead_percent is not None:
+        print(f"Planning Overhead (Reasoning/Output): {llm.planning_overhead_percent:.2f}% "
+              f"({llm.total_reasoning_tokens}/{llm.total_output_tokens})")
     else:
         print("Planning Overhead: N/A (no output tokens)")
-        metrics['llm_stats']['planning_overhead_percent'] = None
-    print(f"Total Usage: {total_usage}")
+    print(f"Total Usage: {llm.total_usage}")
     
     # Repeated Tool Calls Detail
-    metrics['repeated_tool_calls'] = {}
-    if repeated_tool_calls:
+    if metrics.repeated_tool_calls:
         print("\n--- Repeated Tool Calls Detail ---")
-        for tool_name, tool_stats in repeated_tool_calls.items():
+        for tool_name, tool_stats in metrics.repeated_tool_calls.items():
             print(f"Tool: {tool_name}")
-            metrics['repeated_tool_calls'][tool_name] = tool_stats
             for command, count in tool_stats.items():
                 argument = command[command.find('arguments='):]
                 print(f"  Arguments: {argument}")
@@ -267,305 +1441,294 @@ def load_and_print_observations(json_path, output_json_path=None):
     
     # Prompt vs Completion Ratio
     print("\n--- Prompt vs Completion Ratio ---")
-    if total_output > 0:
-        prompt_completion_ratio = total_input / total_output
-        print(f"Total Prompt Tokens: {total_input}")
-        print(f"Total Completion Tokens: {total_output}")
-        print(f"Prompt vs Completion Ratio: {prompt_completion_ratio:.4f} (Prompt/Completion)")
-        metrics['prompt_completion_ratio'] = prompt_completion_ratio
+    if metrics.prompt_completion_ratio is not None:
+        print(f"Total Prompt Tokens: {llm.total_input_tokens}")
+        print(f"Total Completion Tokens: {llm.total_output_tokens}")
+        print(f"Prompt vs Completion Ratio: {metrics.prompt_completion_ratio:.4f} (Prompt/Completion)")
     else:
         print("Unable to calculate Prompt vs Completion Ratio (no completion tokens found).")
-        metrics['prompt_completion_ratio'] = None
     
     # Tool Reuse Rate
+    reuse = metrics.tool_reuse_rate
     print("\n--- Tool Reuse Rate ---")
-    print(f"Total Tool Usages: {total_tool_usages}")
-    print(f"Repeated Tool Usages: {repeated_tool_usages}")
-    
-    metrics['tool_reuse_rate'] = {
-        'total_usages': total_tool_usages,
-        'repeated_usages': repeated_tool_usages
-    }
-
-    if total_tool_usages > 0:
-        reuse_rate = (repeated_tool_usages / total_tool_usages) * 100
-        print(f"Overall Tool Reuse Rate: {reuse_rate:.2f}%")
-        metrics['tool_reuse_rate']['overall_rate_percent'] = reuse_rate
+    print(f"Total Tool Usages: {reuse.total_usages}")
+    print(f"Repeated Tool Usages: {reuse.repeated_usages}")
+    if reuse.overall_rate_percent is not None:
+        print(f"Overall Tool Reuse Rate: {reuse.overall_rate_percent:.2f}%")
     else:
         print("Overall Tool Reuse Rate: N/A (no tool usages)")
-        metrics['tool_reuse_rate']['overall_rate_percent'] = None
     
     # Per-tool reuse rates
     print("\nPer-Tool Reuse Rates:")
-    metrics['tool_reuse_rate']['per_tool'] = {}
-    all_tools = set(per_tool_usages.keys())
-    for tool in sorted(all_tools):
-        usages = per_tool_usages[tool]
-        repeated = per_tool_repeated.get(tool, 0)
-        if usages > 0:
-            rate = (repeated / usages) * 100
-            print(f"  {tool}: {rate:.2f}% ({repeated}/{usages})")
-            metrics['tool_reuse_rate']['per_tool'][tool] = rate
+    for tool, rate in reuse.per_tool.items():
+        if rate is not None:
+            print(f"  {tool}: {rate:.2f}% ({reuse.per_tool_repeated.get(tool, 0)}/{reuse.per_tool_usages[tool]})")
         else:
             print(f"  {tool}: N/A")
-            metrics['tool_reuse_rate']['per_tool'][tool] = None
     
     # Tool Error Rate
+    tool_errors = metrics.tool_error_rate
     print("\n--- Tool Error Rate ---")
-    total_tool_invocations = tool_usage_success_count + tool_usage_error_count
-    print(f"Successful Tool Usages: {tool_usage_success_count}")
-    print(f"Tool Usage Errors: {tool_usage_error_count}")
-    
-    metrics['tool_error_rate'] = {
-        'successful': tool_usage_success_count,
-        'errors': tool_usage_error_count
-    }
-    
-    if total_tool_invocations > 0:
-        tool_error_rate = (tool_usage_error_count / total_tool_invocations) * 100
-        print(f"Tool Error Rate: {tool_error_rate:.2f}% ({tool_usage_error_count}/{total_tool_invocations})")
-        metrics['tool_error_rate']['rate_percent'] = tool_error_rate
+    print(f"Successful Tool Usages: {tool_errors.successful}")
+    print(f"Tool Usage Errors: {tool_errors.errors}")
+    if tool_errors.rate_percent is not None:
+        print(f"Tool Error Rate: {tool_errors.rate_percent:.2f}% "
+              f"({tool_errors.errors}/{tool_errors.successful + tool_errors.errors})")
     else:
         print("Tool Error Rate: N/A (no tool invocations)")
-        metrics['tool_error_rate']['rate_percent'] = None
     
-    # Calculate and print reliability metrics
+    # Reliability metrics
     print("\n--- Reliability Metrics ---")
 
     # Context Window Utilization
     print("\n--- Context Window Utilization ---")
-    if context_window_utilizations:
-        # Geometric mean: exp(mean(log(x))) - more robust for products
-        log_sum = sum(math.log(u) for u in context_window_utilizations)
-        geometric_mean = math.exp(log_sum / len(context_window_utilizations))
-        max_utilization = max(context_window_utilizations)
-        avg_utilization = sum(context_window_utilizations) / len(context_window_utilizations)
-        print(f"Context Window Size: {CONTEXT_WINDOW_SIZE:,} tokens")
-        print(f"Number of LLM Calls: {len(context_window_utilizations)}")
-        print(f"Context Window Utilization (Average): {avg_utilization:.6%}")
-        print(f"Context Window Utilization (Geometric Mean): {geometric_mean:.6%}")
-        print(f"Context Window Utilization (Max): {max_utilization:.6%}")
-        metrics['context_window_utilization'] = {
-            'average': avg_utilization,
-            'geometric_mean': geometric_mean,
-            'max': max_utilization
-        }
+    context = metrics.context_window_utilization
+    if context:
+        for model, context_window in context.context_windows.items():
+            print(f"Context Window Size ({model}): {context_window:,} tokens")
+        print(f"Number of LLM Calls: {context.calls}")
+        print(f"Context Window Utilization (Average): {context.average:.6%}")
+        print(f"Context Window Utilization (Geometric Mean): {context.geometric_mean:.6%}")
+        print(f"Context Window Utilization (Max): {context.max:.6%}")
     else:
         print("No LLM calls found with token usage data.")
     
     # Error Rate
+    errors = metrics.error_rate
     print("\n--- Error Rate ---")
-    if total_operations > 0:
-        error_rate = (total_errors / total_operations) * 100
-        print(f"Total Operations: {total_operations} (LLM calls + tool calls)")
-        print(f"Total Errors: {total_errors}")
-        print(f"Error Rate: {error_rate:.2f}%")
+    if errors.rate_percent is not None:
+        print(f"Total Operations: {errors.total_operations} (LLM calls + tool calls)")
+        print(f"Total Errors: {errors.total_errors}")
+        print(f"Error Rate: {errors.rate_percent:.2f}%")
     else:
         print("No operations found to calculate error rate.")
 
-    # Error Rate
-    print("\n--- Error Rate ---")
-    if total_operations > 0:
-        error_rate = (total_errors / total_operations) * 100
-        print(f"Total Operations: {total_operations} (LLM calls + tool calls)")
-        print(f"Total Errors: {total_errors}")
-        print(f"Error Rate: {error_rate:.2f}%")
-    else:
-        print("No operations found to calculate error rate.")
+    # Errors by category, and the time spent until each failed call was retried
+    categories = metrics.error_categories
+    if categories and categories['per_category']:
+        print("\n--- Error Categories ---")
+        for category, stats in categories['per_category'].items():
+            print(f"  {category}: {stats['errors']} errors ({stats['rate_percent']:.2f}% of operations), "
+                  f"{stats['retries']} retried, retry latency {stats['retry_latency_ms']:.2f} ms")
+        print(f"Total Retry Latency: {categories['retry_latency_ms']:.2f} ms")
 
+    throughput = metrics.throughput
     print("\n--- Token Throughput ---")
-    metrics['throughput'] = {}
-    if total_llm_latency_ms > 0 and total_output > 0:
-        total_llm_time_sec = total_llm_latency_ms / 1000.0
-        avg_throughput = total_output / total_llm_time_sec
-        print(f"Total LLM Time: {total_llm_time_sec:.2f} sec")
-        print(f"Average Per-Call Token Throughput: {avg_throughput:.2f} tokens/sec")
-        metrics['throughput']['average_per_call_tokens_per_sec'] = avg_throughput
+    if throughput.average_per_call_tokens_per_sec is not None:
+        print(f"Total LLM Time: {throughput.total_llm_time_sec:.2f} sec")
+        print(f"Average Per-Call Token Throughput: {throughput.average_per_call_tokens_per_sec:.2f} tokens/sec")
     else:
         print("No throughput data available.")
-        metrics['throughput']['average_per_call_tokens_per_sec'] = None
-    
-    # Ultimate token throughput: total output tokens / end-to-end latency
-    if root_span and latency_sec and latency_sec > 0 and total_output > 0:
-        # latency_sec is already in milliseconds from the root span, convert to seconds
-        e2e_latency_sec = latency_sec / 1000.0
-        ultimate_throughput = total_output / e2e_latency_sec
-        print(f"Ultimate Token Throughput (Total Output / E2E Latency): {ultimate_throughput:.2f} tokens/sec")
-        metrics['throughput']['ultimate_tokens_per_sec'] = ultimate_throughput
+    if throughput.ultimate_tokens_per_sec is not None:
+        print(f"Ultimate Token Throughput (Total Output / E2E Latency): "
+              f"{throughput.ultimate_tokens_per_sec:.2f} tokens/sec")
     else:
         print("Unable to calculate ultimate token throughput (missing E2E latency or output tokens).")
-        metrics['throughput']['ultimate_tokens_per_sec'] = None
     
-    # Helper function to parse datetime from ISO format string or return datetime object
-    def parse_datetime(dt):
-        if dt is None:
-            return None
-        if isinstance(dt, datetime):
-            return dt
-        if isinstance(dt, str):
-            try:
-                return datetime.fromisoformat(dt.replace('Z', '+00:00'))
-            except (ValueError, AttributeError):
-                return None
-        return None
-    
-    # Calculate performance metrics: TRTT, Processing Time, LLM Execution Time
     print("\n--- Performance Metrics ---")
-    
-    # Sort observations by start_time for chronological processing
-    sorted_observations = []
-    for obs in data:
-        start_time = parse_datetime(obs.get("start_time"))
-        if start_time:
-            sorted_observations.append((start_time, obs))
-    
-    sorted_observations.sort(key=lambda x: x[0])
-    
-    # Track metrics
-    tool_round_trip_times = []  # TRTT: tool end_time - tool start_time
-    processing_times = []  # Time between tool end and next LLM start
-    llm_execution_times = []  # LLM end_time - LLM start_time
-    
-    # Process observations chronologically
-    for i, (start_time, obs) in enumerate(sorted_observations):
-        obs_type = obs.get("type")
-        model = obs.get("model")
-        end_time = parse_datetime(obs.get("end_time"))
-        
-        # 1. Tool Round-Trip Time (TRTT)
-        if obs_type == "TOOL" and start_time and end_time:
-            trtt_ms = (end_time - start_time).total_seconds() * 1000
-            if trtt_ms >= 0:  # Only count valid times
-                tool_round_trip_times.append(trtt_ms)
-        
-        # 2. LLM Execution Time
-        if model and start_time and end_time:
-            llm_time_ms = (end_time - start_time).total_seconds() * 1000
-            if llm_time_ms >= 0:  # Only count valid times
-                llm_execution_times.append(llm_time_ms)
-        
-        # 3. Processing Time: time between tool completion and next LLM call start
-        if obs_type == "TOOL" and end_time:
-            # Find the next LLM call after this tool
-            for j in range(i + 1, len(sorted_observations)):
-                next_start_time, next_obs = sorted_observations[j]
-                next_model = next_obs.get("model")
-                if next_model:  # Found next LLM call
-                    processing_time_ms = (next_start_time - end_time).total_seconds() * 1000
-                    if processing_time_ms >= 0:  # Only count valid times
-                        processing_times.append(processing_time_ms)
-                    break
-    
-    # Print Tool Round-Trip Time (TRTT) metrics
+
     print("\n--- Tool Round-Trip Time (TRTT) ---")
-    metrics['trtt_stats'] = {}
-    if tool_round_trip_times:
-        avg_trtt = sum(tool_round_trip_times) / len(tool_round_trip_times)
-        min_trtt = min(tool_round_trip_times)
-        max_trtt = max(tool_round_trip_times)
-        total_trtt = sum(tool_round_trip_times)
-        print(f"Number of Tool Calls: {len(tool_round_trip_times)}")
-        print(f"Average TRTT: {avg_trtt:.2f} ms")
-        print(f"Min TRTT: {min_trtt:.2f} ms")
-        print(f"Max TRTT: {max_trtt:.2f} ms")
-        print(f"Total TRTT: {total_trtt:.2f} ms")
-        # Calculate percentiles
-        sorted_trtt = sorted(tool_round_trip_times)
-        p50 = sorted_trtt[len(sorted_trtt) // 2]
-        p95 = sorted_trtt[int(len(sorted_trtt) * 0.95)] if len(sorted_trtt) > 0 else 0
-        p99 = sorted_trtt[int(len(sorted_trtt) * 0.99)] if len(sorted_trtt) > 0 else 0
-        print(f"TRTT P50: {p50:.2f} ms")
-        print(f"TRTT P95: {p95:.2f} ms")
-        print(f"TRTT P99: {p99:.2f} ms")
-        metrics['trtt_stats'] = {
-            'avg': avg_trtt,
-            'min': min_trtt,
-            'max': max_trtt,
-            'total': total_trtt,
-            'p50': p50,
-            'p95': p95,
-            'p99': p99
-        }
+    _print_distribution(metrics.trtt_stats, "TRTT", "Number of Tool Calls",
+                        "No tool calls found with valid timing data.")
+
+    print("\n--- Processing Time (Tool End to Next LLM Start) ---")
+    _print_distribution(metrics.processing_stats, "Processing Time", "Number of Tool-to-LLM Transitions",
+                        "No tool-to-LLM transitions found with valid timing data.")
+
+    print("\n--- LLM Execution Time ---")
+    _print_distribution(metrics.llm_execution_stats, "LLM Execution Time", "Number of LLM Calls",
+                        "No LLM calls found with valid timing data.", total_in_seconds=True)
+
+    # Span tree: critical path, self time vs child time and parallelism
+    print("\n--- Span Tree & Critical Path ---")
+    span_tree = metrics.span_tree
+    if span_tree:
+        wall_ms = span_tree['wall_time_ms']
+        print(f"Root Span: {span_tree['root']['name']} ({span_tree['span_count']} spans)")
+        print(f"Wall Time: {wall_ms:.2f} ms")
+        if span_tree['parallelism_factor'] is not None:
+            print(f"Parallelism Factor (Span Time / Wall Time): {span_tree['parallelism_factor']:.2f}")
+        critical_path = span_tree['critical_path']
+        print(f"Critical Path: {critical_path['total_ms']:.2f} ms over {len(critical_path['spans'])} segments")
+        for category in ("llm", "tool", "framework"):
+            path_ms = critical_path['by_category_ms'].get(category, 0.0)
+            self_ms = span_tree['self_time_ms_by_category'].get(category, 0.0)
+            share = (path_ms / wall_ms * 100) if wall_ms > 0 else 0.0
+            print(f"  {category:<10} critical path {path_ms:.2f} ms ({share:.2f}%), self time {self_ms:.2f} ms")
+        print("Top Spans by Self Time:")
+        for span in span_tree['top_self_time_spans']:
+            print(f"  {span['name']} [{span['category']}]: self {span['self_ms']:.2f} ms, children {span['child_ms']:.2f} ms")
+    else:
+        print("No spans found with valid timing data.")
+
+    # Duplicate tool calls, detected from the TOOL observations themselves
+    print("\n--- Duplicate Tool Calls ---")
+    duplicates = metrics.duplicate_tool_calls
+    if duplicates:
+        print(f"Tool Calls: {int(duplicates['calls'])} ({duplicates['unique_calls']} unique)")
+        print(f"Exact Duplicates: {int(duplicates['exact_duplicates'])} "
+              f"({duplicates['duplicate_rate_percent']:.2f}%), "
+              f"{duplicates['wasted_trtt_ms']:.2f} ms TRTT")
+        print(f"Near Duplicates: {int(duplicates['near_duplicates'])}, "
+              f"{duplicates['near_duplicate_trtt_ms']:.2f} ms TRTT")
+        print(f"Served by a Result Cache (tool_cache default policy): {int(duplicates['cacheable_calls'])} calls, "
+              f"{duplicates['cacheable_trtt_ms']:.2f} ms TRTT saved")
+        for entry in duplicates['top_duplicates']:
+            print(f"  {entry['tool']} x{entry['count']}: {entry['wasted_trtt_ms']:.2f} ms wasted, "
+                  f"{entry['arguments']}")
     else:
         print("No tool calls found with valid timing data.")
-    
-    # Print Processing Time metrics
-    print("\n--- Processing Time (Tool End to Next LLM Start) ---")
-    metrics['processing_stats'] = {}
-    if processing_times:
-        avg_processing = sum(processing_times) / len(processing_times)
-        min_processing = min(processing_times)
-        max_processing = max(processing_times)
-        total_processing = sum(processing_times)
-        print(f"Number of Tool-to-LLM Transitions: {len(processing_times)}")
-        print(f"Average Processing Time: {avg_processing:.2f} ms")
-        print(f"Min Processing Time: {min_processing:.2f} ms")
-        print(f"Max Processing Time: {max_processing:.2f} ms")
-        print(f"Total Processing Time: {total_processing:.2f} ms")
-        # Calculate percentiles
-        sorted_processing = sorted(processing_times)
-        p50 = sorted_processing[len(sorted_processing) // 2]
-        p95 = sorted_processing[int(len(sorted_processing) * 0.95)] if len(sorted_processing) > 0 else 0
-        p99 = sorted_processing[int(len(sorted_processing) * 0.99)] if len(sorted_processing) > 0 else 0
-        print(f"Processing Time P50: {p50:.2f} ms")
-        print(f"Processing Time P95: {p95:.2f} ms")
-        print(f"Processing Time P99: {p99:.2f} ms")
-        metrics['processing_stats'] = {
-            'avg': avg_processing,
-            'min': min_processing,
-            'max': max_processing,
-            'total': total_processing,
-            'p50': p50,
-            'p95': p95,
-            'p99': p99
-        }
+
+    # Independent tool calls between two LLM calls that could run concurrently
+    print("\n--- Parallel Tool Call Opportunities ---")
+    parallel = metrics.parallel_tool_calls
+    if parallel:
+        wall_ms = metrics.end_to_end_latency_ms
+        print(f"Parallelizable Batches: {parallel['batches']} "
+              f"({parallel['parallelizable_calls']} tool calls)")
+        print(f"Saved by Running Batches Concurrently: {parallel['saved_ms']:.2f} ms "
+              f"({parallel['saved_percent_of_trtt']:.2f}% of TRTT"
+              + (f", {parallel['saved_ms'] / wall_ms * 100:.2f}% of E2E latency)" if wall_ms else ")"))
+        if parallel['per_pair']:
+            print("Saved per Tool Pair:")
+            for pair, stats in parallel['per_pair'].items():
+                print(f"  {pair}: {stats['saved_ms']:.2f} ms over {int(stats['count'])} pairs")
+        print("Top Batches by Saved Time:")
+        for batch in parallel['top_batches']:
+            print(f"  {' | '.join(batch['tools'])}: sum {batch['sum_trtt_ms']:.2f} ms, "
+                  f"max {batch['max_trtt_ms']:.2f} ms, saved {batch['saved_ms']:.2f} ms")
     else:
-        print("No tool-to-LLM transitions found with valid timing data.")
-    
-    # Print LLM Execution Time metrics
-    print("\n--- LLM Execution Time ---")
-    metrics['llm_execution_stats'] = {}
-    if llm_execution_times:
-        avg_llm_time = sum(llm_execution_times) / len(llm_execution_times)
-        min_llm_time = min(llm_execution_times)
-        max_llm_time = max(llm_execution_times)
-        total_llm_time = sum(llm_execution_times)
-        print(f"Number of LLM Calls: {len(llm_execution_times)}")
-        print(f"Average LLM Execution Time: {avg_llm_time:.2f} ms")
-        print(f"Min LLM Execution Time: {min_llm_time:.2f} ms")
-        print(f"Max LLM Execution Time: {max_llm_time:.2f} ms")
-        print(f"Total LLM Execution Time: {total_llm_time:.2f} ms ({total_llm_time/1000:.2f} sec)")
-        # Calculate percentiles
-        sorted_llm = sorted(llm_execution_times)
-        p50 = sorted_llm[len(sorted_llm) // 2]
-        p95 = sorted_llm[int(len(sorted_llm) * 0.95)] if len(sorted_llm) > 0 else 0
-        p99 = sorted_llm[int(len(sorted_llm) * 0.99)] if len(sorted_llm) > 0 else 0
-        print(f"LLM Execution Time P50: {p50:.2f} ms")
-        print(f"LLM Execution Time P95: {p95:.2f} ms")
-        print(f"LLM Execution Time P99: {p99:.2f} ms")
-        metrics['llm_execution_stats'] = {
-            'avg': avg_llm_time,
-            'min': min_llm_time,
-            'max': max_llm_time,
-            'total': total_llm_time,
-            'p50': p50,
-            'p95': p95,
-            'p99': p99
-        }
+        print("No tool calls found with valid timing data.")
+
+    # Token cost and redundant (re-sent) prefill per LLM call
+    print("\n--- Token Cost & Prefill Waste ---")
+    token_costs = metrics.token_costs
+    if token_costs:
+        totals = token_costs['totals']
+        print(f"Estimated Cost: ${totals['cost_usd']:.4f}")
+        print(f"Redundant Prefill Tokens: {int(totals['redundant_prefill_tokens'])} "
+              f"of {int(totals['input_tokens'])} input tokens "
+              f"({totals['redundant_prefill_percent'] or 0:.2f}%)")
+        print(f"Redundant Prefill Cost: ${totals['redundant_cost_usd']:.4f}")
+        if 'redundant_prefill_sec' in totals:
+            print(f"Estimated Redundant Prefill Time: {totals['redundant_prefill_sec']:.2f} sec")
+        calls = token_costs['calls']
+        # The full curve is in the JSON export; print evenly spaced calls from the first to the last
+        if len(calls) > TOKEN_GROWTH_POINTS:
+            shown = sorted({round(i * (len(calls) - 1) / (TOKEN_GROWTH_POINTS - 1))
+                            for i in range(TOKEN_GROWTH_POINTS)})
+        else:
+            shown = range(len(calls))
+        print(f"Input Token Growth ({len(shown)} of {len(calls)} calls):")
+        for position in shown:
+            index, call = position + 1, calls[position]
+            print(f"  #{index} +{call['offset_ms'] / 1000:.1f}s {call['model']}: "
+                  f"input {call['input_tokens']}, redundant {call['redundant_prefill_tokens']}, "
+                  f"cumulative {call['cumulative_input_tokens']}, "
+                  f"context {call['context_utilization']:.2%}")
     else:
-        print("No LLM calls found with valid timing data.")
-    
+        print("No LLM calls found with token usage data.")
+
+    # Timeline: LLM-busy, tool-busy, overlapping and idle/framework time
+    print("\n--- Timeline Breakdown (Idle & Framework Overhead) ---")
+    timeline = metrics.timeline
+    if timeline:
+        wall_ms = timeline['wall_time_ms']
+        for label, key in (("LLM Only", 'llm_only_ms'), ("Tool Only", 'tool_only_ms'),
+                           ("LLM + Tool Overlap", 'overlap_ms'), ("Idle / Framework", 'idle_ms')):
+            share = (timeline[key] / wall_ms * 100) if wall_ms > 0 else 0.0
+            print(f"{label:<20} {timeline[key]:.2f} ms ({share:.2f}%)")
+        print(f"Idle Gaps: {timeline['idle_gap_count']}, "
+              f"between different parent spans: {timeline['idle_between_parents_ms']:.2f} ms")
+        print("Idle Time by Transition:")
+        for transition, stats in sorted(timeline['idle_by_transition'].items(),
+                                        key=lambda t: t[1]['total_ms'], reverse=True):
+            print(f"  {transition}: {stats['total_ms']:.2f} ms over {stats['count']} gaps")
+        if timeline['largest_gaps']:
+            print("Largest Idle Gaps:")
+            for gap in timeline['largest_gaps']:
+                before = gap['before']['name'] if gap['before'] else "<start>"
+                after = gap['after']['name'] if gap['after'] else "<end>"
+                print(f"  +{gap['offset_ms']:.2f} ms: {gap['duration_ms']:.2f} ms between {before} and {after}")
+    else:
+        print("No spans found with valid timing data.")
+
+
+def export_metrics(metrics, output_json_path):
+    """Writes a TraceMetrics to output_json_path as JSON."""
+    with open(output_json_path, 'w') as f:
+        json.dump(metrics.to_dict(), f, indent=4)
+
+
+def load_and_print_observations(json_path, output_json_path=None):
+    """
+    Loads observations from a JSON file, prints their metrics and optionally
+    exports them to output_json_path. Returns the TraceMetrics, or None if the
+    file could not be analyzed.
+    """
+    if not os.path.exists(json_path):
+        print(f"Error: File not found at {json_path}")
+        return None
+
+    print(f"Loading observations from: {json_path}")
+    try:
+        data = load_observations(json_path)
+    except json.JSONDecodeError as e:
+        print(f"Error decoding JSON: {e}")
+        return None
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return None
+
+    if not data:
+        print("No data found in JSON file.")
+        return None
+
+    metrics = analyze_observations(data)
+    print_metrics(metrics)
+
     if output_json_path:
         print(f"\nExporting metrics to {output_json_path}...")
         try:
-            with open(output_json_path, 'w') as f:
-                json.dump(metrics, f, indent=4)
+            export_metrics(metrics, output_json_path)
             print("Export successful.")
         except Exception as e:
             print(f"Error exporting metrics to JSON: {e}")
+    return metrics
+
+def write_reports(json_paths, log_name):
+    """
+    Analyzes each dump in one interpreter, writing its report to log_name in
+    the dump's directory. Returns the number of dumps that failed.
+    """
+    import contextlib
+    import traceback
+
+    failed = 0
+    for json_path in json_paths:
+        log_path = os.path.join(os.path.dirname(json_path), log_name)
+        print(f"Processing: {json_path}")
+        print(f"Output: {log_path}")
+        with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+            try:
+                metrics = load_and_print_observations(json_path)
+            except Exception:
+                traceback.print_exc(file=log)
+                metrics = None
+        if metrics is None:
+            failed += 1
+            print("  ✗ Failed")
+        else:
+            print("  ✓ Done")
+        print("")
+    return failed
+
 
 if __name__ == "__main__":
     output_json_file = None
+    if len(sys.argv) > 2 and sys.argv[1] == "--logs":
+        # Batch mode: python analyze_traces.py --logs <log_name> <dump> [<dump> ...]
+        sys.exit(1 if write_reports(sys.argv[3:], sys.argv[2]) else 0)
     if len(sys.argv) > 1:
         json_file = sys.argv[1]
         if len(sys.argv) > 2:
@@ -583,6 +1746,7 @@ if __name__ == "__main__":
 
         if not json_file:
             print("Usage: python analyze_traces.py <path_to_observations_dump.json> [output_metrics.json]")
+            print("       python analyze_traces.py --logs <log_name> <dump.json> [<dump.json> ...]")
             print(
                 "Could not find default 'observations_dump.json' in common locations."
             )
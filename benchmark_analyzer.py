@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for analyze_traces.py.
+
+Generates seeded synthetic traces (see synthetic_traces.py) from 10^3 up to
+10^6 observations, runs the analyzer on each in a fresh interpreter and
+records wall time and peak RSS. Results can be saved as a baseline (timings
+are machine-specific, so it is not committed), and later runs fail (exit
+code 1) when a size regresses beyond the tolerance, or (exit code 2) when
+there is no baseline to compare against:
+
+    python benchmark_analyzer.py --save-baseline
+    python benchmark_analyzer.py --tolerance 0.2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import synthetic_traces
+from synthetic_traces import TraceProfile, write_observations
+
+SIZES = [1000, 10000, 100000, 1000000]
+CACHE_DIR = Path(__file__).resolve().parent / ".bench_cache"
+BASELINE_PATH = Path(__file__).resolve().parent / "benchmark_baseline.json"
+
+# Runs in the child interpreter: analyze one dump with stdout discarded and
+# report wall time and the RSS growth over the interpreter's own footprint.
+_CHILD_SCRIPT = """
+import contextlib, json, os, resource, sys, time
+import analyze_traces
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    started = time.perf_counter()
+    analyze_traces.load_and_print_observations(sys.argv[1])
+    elapsed = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"wall_sec": elapsed, "peak_rss_kb": peak, "rss_growth_kb": peak - rss_before}))
+"""
+
+
+def generator_version() -> str:
+    """Hash of the generator's source, so dumps cached by an older generator are not reused."""
+    return hashlib.sha256(Path(synthetic_traces.__file__).read_bytes()).hexdigest()[:12]
+
+
+def trace_for_size(n_observations: int, seed: int, cache_dir: Path = CACHE_DIR) -> Path:
+    """Return a cached synthetic dump of the requested size, generating it once per generator version."""
+    cache_dir.mkdir(exist_ok=True)
+    path = cache_dir / f"trace_{n_observations}_{seed}_{generator_version()}.json"
+    if not path.exists():
+        print(f"[INFO] Generating {n_observations} observations -> {path}")
+        tmp_path = path.with_suffix(".tmp")
+        write_observations(str(tmp_path), TraceProfile(n_observations=n_observations, seed=seed))
+        os.replace(tmp_path, path)
+    return path
+
+
+def measure(trace_path: Path, repeats: int) -> Dict[str, float]:
+    """Run the analyzer repeats times in fresh interpreters; keep the best run."""
+    runs = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-c", _CHILD_SCRIPT, str(trace_path)],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "wall_sec": min(r["wall_sec"] for r in runs),
+        "peak_rss_kb": min(r["peak_rss_kb"] for r in runs),
+        "rss_growth_kb": min(r["rss_growth_kb"] for r in runs),
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[str]:
+    """List the sizes/metrics that are slower or larger than baseline * (1 + tolerance)."""
+    regressions = []
+    for size, metrics in results.items():
+        reference = baseline.get(size)
+        if not reference:
+            continue
+        for key in ("wall_sec", "peak_rss_kb"):
+            if reference.get(key) and metrics[key] > reference[key] * (1 + tolerance):
+                regressions.append(
+                    f"{size} observations: {key} {metrics[key]:.3f} > baseline {reference[key]:.3f}"
+                    f" (+{(metrics[key] / reference[key] - 1) * 100:.1f}%)")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="observation counts to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="runs per size; the best one is reported")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR,
+                        help="where generated synthetic dumps are kept")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown/growth before failing")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'Observations':>12} {'Wall (s)':>10} {'Peak RSS (MB)':>14} {'RSS growth (MB)':>16}")
+    for size in args.sizes:
+        metrics = measure(trace_for_size(size, args.seed, args.cache_dir), args.repeats)
+        results[str(size)] = metrics
+        print(f"{size:>12} {metrics['wall_sec']:>10.3f} {metrics['peak_rss_kb'] / 1024:>14.1f} "
+              f"{metrics['rss_growth_kb'] / 1024:>16.1f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Baseline saved to: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        # A missing baseline must not pass as "no regressions"
+        print(f"[ERROR] No baseline at {args.baseline}; nothing was compared. "
+              f"Run with --save-baseline on this machine first")
+        return 2
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    if not regressions:
+        print("[INFO] No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
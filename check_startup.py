@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Startup budget check for the CLI entry points.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and fails (exit code 1) when it pulls in a module that should only be
+imported on the code paths that use it (requests, dotenv, multiprocessing,
+...), or when its cumulative import time grows by more than the tolerance.
+Import times are compared relative to a bare `import json` timed in the
+same run, so the budgets hold on slower and faster machines alike. Run it
+as a CI step, or through pytest:
+
+    python check_startup.py
+    python check_startup.py --tolerance 1.0   # noisy runner: allow 2x
+    python -m pytest check_startup.py
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Module every entry point's import time is divided by; timed the same way
+# in the same run, it cancels out the speed of the machine
+REFERENCE_MODULE = "json"
+
+# Entry point -> cumulative import time as a multiple of REFERENCE_MODULE's
+# (fastest of 5 warm imports, Python 3.11) once the heavy imports were deferred
+BASELINE_RATIO = {
+    "analyze_traces": 3.5,
+    "ciso_vllm_benchmark": 5.0,
+    "tool_cache": 5.0,
+    "run_dumps": 4.5,
+}
+# Allowed slowdown over the baseline before the check fails: imports this
+# short vary by 20-30% between runs, so only real regressions trip 50%
+DEFAULT_TOLERANCE = 0.5
+
+# Modules an entry point must not import just by being imported
+DEFERRED_MODULES = {
+    "analyze_traces": ["requests", "dotenv", "multiprocessing", "pandas"],
+    "ciso_vllm_benchmark": ["requests", "dotenv", "multiprocessing", "vllm"],
+    "tool_cache": ["requests", "dotenv", "multiprocessing"],
+    "run_dumps": ["requests", "dotenv", "multiprocessing"],
+}
+
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\S+)$")
+
+# Runs in the child interpreter: import the entry point, then report which
+# deferred modules ended up in sys.modules
+_CHILD_SCRIPT = "import sys, {module}, json; print(json.dumps([m for m in {deferred!r} if m in sys.modules]))"
+
+
+def measure_import(module: str, deferred: List[str]) -> Tuple[float, List[str]]:
+    """Import module once in a fresh interpreter; return (cumulative ms, deferred modules loaded)."""
+    env = dict(os.environ)
+    # Let the warm-up run write bytecode so later runs do not time compilation
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         _CHILD_SCRIPT.format(module=module, deferred=deferred)],
+        cwd=Path(__file__).resolve().parent, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and match.group(3) == module:
+            cumulative_us = int(match.group(2))
+    if cumulative_us is None:
+        raise RuntimeError(f"No importtime entry for {module}:\n{result.stderr}")
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return cumulative_us / 1000, loaded
+
+
+def fastest_import(module: str, deferred: List[str], repeats: int) -> Tuple[float, List[str]]:
+    """Warm up, then return the fastest of `repeats` timed imports and the deferred modules loaded."""
+    measure_import(module, deferred)
+    runs = [measure_import(module, deferred) for _ in range(repeats)]
+    return min(ms for ms, _ in runs), runs[-1][1]
+
+
+def check(baselines: Dict[str, float], repeats: int = 5,
+          tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """List the entry points that are over budget (baseline ratio * (1 + tolerance)) or import deferred modules."""
+    failures = []
+    reference_ms, _ = fastest_import(REFERENCE_MODULE, [], repeats)
+    print(f"[INFO] import {REFERENCE_MODULE}: {reference_ms:.1f} ms (ratios below are relative to it)")
+    print(f"{'Entry point':<22} {'Import (ms)':>12} {'Ratio':>8} {'Baseline':>9} {'Budget':>8}")
+    for module, baseline_ratio in baselines.items():
+        import_ms, loaded = fastest_import(module, DEFERRED_MODULES.get(module, []), repeats)
+        ratio = import_ms / reference_ms
+        budget = baseline_ratio * (1 + tolerance)
+        print(f"{module:<22} {import_ms:>12.1f} {ratio:>8.2f} {baseline_ratio:>9.2f} {budget:>8.2f}")
+        if ratio > budget:
+            failures.append(f"{module}: import took {ratio:.2f}x `import {REFERENCE_MODULE}` > budget {budget:.2f}x")
+        if loaded:
+            failures.append(f"{module}: imports {', '.join(loaded)} at module load")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=list(BASELINE_RATIO),
+                        help="entry points to check (default: all)")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="timed imports per entry point; the fastest is used")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown over the baseline before failing")
+    args = parser.parse_args(argv)
+
+    unknown = [m for m in args.modules if m not in BASELINE_RATIO]
+    if unknown:
+        parser.error(f"no baseline for: {', '.join(unknown)}")
+
+    failures = check({m: BASELINE_RATIO[m] for m in args.modules}, args.repeats, args.tolerance)
+    for failure in failures:
+        print(f"[REGRESSION] {failure}")
+    if not failures:
+        print("[INFO] All entry points within their startup budget")
+    return 1 if failures else 0
+
+
+def test_startup_budgets():
+    """pytest entry point: every entry point within its budget."""
+    failures = check(BASELINE_RATIO)
+    assert not failures, "\n".join(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
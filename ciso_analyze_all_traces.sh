@@ -11,24 +11,9 @@ if [[ ! -f "$ANALYZE_SCRIPT" ]]; then
     exit 1
 fi
 
-# Find all observations_dump.json files in ciso_traces_* directories
-find "${SCRIPT_DIR}/../ciso_traces"_* -name "observations_dump.json" 2>/dev/null | while read -r json_file; do
-    # Get the directory containing the JSON file
-    dir=$(dirname "$json_file")
-    output_file="${dir}/analysis.log"
-    
-    echo "Processing: $json_file"
-    echo "Output: $output_file"
-    
-    # Run the analysis script and redirect output to analysis.log
-    python3 "$ANALYZE_SCRIPT" "$json_file" > "$output_file" 2>&1
-    
-    if [[ $? -eq 0 ]]; then
-        echo "  ✓ Done"
-    else
-        echo "  ✗ Failed"
-    fi
-    echo ""
-done
+# Find all observations_dump.json files in ciso_traces_* directories and analyze
+# them in a single interpreter; each report goes to analysis.log next to its dump
+find "${SCRIPT_DIR}/../ciso_traces"_* -name "observations_dump.json" -print0 2>/dev/null \
+    | xargs -0 -r python3 "$ANALYZE_SCRIPT" --logs analysis.log
 
 echo "All analyses complete!"
@@ -10,41 +10,82 @@ Requires:
 - Prometheus scraping vLLM at localhost:8000/metrics
 """
 
-import multiprocessing
+import argparse
+import shutil
 import subprocess
-import requests
 import time
 import json
 import signal
 import os
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
 from dataclasses import dataclass, asdict, field
 from urllib.parse import urlparse
-from dotenv import load_dotenv  # if using .env file
 
-load_dotenv() 
-_llm_url = os.getenv("LLM_BASE_URL", "http://localhost:8000/v1")
-_parsed = urlparse(_llm_url)
+from adaptive_repeats import SAMPLES_FILENAME, add_repeat_arguments, analyze_repeat, policy_from_args, run_adaptive
+from resource_sampler import DEFAULT_INTERVAL_SEC, ResourceSampler, print_resource_summary
+
+# requests, multiprocessing and dotenv are imported where they are used, so
+# that importing this module (e.g. for TestMetrics) stays cheap
+if TYPE_CHECKING:
+    import multiprocessing
+
+
+def _config_from_env():
+    """Build the vLLM config, vLLM URL and Prometheus URL from the environment."""
+    llm_url = os.getenv("LLM_BASE_URL", "http://localhost:8000/v1")
+    parsed = urlparse(llm_url)
+    vllm_config = {
+        # "model": "Qwen/Qwen2.5-7B-Instruct",
+        "model": os.getenv("OPENAI_MODEL_NAME", "Qwen/Qwen2.5-7B-Instruct"),
+        "host": "0.0.0.0",
+        "port": parsed.port or 8000,
+        "trust_remote_code": True,
+        "enable_auto_tool_choice": True,
+        "tool_call_parser": "hermes",
+        "enable_prefix_cache": True,
+        "context_window": 32768,
+    }
+    vllm_url = f"{parsed.scheme}://{vllm_config['host']}:{vllm_config['port']}"
+    prometheus_url = os.getenv("PROMETHEUS_URL", "http://localhost:9090")
+    return vllm_config, vllm_url, prometheus_url
+
 
 # Configuration
-VLLM_CONFIG = {
-    # "model": "Qwen/Qwen2.5-7B-Instruct",
-    "model": os.getenv("OPENAI_MODEL_NAME", "Qwen/Qwen2.5-7B-Instruct"),
-    "host": "0.0.0.0",
-    "port": _parsed.port or 8000,
-    "trust_remote_code": True,
-    "enable_auto_tool_choice": True,
-    "tool_call_parser": "hermes",
-    "enable_prefix_cache": True,
-    "context_window": 32768,
-}
-
-VLLM_URL = f"{_parsed.scheme}://{VLLM_CONFIG['host']}:{VLLM_CONFIG['port']}"
+VLLM_CONFIG, VLLM_URL, PROMETHEUS_URL = _config_from_env()
 
 RESULTS_DIR = Path("../ciso_traces")
-PROMETHEUS_URL = os.getenv("PROMETHEUS_URL", "http://localhost:9090")
+
+# Raw vLLM series saved with each test so individual LLM calls can later be
+# lined up with the server's queue/prefill/decode counters (vllm_trace_join.py)
+SERIES_METRICS = [
+    "vllm:request_queue_time_seconds_sum",
+    "vllm:request_queue_time_seconds_count",
+    "vllm:request_prefill_time_seconds_sum",
+    "vllm:request_prefill_time_seconds_count",
+    "vllm:request_decode_time_seconds_sum",
+    "vllm:request_decode_time_seconds_count",
+    "vllm:e2e_request_latency_seconds_sum",
+    "vllm:e2e_request_latency_seconds_count",
+    "vllm:time_to_first_token_seconds_sum",
+    "vllm:time_to_first_token_seconds_count",
+    "vllm:prefix_cache_queries_total",
+    "vllm:prefix_cache_hits_total",
+    "vllm:num_requests_running",
+    "vllm:num_requests_waiting",
+]
+
+# Containers started by ciso_scripts/scripts_<id>.sh, sampled with the vLLM server
+SAMPLED_CONTAINERS = ["ciso-agent", "ciso-task-scenario"]
+
+
+def load_env_config() -> None:
+    """Load a .env file (if any) and rebuild the configuration from it."""
+    global VLLM_CONFIG, VLLM_URL, PROMETHEUS_URL
+    from dotenv import load_dotenv
+    load_dotenv()
+    VLLM_CONFIG, VLLM_URL, PROMETHEUS_URL = _config_from_env()
 
 @dataclass
 class TestMetrics:
@@ -81,10 +122,15 @@ class TestMetrics:
     # Prefix cache
     prefix_cache_hit_rate_perc: Optional[float] = None
 
+    # Container/process CPU, memory and I/O per phase (resource_sampler.py)
+    resources: Optional[Dict[str, Any]] = None
+
 
 def _run_vllm_server(config: dict):
     """Run vLLM server using the CLI entry point."""
     import sys
+    # Per-server environment, e.g. CUDA_VISIBLE_DEVICES for one replica of several
+    os.environ.update(config.get("env", {}))
     sys.argv = [
         "vllm", "serve", config["model"],
         "--host", config["host"],
@@ -92,6 +138,7 @@ def _run_vllm_server(config: dict):
         "--trust-remote-code",
         "--enable-auto-tool-choice",
         "--tool-call-parser", config["tool_call_parser"],
+        *config.get("extra_args", []),
     ]
     try:
         from vllm.entrypoints.cli.main import main as vllm_main
@@ -105,16 +152,21 @@ class VLLMServer:
     
     def __init__(self, config: dict = None):
         self.config = config or VLLM_CONFIG
-        self.process: Optional[multiprocessing.Process] = None
+        self.url = f"{urlparse(VLLM_URL).scheme}://{self.config['host']}:{self.config['port']}"
+        self.process: Optional["multiprocessing.Process"] = None
     
     def start(self) -> None:
-        print("[INFO] Starting vLLM server...")
+        import multiprocessing
+
+        print(f"[INFO] Starting vLLM server on port {self.config['port']}...")
         ctx = multiprocessing.get_context("spawn")
         self.process = ctx.Process(target=_run_vllm_server, args=(self.config,), daemon=False)
         self.process.start()
         print(f"[INFO] vLLM started with PID: {self.process.pid}")
     
     def wait_until_ready(self, timeout: int = 300) -> bool:
+        import requests
+
         print("[INFO] Waiting for vLLM to be ready...")
         start = time.time()
         while time.time() - start < timeout:
@@ -122,7 +174,7 @@ class VLLMServer:
                 print("\n[ERROR] vLLM process died")
                 return False
             try:
-                if requests.get(f"{VLLM_URL}/health", timeout=2).status_code == 200:
+                if requests.get(f"{self.url}/health", timeout=2).status_code == 200:
                     print("\n[INFO] vLLM is ready")
                     return True
             except requests.RequestException:
@@ -152,11 +204,29 @@ class VLLMServer:
         self.stop()
 
 
+def _sum_samples(series: List[List[tuple]]) -> List[List[float]]:
+    """
+    Sums the sample lists of several label sets into one. Each label set keeps
+    its last value until its next sample (0 before its first), and the sum has
+    a sample at every timestamp at which any of them was scraped.
+    """
+    current = [0.0] * len(series)
+    events = sorted((t, index, value) for index, samples in enumerate(series) for t, value in samples)
+    summed: List[List[float]] = []
+    for t, index, value in events:
+        current[index] = value
+        if summed and summed[-1][0] == t:
+            summed[-1][1] = sum(current)
+        else:
+            summed.append([t, sum(current)])
+    return summed
+
+
 class PrometheusMetrics:
     """Query all metrics from Prometheus - no local calculations."""
     
-    def __init__(self, prometheus_url: str = PROMETHEUS_URL):
-        self.prometheus_url = prometheus_url
+    def __init__(self, prometheus_url: Optional[str] = None):
+        self.prometheus_url = prometheus_url or PROMETHEUS_URL
         self.start_time: Optional[datetime] = None
         self.end_time: Optional[datetime] = None
     
@@ -179,6 +249,8 @@ class PrometheusMetrics:
     
     def _query_instant(self, query: str) -> Optional[float]:
         """Execute instant query at end_time."""
+        import requests
+
         try:
             resp = requests.get(
                 f"{self.prometheus_url}/api/v1/query",
@@ -196,6 +268,8 @@ class PrometheusMetrics:
     
     def _query_range_max(self, metric: str) -> Optional[float]:
         """Query max value over the test time range."""
+        import requests
+
         try:
             resp = requests.get(
                 f"{self.prometheus_url}/api/v1/query_range",
@@ -215,6 +289,33 @@ class PrometheusMetrics:
             print(f"[WARN] Range query failed: {metric} - {e}")
         return None
     
+    def query_series(self, metric: str) -> List[List[float]]:
+        """
+        Raw [timestamp, value] samples of a metric (summed over labels) over the
+        test time range, at the scrape timestamps. A query_range would resample
+        them onto its step and hide when a counter actually changed.
+        """
+        import requests
+
+        window = max(int(self.duration + 0.999), 1)
+        try:
+            resp = requests.get(
+                f"{self.prometheus_url}/api/v1/query",
+                params={"query": f"{metric}[{window}s]", "time": self.end_time.timestamp()},
+                timeout=30,
+            )
+            data = resp.json()
+            if data.get("status") == "success":
+                return _sum_samples([[(float(t), float(v)) for t, v in result["values"]]
+                                     for result in data["data"]["result"]])
+        except Exception as e:
+            print(f"[WARN] Series query failed: {metric} - {e}")
+        return []
+
+    def collect_series(self) -> Dict[str, List[List[float]]]:
+        """Raw samples of every SERIES_METRICS metric over the test time range."""
+        return {metric: self.query_series(metric) for metric in SERIES_METRICS}
+
     def collect(self) -> Dict[str, Any]:
         """Collect all metrics using Prometheus queries."""
         d = int(self.duration) + 10  # Add buffer for scrape interval
@@ -307,29 +408,46 @@ def run_test_script(test_id: str, test_name: str, log_file: Path) -> int:
     return result.returncode
 
 
-def run_single_test(test_id: str, test_name: str) -> TestMetrics:
+def run_single_test(test_id: str, test_name: str,
+                    resource_interval: float = DEFAULT_INTERVAL_SEC) -> TestMetrics:
     """Run a single test with fresh vLLM and Prometheus-based metrics."""
     print("=" * 60)
     print(f"[TEST] {test_name} (ID: {test_id})")
     print("=" * 60)
     
-    with VLLMServer():
-        prom = PrometheusMetrics()
-        prom.start()
-        
-        run_test_script(test_id, test_name, RESULTS_DIR / test_name / "run.log")
-        
-        prom.stop()
-        metrics = prom.collect()
-        
-        return TestMetrics(
-            test_id=test_id,
-            test_name=test_name,
-            start_time=prom.start_time.isoformat(),
-            end_time=prom.end_time.isoformat(),
-            duration_seconds=round(prom.duration, 3),
-            **metrics,
-        )
+    server = VLLMServer()
+    sampler = ResourceSampler(resource_interval)
+    sampler.add_process("vllm", lambda: server.process.pid if server.process else None)
+    for container in SAMPLED_CONTAINERS:
+        sampler.add_container(container)
+    sampler.start()
+    sampler.mark_phase("vllm_startup")
+    try:
+        with server:
+            sampler.mark_phase("scenario")
+            prom = PrometheusMetrics()
+            prom.start()
+            
+            run_test_script(test_id, test_name, RESULTS_DIR / test_name / "run.log")
+            
+            prom.stop()
+            sampler.mark_phase("metrics_collection")
+            metrics = prom.collect()
+            save_series(prom.collect_series(), test_name)
+            sampler.mark_phase("vllm_shutdown")
+    finally:
+        sampler.stop()
+    save_resources(sampler, test_name)
+    
+    return TestMetrics(
+        test_id=test_id,
+        test_name=test_name,
+        start_time=prom.start_time.isoformat(),
+        end_time=prom.end_time.isoformat(),
+        duration_seconds=round(prom.duration, 3),
+        resources=sampler.summary(),
+        **metrics,
+    )
 
 
 def save_metrics(metrics: TestMetrics, test_name : str) -> Path:
@@ -345,6 +463,29 @@ def save_metrics(metrics: TestMetrics, test_name : str) -> Path:
     return filepath
 
 
+def save_series(series: Dict[str, List[List[float]]], test_name: str) -> Path:
+    """Save raw vLLM series to JSON, next to the test's metrics."""
+    (RESULTS_DIR / test_name).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filepath = RESULTS_DIR / test_name / f"vllm_series_{timestamp}.json"
+
+    with open(filepath, "w") as f:
+        json.dump(series, f)
+
+    print(f"[INFO] vLLM series saved to: {filepath}")
+    return filepath
+
+
+def save_resources(sampler: ResourceSampler, test_name: str) -> Path:
+    """Save the resource time series and their summary to JSON, next to the test's metrics."""
+    (RESULTS_DIR / test_name).mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filepath = RESULTS_DIR / test_name / f"resources_{timestamp}.json"
+    sampler.save(str(filepath))
+    print(f"[INFO] Resource samples saved to: {filepath}")
+    return filepath
+
+
 def print_summary(m: TestMetrics):
     """Print test results summary."""
     print(f"\n{'='*60}")
@@ -359,16 +500,46 @@ def print_summary(m: TestMetrics):
     print(f"Avg Time/Token:\t{m.avg_inter_token_latency_seconds}s")
     print(f"Max KV Cache:\t{m.max_kv_cache_usage_perc}%")
     print(f"Prefix Cache Hit Rate:\t{m.prefix_cache_hit_rate_perc}%")
+    if m.resources:
+        print_resource_summary(m.resources)
     print()
 
 
-def main():
+def collect_repeat(test_name: str, repeat: int) -> Optional[Dict[str, float]]:
+    """
+    Move a run's trace and logs into <test>/rep_<n>/ so the next repeat
+    does not overwrite them, and analyze its trace there.
+    """
+    test_dir = RESULTS_DIR / test_name
+    repeat_dir = test_dir / f"rep_{repeat}"
+    repeat_dir.mkdir(parents=True, exist_ok=True)
+    for filename in ("observations_dump.json", "run.log", "evaluate.log"):
+        if (test_dir / filename).exists():
+            shutil.move(str(test_dir / filename), str(repeat_dir / filename))
+    if not (repeat_dir / "observations_dump.json").exists():
+        print(f"[WARN] No observations_dump.json for {test_name} repeat {repeat}")
+        return None
+    return analyze_repeat(str(repeat_dir / "observations_dump.json"), str(repeat_dir / "analysis.json"))
+
+
+def main(argv: Optional[List[str]] = None):
     """Main entry point."""
     tests = {
         "1": "1.gen-cis-b-k8s-kyverno",
         "2": "2.gen-cis-b-k8s-kubectl-opa",
         "4": "4.upd-cis-b-k8s-kyverno",
     }
+
+    parser = argparse.ArgumentParser(description="vLLM test runner with Prometheus-based metrics")
+    parser.add_argument("--tests", nargs="+", choices=list(tests), default=list(tests),
+                        help="test ids to run (default: all)")
+    parser.add_argument("--resource-interval", type=float, default=DEFAULT_INTERVAL_SEC,
+                        help="seconds between container/vLLM resource samples (default: %(default)s)")
+    add_repeat_arguments(parser)
+    args = parser.parse_args(argv)
+    tests = {test_id: tests[test_id] for test_id in args.tests}
+
+    load_env_config()
     
     def cleanup(signum, frame):
         print("\n[INFO] Interrupted - exiting...")
@@ -376,10 +547,28 @@ def main():
     
     signal.signal(signal.SIGINT, cleanup)
     signal.signal(signal.SIGTERM, cleanup)
-    
+
+    if args.adaptive:
+        test_ids = {f"ciso/{test_name}": test_id for test_id, test_name in tests.items()}
+
+        def run_once(scenario: str, repeat: int) -> Optional[Dict[str, float]]:
+            test_name = tests[test_ids[scenario]]
+            try:
+                metrics = run_single_test(test_ids[scenario], test_name, args.resource_interval)
+                save_metrics(metrics, test_name)
+                print_summary(metrics)
+            except Exception as e:
+                print(f"[ERROR] Test {test_name} failed: {e}")
+                return None
+            return collect_repeat(test_name, repeat)
+
+        run_adaptive(list(test_ids), run_once, policy_from_args(args), str(RESULTS_DIR / SAMPLES_FILENAME))
+        print(f"[DONE] Adaptive repeats completed; samples in {RESULTS_DIR / SAMPLES_FILENAME}")
+        return
+
     for test_id, test_name in tests.items():
         try:
-            metrics = run_single_test(test_id, test_name)
+            metrics = run_single_test(test_id, test_name, args.resource_interval)
             save_metrics(metrics, test_name)
             print_summary(metrics)
         except Exception as e:
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Fetch agent traces from the Langfuse public API as observation dumps.
+
+Pulls every observation of a trace (or of all traces of a session, or of a
+time window) from /api/public/observations, several pages at a time over a
+pool of keep-alive connections, and writes them to disk as they arrive in
+the JSON array format analyze_traces.py reads. Each trace is cached under
+--cache-dir by its id, so a trace is only downloaded once. Traces of a run
+that just ended may still be ingesting; --settle polls them until they stop
+changing before they are cached:
+
+    python langfuse_fetch.py --trace <trace_id> [<trace_id> ...] -o observations_dump.json
+    python langfuse_fetch.py --session <session_id> -o observations_dump.json
+    python langfuse_fetch.py --since 2025-11-01T12:00:00Z --until 2025-11-01T12:30:00Z -o dump.json
+
+Credentials come from LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY and
+LANGFUSE_BASE_URL (or a .env file). mock_langfuse.py serves recorded dumps
+through the same API for local testing.
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+from analyze_traces import iter_json_array
+
+DEFAULT_BASE_URL = "https://cloud.langfuse.com"
+DEFAULT_CACHE_DIR = ".langfuse_cache"
+# Largest page size the public API accepts
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT_SEC = 30.0
+# Attempts per request on connection errors, 429 and 5xx responses
+MAX_ATTEMPTS = 4
+# Seconds between fetches of traces that may still be ingesting
+SETTLE_POLL_SEC = 10.0
+
+CAMEL_CASE_RE = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+class LangfuseError(Exception):
+    """A Langfuse API request failed."""
+
+
+def snake_case_keys(observation: dict) -> dict:
+    """Rename the API's camelCase fields (startTime, usageDetails, ...) to the dump's snake_case."""
+    return {CAMEL_CASE_RE.sub("_", key).lower(): value for key, value in observation.items()}
+
+
+class LangfuseClient:
+    """
+    Minimal Langfuse public API client. Each worker thread keeps its own
+    keep-alive connection, so concurrent page requests reuse up to one
+    connection per thread instead of reconnecting for every page.
+    """
+
+    def __init__(self, base_url: str, public_key: str, secret_key: str,
+                 timeout: float = DEFAULT_TIMEOUT_SEC):
+        parsed = urlparse(base_url)
+        self._https = parsed.scheme == "https"
+        self._host = parsed.hostname
+        self._port = parsed.port
+        self._prefix = parsed.path.rstrip("/")
+        self._timeout = timeout
+        token = base64.b64encode(f"{public_key}:{secret_key}".encode()).decode()
+        self._headers = {"Authorization": f"Basic {token}", "Accept": "application/json"}
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            connection = connection_class(self._host, self._port, timeout=self._timeout)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, path: str, params: Dict[str, object]) -> dict:
+        """GET an API path and decode its JSON body, retrying transient failures."""
+        url = f"{self._prefix}{path}?{urlencode({k: v for k, v in params.items() if v is not None})}"
+        for attempt in range(MAX_ATTEMPTS):
+            delay = 2 ** attempt * 0.5
+            connection = self._connection()
+            try:
+                connection.request("GET", url, headers=self._headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                # Stale keep-alive connection or network error: reconnect and retry
+                connection.close()
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise LangfuseError(f"GET {url} failed: {e}") from e
+                time.sleep(delay)
+                continue
+            if response.status == 200:
+                return json.loads(body)
+            if response.status == 429 or response.status >= 500:
+                if attempt < MAX_ATTEMPTS - 1:
+                    retry_after = response.getheader("Retry-After")
+                    time.sleep(float(retry_after) if retry_after and retry_after.isdigit() else delay)
+                    continue
+            raise LangfuseError(f"GET {url} returned HTTP {response.status}: {body[:200]!r}")
+        raise LangfuseError(f"GET {url} failed after {MAX_ATTEMPTS} attempts")
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+def client_from_env() -> Optional[LangfuseClient]:
+    """A client for the Langfuse configured in the environment (or .env), or None."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        pass
+    else:
+        load_dotenv()
+    public_key = os.getenv("LANGFUSE_PUBLIC_KEY")
+    secret_key = os.getenv("LANGFUSE_SECRET_KEY")
+    if not public_key or not secret_key:
+        return None
+    base_url = os.getenv("LANGFUSE_BASE_URL") or os.getenv("LANGFUSE_HOST") or DEFAULT_BASE_URL
+    return LangfuseClient(base_url, public_key, secret_key)
+
+
+def _paginate(client: LangfuseClient, path: str, params: Dict[str, object], page_size: int,
+              executor: ThreadPoolExecutor) -> Iterator[List[dict]]:
+    """
+    Yield the data of every page of a list endpoint in page order. The first
+    page gives the page count; the rest are fetched concurrently.
+    """
+    first = client.get(path, {**params, "page": 1, "limit": page_size})
+    yield first.get("data", [])
+    total_pages = (first.get("meta") or {}).get("totalPages") or 1
+    futures = [executor.submit(client.get, path, {**params, "page": page, "limit": page_size})
+               for page in range(2, total_pages + 1)]
+    try:
+        for future in futures:
+            yield future.result().get("data", [])
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def list_trace_ids(client: LangfuseClient, executor: ThreadPoolExecutor, session_id: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> List[str]:
+    """Ids of the traces of a session and/or time window, oldest first."""
+    traces = []
+    params = {"sessionId": session_id, "fromTimestamp": since, "toTimestamp": until}
+    for page in _paginate(client, "/api/public/traces", params, page_size, executor):
+        traces.extend(page)
+    traces.sort(key=lambda t: t.get("timestamp") or "")
+    return list(dict.fromkeys(t["id"] for t in traces))
+
+
+def fetch_trace(client: LangfuseClient, trace_id: str, path: str, executor: ThreadPoolExecutor,
+                page_size: int = DEFAULT_PAGE_SIZE) -> int:
+    """
+    Write the observations of a trace to path as a JSON array, page by page,
+    as the pages arrive. The file only appears once the trace is complete.
+    Returns the number of observations; raises LangfuseError if there are
+    none (unknown trace, or not ingested yet), so nothing empty is cached.
+    """
+    partial_path = f"{path}.part"
+    seen = set()
+    try:
+        with open(partial_path, "w") as f:
+            f.write("[")
+            for page in _paginate(client, "/api/public/observations", {"traceId": trace_id},
+                                  page_size, executor):
+                for observation in page:
+                    # Pages can shift while a running trace grows: skip repeats
+                    if observation.get("id") in seen:
+                        continue
+                    seen.add(observation.get("id"))
+                    f.write(",\n" if len(seen) > 1 else "\n")
+                    json.dump(snake_case_keys(observation), f, default=str)
+            f.write("\n]\n")
+    except BaseException:
+        os.remove(partial_path)
+        raise
+    if not seen:
+        os.remove(partial_path)
+        raise LangfuseError(f"No observations found for trace {trace_id}")
+    os.replace(partial_path, path)
+    return len(seen)
+
+
+def cached_trace(client: LangfuseClient, trace_id: str, cache_dir: str, executor: ThreadPoolExecutor,
+                 page_size: int = DEFAULT_PAGE_SIZE, refresh: bool = False) -> str:
+    """Path of a trace's cached dump, fetching it first if missing (or refresh)."""
+    path = os.path.join(cache_dir, f"{trace_id}.json")
+    if refresh or not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        count = fetch_trace(client, trace_id, path, executor, page_size)
+        print(f"[INFO] Fetched {count} observations of trace {trace_id}")
+    return path
+
+
+def fetch_settled(client: LangfuseClient, executor: ThreadPoolExecutor, trace_ids: Optional[List[str]],
+                  session_id: Optional[str], since: Optional[str], until: Optional[str], cache_dir: str,
+                  timeout_sec: float, page_size: int = DEFAULT_PAGE_SIZE,
+                  poll_sec: float = SETTLE_POLL_SEC) -> Tuple[Dict[str, str], bool]:
+    """
+    Fetch traces that may still be ingesting. Langfuse ingests
+    asynchronously, so right after a run a trace can be missing observations
+    or not be listed at all. All of them are fetched again (bypassing the
+    cache) every poll_sec until two rounds return the same traces with the
+    same observation counts, or timeout_sec passes. Returns trace id -> dump
+    path (outside the cache) and whether the traces settled.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    deadline = time.monotonic() + timeout_sec
+    previous = None
+    while True:
+        ids = trace_ids or list_trace_ids(client, executor, session_id, since, until, page_size)
+        counts = {}
+        for trace_id in ids:
+            try:
+                counts[trace_id] = fetch_trace(client, trace_id, _settling_path(cache_dir, trace_id),
+                                               executor, page_size)
+            except LangfuseError:
+                # Not ingested yet
+                counts[trace_id] = 0
+        settled = bool(counts) and all(counts.values()) and counts == previous
+        if settled or time.monotonic() + poll_sec > deadline:
+            break
+        print(f"[INFO] Waiting for Langfuse to ingest {len(counts)} traces "
+              f"({sum(counts.values())} observations so far)")
+        previous = counts
+        time.sleep(poll_sec)
+    if not settled:
+        print(f"[WARN] Traces still changing after {timeout_sec:.0f} s; using them uncached")
+    return {trace_id: _settling_path(cache_dir, trace_id) for trace_id, count in counts.items() if count}, settled
+
+
+def _settling_path(cache_dir: str, trace_id: str) -> str:
+    return os.path.join(cache_dir, f"{trace_id}.json.settling")
+
+
+def merge_dumps(paths: List[str], output_path: str) -> int:
+    """Concatenate observation dumps into one, streaming. Returns the observation count."""
+    count = 0
+    partial_path = f"{output_path}.part"
+    with open(partial_path, "w") as out:
+        out.write("[")
+        for path in paths:
+            with open(path, "r") as f:
+                for observation in iter_json_array(f):
+                    out.write(",\n" if count else "\n")
+                    json.dump(observation, out)
+                    count += 1
+        out.write("\n]\n")
+    os.replace(partial_path, output_path)
+    return count
+
+
+def fetch_dump(client: LangfuseClient, output_path: str, trace_ids: Optional[List[str]] = None,
+               session_id: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+               cache_dir: str = DEFAULT_CACHE_DIR, workers: int = DEFAULT_WORKERS,
+               page_size: int = DEFAULT_PAGE_SIZE, refresh: bool = False,
+               settle_sec: Optional[float] = None) -> int:
+    """
+    Fetch the given traces (or those of a session / time window) into one
+    observation dump at output_path. Returns the number of observations.
+    With settle_sec, traces of a run that just ended are polled until they
+    stop changing (see fetch_settled) and only cached once they have.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if settle_sec is not None:
+            fetched, settled = fetch_settled(client, executor, trace_ids, session_id, since, until,
+                                             cache_dir, settle_sec, page_size)
+            if not fetched:
+                raise LangfuseError("No traces found")
+            try:
+                count = merge_dumps(list(fetched.values()), output_path)
+            finally:
+                for trace_id, path in fetched.items():
+                    if settled:
+                        os.replace(path, os.path.join(cache_dir, f"{trace_id}.json"))
+                    else:
+                        os.remove(path)
+            return count
+        if not trace_ids:
+            trace_ids = list_trace_ids(client, executor, session_id, since, until, page_size)
+        if not trace_ids:
+            raise LangfuseError("No traces found")
+        paths = [cached_trace(client, trace_id, cache_dir, executor, page_size, refresh)
+                 for trace_id in trace_ids]
+    return merge_dumps(paths, output_path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    selection = parser.add_argument_group("traces to fetch")
+    selection.add_argument("--trace", nargs="+", dest="trace_ids", metavar="TRACE_ID")
+    selection.add_argument("--session", metavar="SESSION_ID")
+    selection.add_argument("--since", help="ISO timestamp; traces started at or after it")
+    selection.add_argument("--until", help="ISO timestamp; traces started before it")
+    parser.add_argument("-o", "--output", default="observations_dump.json",
+                        help="observation dump to write (default: %(default)s)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--refresh", action="store_true", help="re-fetch traces that are already cached")
+    parser.add_argument("--settle", type=float, metavar="SECONDS",
+                        help="traces may still be ingesting: re-fetch them until they stop changing, "
+                             "for up to SECONDS, before caching them")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent page requests")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args(argv)
+
+    if not (args.trace_ids or args.session or args.since or args.until):
+        parser.error("give --trace, --session or a --since/--until window")
+    client = client_from_env()
+    if client is None:
+        print("[WARN] LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY must be set")
+        return 2
+    try:
+        count = fetch_dump(client, args.output, args.trace_ids, args.session, args.since, args.until,
+                           args.cache_dir, args.workers, args.page_size, args.refresh, args.settle)
+    except LangfuseError as e:
+        print(f"[WARN] {e}")
+        return 1
+    finally:
+        client.close()
+    print(f"[INFO] Wrote {count} observations to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
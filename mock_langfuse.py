@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Langfuse public API, serving recorded observation dumps.
+
+Each dump is served as one trace (its id is the observations' trace_id, or
+the file name without .json) through the paginated /api/public/traces and
+/api/public/observations endpoints, with camelCase fields as the real API
+returns them. Use it to exercise langfuse_fetch.py without a Langfuse
+deployment:
+
+    python mock_langfuse.py <dump.json> ... [--port 3999] [--delay-ms 50]
+    LANGFUSE_BASE_URL=http://localhost:3999 LANGFUSE_PUBLIC_KEY=pk LANGFUSE_SECRET_KEY=sk \\
+        python langfuse_fetch.py --trace <trace_id> -o out.json
+"""
+
+import argparse
+import base64
+import json
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from analyze_traces import iter_json_array
+
+MAX_PAGE_SIZE = 100
+
+
+def camel_case_keys(observation: dict) -> dict:
+    def camel(key: str) -> str:
+        head, *rest = key.split("_")
+        return head + "".join(part.title() for part in rest)
+    return {camel(key): value for key, value in observation.items()}
+
+
+class MockLangfuse:
+    """Traces and their observations, as the API would list them."""
+
+    def __init__(self, dump_paths: List[str]):
+        self.traces: List[dict] = []
+        self.observations: Dict[str, List[dict]] = {}
+        for path in dump_paths:
+            with open(path, "r") as f:
+                observations = list(iter_json_array(f))
+            trace_id = next((o["trace_id"] for o in observations if o.get("trace_id")),
+                            os.path.splitext(os.path.basename(path))[0])
+            starts = sorted(o["start_time"] for o in observations if o.get("start_time"))
+            self.traces.append({"id": trace_id, "timestamp": starts[0] if starts else None,
+                                "sessionId": observations[0].get("session_id") if observations else None})
+            self.observations[trace_id] = [camel_case_keys({**o, "trace_id": trace_id}) for o in observations]
+
+
+def make_handler(mock: MockLangfuse, auth: Optional[str], delay_sec: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        requests_served = 0
+        lock = threading.Lock()
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: dict) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _page(self, items: List[dict], query: Dict[str, List[str]]) -> dict:
+            page = int(query.get("page", ["1"])[0])
+            limit = min(int(query.get("limit", ["50"])[0]), MAX_PAGE_SIZE)
+            return {
+                "data": items[(page - 1) * limit:page * limit],
+                "meta": {"page": page, "limit": limit, "totalItems": len(items),
+                         "totalPages": math.ceil(len(items) / limit)},
+            }
+
+        def do_GET(self):
+            with Handler.lock:
+                Handler.requests_served += 1
+            if auth and self.headers.get("Authorization") != auth:
+                self._send(401, {"message": "Invalid credentials"})
+                return
+            if delay_sec:
+                time.sleep(delay_sec)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/api/public/traces":
+                traces = mock.traces
+                if "sessionId" in query:
+                    traces = [t for t in traces if t["sessionId"] == query["sessionId"][0]]
+                if "fromTimestamp" in query:
+                    traces = [t for t in traces if t["timestamp"] and t["timestamp"] >= query["fromTimestamp"][0]]
+                if "toTimestamp" in query:
+                    traces = [t for t in traces if t["timestamp"] and t["timestamp"] < query["toTimestamp"][0]]
+                self._send(200, self._page(traces, query))
+            elif url.path == "/api/public/observations":
+                trace_id = query.get("traceId", [None])[0]
+                self._send(200, self._page(mock.observations.get(trace_id, []), query))
+            elif url.path == "/api/public/health":
+                self._send(200, {"status": "OK"})
+            else:
+                self._send(404, {"message": "Not found"})
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("dumps", nargs="+", help="observation dumps to serve, one trace each")
+    parser.add_argument("--port", type=int, default=3999)
+    parser.add_argument("--public-key", help="only accept these credentials")
+    parser.add_argument("--secret-key")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="latency added to every request")
+    args = parser.parse_args(argv)
+
+    mock = MockLangfuse(args.dumps)
+    auth = None
+    if args.public_key or args.secret_key:
+        token = base64.b64encode(f"{args.public_key or ''}:{args.secret_key or ''}".encode()).decode()
+        auth = f"Basic {token}"
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(mock, auth, args.delay_ms / 1000))
+    for trace in mock.traces:
+        print(f"[INFO] Trace {trace['id']}: {len(mock.observations[trace['id']])} observations")
+    print(f"[INFO] Serving on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
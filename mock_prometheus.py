@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Prometheus remote-write receiver and a Pushgateway.
+
+Accepts snappy-compressed remote-write requests on /api/v1/write and
+Pushgateway pushes on /metrics/job/<job>[/<label>/<value>...], and shows
+everything it received as Prometheus text on GET /metrics (remote-written
+samples with their timestamps). Use it to exercise openmetrics_export.py
+without a monitoring stack:
+
+    python mock_prometheus.py [--port 9099]
+    python openmetrics_export.py --remote-write http://localhost:9099/api/v1/write \\
+        --pushgateway http://localhost:9099
+    curl http://localhost:9099/metrics
+"""
+
+import argparse
+import struct
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def snappy_decompress(data: bytes) -> bytes:
+    """Decode a snappy block (literals and back-references)."""
+    length, pos = _read_varint(data, 0)
+    out = bytearray()
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        kind = tag & 3
+        if kind == 0:
+            size = tag >> 2
+            if size >= 60:
+                extra = size - 59
+                size = int.from_bytes(data[pos:pos + extra], "little")
+                pos += extra
+            size += 1
+            out += data[pos:pos + size]
+            pos += size
+            continue
+        if kind == 1:
+            size = ((tag >> 2) & 7) + 4
+            offset = (tag >> 5) << 8 | data[pos]
+            pos += 1
+        else:
+            size = (tag >> 2) + 1
+            width = 2 if kind == 2 else 4
+            offset = int.from_bytes(data[pos:pos + width], "little")
+            pos += width
+        if not 0 < offset <= len(out):
+            raise ValueError("snappy back-reference out of range")
+        for _ in range(size):
+            out.append(out[-offset])
+    if len(out) != length:
+        raise ValueError(f"snappy length mismatch: {len(out)} != {length}")
+    return bytes(out)
+
+
+def iter_fields(data: bytes) -> Iterator[Tuple[int, object]]:
+    """(field number, value) of each protobuf field: an int for varints, bytes for the other wire types."""
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            size, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + size], pos + size
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type}")
+        yield number, value
+
+
+def decode_write_request(data: bytes) -> Iterator[Tuple[Tuple[Tuple[str, str], ...], List[Tuple[int, float]]]]:
+    """(sorted labels, [(timestamp ms, value)]) of each TimeSeries in a WriteRequest."""
+    for number, series in iter_fields(data):
+        if number != 1:
+            continue
+        labels, samples = [], []
+        for field, value in iter_fields(series):
+            if field == 1:
+                label = dict(iter_fields(value))
+                labels.append((label.get(1, b"").decode(), label.get(2, b"").decode()))
+            elif field == 2:
+                sample = dict(iter_fields(value))
+                samples.append((sample.get(2, 0), struct.unpack("<d", sample.get(1, bytes(8)))[0]))
+        yield tuple(sorted(labels)), samples
+
+
+def _has_timestamp(line: str) -> bool:
+    """Whether a text-format sample line ends in a timestamp (label values may contain spaces)."""
+    if not line or line.startswith("#"):
+        return False
+    after_labels = line.rpartition("}")[2] if "}" in line else line.split(" ", 1)[-1]
+    return len(after_labels.split()) > 1
+
+
+class MockPrometheus:
+    """What was received: remote-written series and pushed groups."""
+
+    def __init__(self):
+        self.series: Dict[Tuple[Tuple[str, str], ...], Dict[int, float]] = {}
+        self.groups: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for labels, points in sorted(self.series.items()):
+                name = dict(labels).get("__name__", "")
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels if k != "__name__")
+                for timestamp_ms, value in sorted(points.items()):
+                    lines.append(f"{name}{{{label_text}}} {value!r} {timestamp_ms}")
+            for group, text in sorted(self.groups.items()):
+                lines.append(f"# Pushed to {group}")
+                lines.extend(line for line in text.splitlines() if line != "# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def make_handler(mock: MockPrometheus):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: str = "") -> None:
+            data = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._send(200, mock.render())
+            elif self.path in ("/-/healthy", "/-/ready"):
+                self._send(200, "OK\n")
+            else:
+                self._send(404, "Not found\n")
+
+        def do_POST(self):
+            if self.path == "/api/v1/write":
+                body = self._body()
+                if self.headers.get("Content-Encoding") != "snappy":
+                    self._send(400, "expected snappy-encoded body\n")
+                    return
+                try:
+                    received = list(decode_write_request(snappy_decompress(body)))
+                except (ValueError, IndexError, struct.error) as e:
+                    self._send(400, f"bad remote-write request: {e}\n")
+                    return
+                with mock.lock:
+                    for labels, samples in received:
+                        mock.series.setdefault(labels, {}).update(samples)
+                print(f"[INFO] Remote write: {len(received)} series, "
+                      f"{sum(len(s) for _, s in received)} samples")
+                self._send(204)
+            elif self.path.startswith("/metrics/job/"):
+                self.do_PUT()
+            else:
+                self._send(404, "Not found\n")
+
+        def do_PUT(self):
+            if not self.path.startswith("/metrics/job/"):
+                self._send(404, "Not found\n")
+                return
+            text = self._body().decode()
+            # The Pushgateway rejects explicit timestamps
+            if any(_has_timestamp(line) for line in text.splitlines()):
+                self._send(400, "pushed metrics must not have timestamps\n")
+                return
+            group = unquote(self.path[len("/metrics/"):])
+            with mock.lock:
+                mock.groups[group] = text
+            print(f"[INFO] Push to {group}: {sum(1 for l in text.splitlines() if l and not l.startswith('#'))} samples")
+            self._send(200)
+
+    return Handler
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=9099)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(MockPrometheus()))
+    print(f"[INFO] Serving on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
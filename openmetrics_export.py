@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Export NFR analyzer results as OpenMetrics for Prometheus.
+
+Reads the same result files as results_store.py (SRE exports, CISO
+analysis.json/analysis.log) and turns each run's E2E latency, TRTT, LLM and
+processing time percentiles, tokens, error rates, context utilization and
+throughput into gauges labelled with scenario, agent variant, model,
+domain and streaming. The output can go to:
+
+- stdout or a node_exporter textfile-collector file (--textfile). This
+  holds the latest run of each scenario/variant/model.
+- a Pushgateway (--pushgateway). This also holds the latest run, and
+  replaces the job's previous push.
+- a Prometheus remote-write endpoint (--remote-write). This sends every
+  run at its own timestamp, so past nightly runs are backfilled.
+
+    python openmetrics_export.py [path ...] --textfile /var/lib/node_exporter/textfile_collector/itbench_nfr.prom
+    python openmetrics_export.py ../ciso_traces_react --label run=nightly --pushgateway http://localhost:9091
+    python openmetrics_export.py --remote-write http://localhost:9090/api/v1/write
+
+Remote write needs Prometheus started with --web.enable-remote-write-receiver
+(and an out-of-order window to accept older runs). mock_prometheus.py is a
+local stand-in for both endpoints.
+"""
+
+import argparse
+import http.client
+import os
+import re
+import struct
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+
+from analyze_traces import NS_PER_SEC, parse_timestamp_ns
+from results_store import DEFAULT_SOURCES, RunRecord, iter_source_files, parse_result_file, superseded_by_json
+
+PREFIX = "itbench_nfr_"
+DEFAULT_JOB = "itbench_nfr"
+HTTP_TIMEOUT_SEC = 30.0
+
+# Run fields exported as labels, in this order
+RUN_LABELS = ("scenario", "agent_variant", "model", "domain", "streaming")
+
+LABEL_NAME_RE = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+
+
+@dataclass(frozen=True)
+class Family:
+    """A metric family: its name (ending in its unit, if any), help text and unit."""
+    name: str
+    help: str
+    unit: str = ""
+
+
+E2E_LATENCY = Family(PREFIX + "e2e_latency_seconds", "End-to-end latency of the agent run.", "seconds")
+TRTT = Family(PREFIX + "trtt_seconds", "Tool round-trip time.", "seconds")
+LLM_EXECUTION = Family(PREFIX + "llm_execution_seconds", "Execution time of an LLM call.", "seconds")
+PROCESSING = Family(PREFIX + "processing_seconds", "Agent processing time between calls.", "seconds")
+LLM_CALLS = Family(PREFIX + "llm_calls", "LLM calls in the run.")
+LLM_TOKENS = Family(PREFIX + "llm_tokens", "Tokens used by the run's LLM calls.")
+PLANNING_OVERHEAD = Family(PREFIX + "planning_overhead_ratio", "Reasoning tokens over output tokens.", "ratio")
+PROMPT_COMPLETION = Family(PREFIX + "prompt_completion_ratio", "Prompt tokens over completion tokens.", "ratio")
+TOOL_ERRORS = Family(PREFIX + "tool_error_ratio", "Share of tool invocations that failed.", "ratio")
+ERRORS = Family(PREFIX + "error_ratio", "Share of tool and LLM operations that failed.", "ratio")
+ERROR_CATEGORIES = Family(PREFIX + "error_category_ratio", "Share of operations failing with an error category.",
+                          "ratio")
+TOOL_REUSE = Family(PREFIX + "tool_reuse_ratio", "Share of tool usages that repeat an earlier one.", "ratio")
+CONTEXT = Family(PREFIX + "context_utilization_ratio", "Share of the context window used by a call.", "ratio")
+THROUGHPUT = Family(PREFIX + "throughput_tokens_per_second", "Token throughput of the run's LLM calls.")
+PARALLEL_SAVED = Family(PREFIX + "parallel_tool_saved_seconds",
+                        "Time parallel execution of read-only tool calls could save.", "seconds")
+RUN_TIMESTAMP = Family(PREFIX + "run_timestamp_seconds", "When the run's results were written.", "seconds")
+
+# Dotted metric name (as results_store flattens it) -> family, labels, scale.
+# A "*" matches one key, which becomes the value of the label given as "*".
+METRICS: List[Tuple[str, Family, Dict[str, str], float]] = [
+    ("end_to_end_latency_ms", E2E_LATENCY, {}, 0.001),
+    *[(f"{prefix}.{stat}", family, {"stat": stat}, 0.001)
+      for prefix, family in (("trtt_stats", TRTT), ("llm_execution_stats", LLM_EXECUTION),
+                             ("processing_stats", PROCESSING))
+      for stat in ("avg", "p50", "p95", "p99")],
+    ("llm_stats.total_calls", LLM_CALLS, {}, 1),
+    ("llm_stats.total_input_tokens", LLM_TOKENS, {"type": "input"}, 1),
+    ("llm_stats.total_output_tokens", LLM_TOKENS, {"type": "output"}, 1),
+    ("llm_stats.total_reasoning_tokens", LLM_TOKENS, {"type": "reasoning"}, 1),
+    ("llm_stats.planning_overhead_percent", PLANNING_OVERHEAD, {}, 0.01),
+    ("prompt_completion_ratio", PROMPT_COMPLETION, {}, 1),
+    ("tool_error_rate.rate_percent", TOOL_ERRORS, {}, 0.01),
+    ("error_rate.rate_percent", ERRORS, {}, 0.01),
+    ("error_categories.per_category.*.rate_percent", ERROR_CATEGORIES, {"category": "*"}, 0.01),
+    ("tool_reuse_rate.overall_rate_percent", TOOL_REUSE, {}, 0.01),
+    ("context_window_utilization.average", CONTEXT, {"stat": "avg"}, 1),
+    ("context_window_utilization.max", CONTEXT, {"stat": "max"}, 1),
+    ("throughput.ultimate_tokens_per_sec", THROUGHPUT, {"kind": "ultimate"}, 1),
+    ("throughput.average_per_call_tokens_per_sec", THROUGHPUT, {"kind": "per_call"}, 1),
+    ("parallel_tool_calls.saved_ms", PARALLEL_SAVED, {}, 0.001),
+]
+
+# One compiled matcher per METRICS entry: (regex, family, labels, wildcard label, scale)
+_MATCHERS = [
+    (re.compile("^" + r"\.".join("([^.]+)" if part == "*" else re.escape(part) for part in name.split(".")) + "$"),
+     family, {k: v for k, v in labels.items() if v != "*"},
+     next((k for k, v in labels.items() if v == "*"), None), scale)
+    for name, family, labels, scale in METRICS
+]
+
+
+@dataclass
+class Sample:
+    family: Family
+    labels: Tuple[Tuple[str, str], ...]
+    value: float
+    # Milliseconds since the epoch, or None if the run has no timestamp
+    timestamp_ms: Optional[int]
+
+
+def run_labels(record: RunRecord, extra: Dict[str, str]) -> Dict[str, str]:
+    labels = {}
+    for name in RUN_LABELS:
+        value = getattr(record, name)
+        if name == "streaming":
+            value = "true" if value else "false"
+        if value:
+            labels[name] = str(value)
+    labels.update(extra)
+    return labels
+
+
+def run_samples(record: RunRecord, extra_labels: Dict[str, str]) -> Iterator[Sample]:
+    """The exported gauges of one run."""
+    labels = run_labels(record, extra_labels)
+    timestamp_ns = parse_timestamp_ns(record.timestamp) if record.timestamp else None
+    timestamp_ms = timestamp_ns // 1_000_000 if timestamp_ns is not None else None
+    for name, value in record.metrics.items():
+        for regex, family, fixed, wildcard, scale in _MATCHERS:
+            match = regex.match(name)
+            if match:
+                sample_labels = dict(labels, **fixed)
+                if wildcard:
+                    sample_labels[wildcard] = match.group(1)
+                yield Sample(family, tuple(sorted(sample_labels.items())), value * scale, timestamp_ms)
+                break
+    if timestamp_ns is not None:
+        yield Sample(RUN_TIMESTAMP, tuple(sorted(labels.items())), timestamp_ns / NS_PER_SEC, timestamp_ms)
+
+
+def collect_samples(paths: List[str], extra_labels: Dict[str, str]) -> List[Sample]:
+    """Samples of every NFR run in the result files, oldest run first."""
+    samples = []
+    for path in iter_source_files(paths):
+        if superseded_by_json(path):
+            continue
+        try:
+            records = parse_result_file(path)
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"[WARN] Could not parse {path}: {e}", file=sys.stderr)
+            continue
+        for record in records:
+            if record.kind == "nfr":
+                samples.extend(run_samples(record, extra_labels))
+    samples.sort(key=lambda s: s.timestamp_ms if s.timestamp_ms is not None else -1)
+    return samples
+
+
+def latest_samples(samples: List[Sample]) -> List[Sample]:
+    """The newest sample of each series; samples must be sorted oldest first."""
+    latest = {}
+    for sample in samples:
+        latest[(sample.family.name, sample.labels)] = sample
+    return list(latest.values())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_openmetrics(samples: List[Sample], timestamps: bool = False) -> str:
+    """
+    OpenMetrics text of the samples, grouped by family. Textfile collectors
+    and the Pushgateway reject explicit timestamps, so they are off by default.
+    """
+    families: Dict[Family, List[Sample]] = {}
+    for sample in samples:
+        families.setdefault(sample.family, []).append(sample)
+    lines = []
+    for family, family_samples in sorted(families.items(), key=lambda item: item[0].name):
+        lines.append(f"# TYPE {family.name} gauge")
+        if family.unit:
+            lines.append(f"# UNIT {family.name} {family.unit}")
+        lines.append(f"# HELP {family.name} {family.help}")
+        for sample in family_samples:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in sample.labels)
+            line = f"{family.name}{{{labels}}} {sample.value!r}" if labels else f"{family.name} {sample.value!r}"
+            if timestamps and sample.timestamp_ms is not None:
+                line += f" {sample.timestamp_ms / 1000!r}"
+            lines.append(line)
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(text: str, path: str) -> None:
+    """Write atomically, so the collector never reads a half-written file."""
+    partial_path = f"{path}.{os.getpid()}.tmp"
+    with open(partial_path, "w") as f:
+        f.write(text)
+    os.replace(partial_path, path)
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """A length-delimited protobuf field."""
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def encode_write_request(samples: List[Sample]) -> bytes:
+    """
+    A remote-write WriteRequest protobuf: one TimeSeries per series, with
+    its samples in time order. Samples without a timestamp are skipped.
+    """
+    series: Dict[Tuple[str, tuple], Dict[int, float]] = {}
+    for sample in samples:
+        if sample.timestamp_ms is not None:
+            series.setdefault((sample.family.name, sample.labels), {})[sample.timestamp_ms] = sample.value
+    out = bytearray()
+    for (name, labels), points in series.items():
+        payload = bytearray()
+        for label_name, label_value in sorted((("__name__", name),) + labels):
+            payload += _field(1, _field(1, label_name.encode()) + _field(2, label_value.encode()))
+        for timestamp_ms, value in sorted(points.items()):
+            # Sample: value (double, field 1) and timestamp (int64, field 2)
+            payload += _field(2, b"\x09" + struct.pack("<d", value) + b"\x10" + _varint(timestamp_ms))
+        out += _field(1, bytes(payload))
+    return bytes(out)
+
+
+def snappy_literal(data: bytes) -> bytes:
+    """
+    Snappy block format holding data as uncompressed literals: valid for any
+    snappy decoder, without needing a snappy library. Metrics payloads are
+    small enough that skipping compression does not matter.
+    """
+    out = bytearray(_varint(len(data)))
+    for start in range(0, len(data), 65536):
+        chunk = data[start:start + 65536]
+        # Literal tag with a 2-byte length (minus one) following it
+        out += bytes([61 << 2]) + struct.pack("<H", len(chunk) - 1) + chunk
+    return bytes(out)
+
+
+def http_send(url: str, method: str, body: bytes, headers: Dict[str, str]) -> None:
+    """Send body to url, raising OSError unless the response is 2xx."""
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parsed.hostname, parsed.port, timeout=HTTP_TIMEOUT_SEC)
+    try:
+        connection.request(method, parsed.path or "/", body=body, headers=headers)
+        response = connection.getresponse()
+        detail = response.read()[:200]
+    except (OSError, http.client.HTTPException) as e:
+        raise OSError(f"{method} {url} failed: {e}") from e
+    finally:
+        connection.close()
+    if not 200 <= response.status < 300:
+        raise OSError(f"{method} {url} returned HTTP {response.status}: {detail!r}")
+
+
+def push_to_gateway(text: str, gateway_url: str, job: str) -> None:
+    """Replace the job's metrics on a Pushgateway with text."""
+    url = f"{gateway_url.rstrip('/')}/metrics/job/{quote(job, safe='')}"
+    http_send(url, "PUT", text.encode(), {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def remote_write(samples: List[Sample], url: str) -> None:
+    http_send(url, "POST", snappy_literal(encode_write_request(samples)), {
+        "Content-Type": "application/x-protobuf",
+        "Content-Encoding": "snappy",
+        "X-Prometheus-Remote-Write-Version": "0.1.0",
+    })
+
+
+def _parse_label(value: str) -> Tuple[str, str]:
+    name, sep, label_value = value.partition("=")
+    if not sep or not LABEL_NAME_RE.match(name) or name.startswith("__"):
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE with a valid label name, got {value!r}")
+    return name, label_value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=DEFAULT_SOURCES,
+                        help="result files, directories or globs (default: the results_store.py locations)")
+    parser.add_argument("--label", type=_parse_label, action="append", default=[],
+                        help="extra NAME=VALUE label on every series (repeatable)")
+    parser.add_argument("--textfile", metavar="PATH", help="write the latest runs for a textfile collector")
+    parser.add_argument("--pushgateway", metavar="URL", help="push the latest runs to a Pushgateway")
+    parser.add_argument("--job", default=DEFAULT_JOB, help="Pushgateway job (default: %(default)s)")
+    parser.add_argument("--remote-write", metavar="URL", help="send every run, at its timestamp, via remote write")
+    args = parser.parse_args(argv)
+
+    samples = collect_samples(args.paths, dict(args.label))
+    if not samples:
+        print("[WARN] No NFR results found", file=sys.stderr)
+        return 2
+    latest = latest_samples(samples)
+    text = render_openmetrics(latest)
+    if not (args.textfile or args.pushgateway or args.remote_write):
+        sys.stdout.write(text)
+        return 0
+    try:
+        if args.textfile:
+            write_textfile(text, args.textfile)
+            print(f"[INFO] Wrote {len(latest)} series to {args.textfile}")
+        if args.pushgateway:
+            push_to_gateway(text, args.pushgateway, args.job)
+            print(f"[INFO] Pushed the latest runs to {args.pushgateway} (job {args.job})")
+        if args.remote_write:
+            remote_write(samples, args.remote_write)
+            print(f"[INFO] Sent {len(samples)} samples to {args.remote_write}")
+    except OSError as e:
+        print(f"[WARN] {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Offline simulator of vLLM's automatic prefix caching for recorded agent traces.
+
+Replays the prompts of every LLM call in one or more observations dumps
+through a block-granular prefix tree that mimics vLLM's KV cache: prompts
+and completions are split into fixed-size token blocks, each block is keyed
+by the hash of its tokens and its parent block, only full blocks are cached,
+and when the cache is full the least recently used unreferenced leaf block
+is evicted. Blocks of requests that are still running cannot be evicted.
+
+For each KV-cache size (in blocks) it reports the prefix hit rate and the
+prefill tokens saved, for traces replayed one after the other or
+concurrently in several interleavings (random trace order and start offsets):
+
+    python prefix_cache_sim.py <dump.json | directory | glob> ... \\
+        [--capacity 1024 4096 ...] [--concurrency 1 8] [--interleavings 3]
+
+Prompts are tokenized with a Hugging Face tokenizer when --tokenizer is
+given (needs the transformers package), otherwise approximated by splitting
+them into words and punctuation. Saved prefill tokens are scaled to each
+call's recorded input tokens, so the approximation only shapes the hit rate.
+"""
+
+import argparse
+import heapq
+import json
+import random
+import re
+import sys
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analyze_traces import NS_PER_SEC, iter_json_array, parse_timestamp_ns
+from whatif_simulator import iter_trace_paths
+
+# vLLM's default KV-cache block size, in tokens
+DEFAULT_BLOCK_SIZE = 16
+
+# KV-cache sizes simulated when none are given, in blocks
+DEFAULT_CAPACITIES = [256, 1024, 4096, 16384, 65536]
+
+# Share of the unbounded cache's hit rate a size must reach to count as enough
+SUFFICIENT_HIT_RATE_SHARE = 0.95
+
+# Pieces of the approximate tokenizer: words and single punctuation marks,
+# with their leading space, and runs of whitespace
+APPROX_TOKEN_RE = re.compile(r" ?\w+| ?[^\w\s]|\s+")
+
+GIB = 1 << 30
+
+
+def render_messages(value) -> str:
+    """Render a prompt (chat messages, a dict or a string) as one text, role by role."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("messages"), list):
+        value = value["messages"]
+    if isinstance(value, list):
+        parts = []
+        for message in value:
+            if isinstance(message, dict) and "content" in message:
+                content = message["content"]
+                if isinstance(content, list):
+                    content = "".join(part.get("text", "") if isinstance(part, dict) else str(part)
+                                      for part in content)
+                parts.append(f"<|{message.get('role', 'user')}|>\n{content}\n")
+            else:
+                parts.append(render_messages(message))
+        return "".join(parts)
+    if value is None:
+        return ""
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def approximate_tokenizer() -> Callable[[str], List[int]]:
+    """Map text to ids of its word/punctuation pieces; equal texts give equal ids."""
+    vocabulary: Dict[str, int] = {}
+
+    def tokenize(text: str) -> List[int]:
+        return [vocabulary.setdefault(piece, len(vocabulary)) for piece in APPROX_TOKEN_RE.findall(text)]
+
+    return tokenize
+
+
+def hf_tokenizer(name: str) -> Callable[[str], List[int]]:
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: tokenizer.encode(text, add_special_tokens=False)
+
+
+def block_hashes(tokens: List[int], block_size: int) -> List[int]:
+    """Chained hashes of the full blocks of a token sequence, as vLLM keys them."""
+    hashes = []
+    parent = None
+    for i in range(0, len(tokens) - block_size + 1, block_size):
+        parent = hash((parent, tuple(tokens[i:i + block_size])))
+        hashes.append(parent)
+    return hashes
+
+
+@dataclass
+class LLMRequest:
+    """One LLM call of a trace, reduced to what the cache sees."""
+    start_ns: int
+    end_ns: int
+    prompt_tokens: int
+    # Tokens the call's recorded usage says it prefilled (prompt_tokens if missing)
+    recorded_input_tokens: int
+    # Chained hashes of the full blocks of prompt + completion
+    blocks: List[int]
+    # Leading blocks that can be served from the cache: vLLM always computes
+    # at least the last prompt token
+    cacheable_blocks: int
+
+
+def load_requests(json_path: str, tokenize: Callable[[str], List[int]],
+                  block_size: int) -> List[LLMRequest]:
+    """The timed LLM calls of an observations dump, in start order."""
+    requests = []
+    with open(json_path, "r") as f:
+        for obs in iter_json_array(f):
+            if not (obs.get("model") or obs.get("type") == "GENERATION"):
+                continue
+            start_ns = parse_timestamp_ns(obs.get("start_time"))
+            end_ns = parse_timestamp_ns(obs.get("end_time"))
+            if start_ns is None:
+                continue
+            prompt = tokenize(render_messages(obs.get("input")))
+            if not prompt:
+                continue
+            completion = tokenize(render_messages([{"role": "assistant", "content": obs.get("output")}])
+                                  if isinstance(obs.get("output"), str) else render_messages(obs.get("output")))
+            usage = obs.get("usage_details") or {}
+            requests.append(LLMRequest(
+                start_ns=start_ns,
+                end_ns=end_ns if end_ns is not None and end_ns >= start_ns else start_ns,
+                prompt_tokens=len(prompt),
+                recorded_input_tokens=usage.get("input") or len(prompt),
+                blocks=block_hashes(prompt + completion, block_size),
+                cacheable_blocks=(len(prompt) - 1) // block_size,
+            ))
+    requests.sort(key=lambda r: r.start_ns)
+    return requests
+
+
+class _Block:
+    __slots__ = ("parent", "children", "refs", "last_access")
+
+    def __init__(self, parent: Optional[int], now: int):
+        self.parent = parent
+        self.children = 0
+        self.refs = 0
+        self.last_access = now
+
+
+class PrefixCache:
+    """
+    Block-granular prefix tree with LRU eviction of unreferenced leaves.
+    capacity_blocks=None never evicts.
+    """
+
+    def __init__(self, capacity_blocks: Optional[int]):
+        self.capacity_blocks = capacity_blocks
+        self.blocks: Dict[int, _Block] = {}
+        # (last access, block hash) of blocks that may be evictable; stale
+        # entries are skipped when popped
+        self._lru: List[Tuple[int, int]] = []
+        self.evictions = 0
+        # Blocks that could not be cached because every cached block was in use
+        self.uncached_blocks = 0
+        self.peak_blocks = 0
+
+    def _evict_one(self) -> bool:
+        while self._lru:
+            last_access, key = heapq.heappop(self._lru)
+            block = self.blocks.get(key)
+            if block is None or block.refs or block.children or block.last_access != last_access:
+                continue
+            del self.blocks[key]
+            self.evictions += 1
+            if block.parent is not None:
+                parent = self.blocks[block.parent]
+                parent.children -= 1
+                if not parent.children and not parent.refs:
+                    heapq.heappush(self._lru, (parent.last_access, block.parent))
+            return True
+        return False
+
+    def admit(self, request: LLMRequest, now: int) -> Tuple[int, List[int]]:
+        """
+        Serve a request's leading cached blocks and cache the rest, keeping
+        them referenced until release(). Returns (hit blocks, referenced blocks).
+        """
+        hit_blocks = 0
+        missed = False
+        held = []
+        parent = None
+        for index, key in enumerate(request.blocks):
+            block = self.blocks.get(key)
+            if block is None:
+                missed = True
+                if self.capacity_blocks is not None and len(self.blocks) >= self.capacity_blocks:
+                    if not self._evict_one():
+                        self.uncached_blocks += len(request.blocks) - index
+                        break
+                block = self.blocks[key] = _Block(parent, now)
+                if parent is not None:
+                    self.blocks[parent].children += 1
+            elif not missed and index < request.cacheable_blocks:
+                hit_blocks += 1
+            block.refs += 1
+            block.last_access = now
+            held.append(key)
+            parent = key
+        self.peak_blocks = max(self.peak_blocks, len(self.blocks))
+        return hit_blocks, held
+
+    def release(self, held: List[int], now: int) -> None:
+        for key in held:
+            block = self.blocks[key]
+            block.refs -= 1
+            block.last_access = now
+            if not block.refs and not block.children:
+                heapq.heappush(self._lru, (now, key))
+
+
+@dataclass
+class CacheResult:
+    capacity_blocks: Optional[int]
+    concurrency: int
+    interleaving: int
+    requests: int
+    prompt_tokens: int
+    hit_tokens: int
+    hit_rate_percent: float
+    saved_prefill_tokens: float
+    evictions: int
+    uncached_blocks: int
+    peak_blocks: int
+    # Blocks held by running requests at the busiest moment: the least KV
+    # cache that runs this schedule without preemption
+    peak_running_blocks: int
+
+
+def schedule(traces: List[List[LLMRequest]], concurrency: int,
+             rng: Optional[random.Random] = None) -> List[Tuple[int, int, LLMRequest]]:
+    """
+    Lay traces out on `concurrency` lanes, each running its traces back to
+    back with their recorded timing. With rng, every lane starts at a random
+    offset within one average trace duration. Returns (time, 0 = end /
+    1 = start, request) events in time order.
+    """
+    spans = [max(r.end_ns for r in requests) - requests[0].start_ns for requests in traces if requests]
+    mean_span = sum(spans) // len(spans) if spans else 0
+    lanes = [(rng.randrange(mean_span + 1) if rng else 0, lane) for lane in range(concurrency)]
+    events = []
+    for requests in traces:
+        if not requests:
+            continue
+        lane_free, lane = heapq.heappop(lanes)
+        offset = lane_free - requests[0].start_ns
+        for request in requests:
+            events.append((request.start_ns + offset, 1, id(request), request))
+            events.append((request.end_ns + offset, 0, id(request), request))
+        heapq.heappush(lanes, (max(r.end_ns for r in requests) + offset, lane))
+    events.sort(key=lambda e: (e[0], e[1], e[2]))
+    return [(time, kind, request) for time, kind, _, request in events]
+
+
+def simulate(events: List[Tuple[int, int, LLMRequest]], capacity_blocks: Optional[int],
+             block_size: int) -> Tuple[PrefixCache, int, int, float, int]:
+    """Replay scheduled requests through one cache; (cache, prompt, hit, saved tokens, peak running)."""
+    cache = PrefixCache(capacity_blocks)
+    held: Dict[int, List[int]] = {}
+    prompt_tokens = hit_tokens = 0
+    saved_prefill = 0.0
+    running_blocks = peak_running_blocks = 0
+    for time, kind, request in events:
+        if kind == 1:
+            hit_blocks, held[id(request)] = cache.admit(request, time)
+            hits = hit_blocks * block_size
+            prompt_tokens += request.prompt_tokens
+            hit_tokens += hits
+            saved_prefill += hits / request.prompt_tokens * request.recorded_input_tokens
+            running_blocks += len(request.blocks)
+            peak_running_blocks = max(peak_running_blocks, running_blocks)
+        else:
+            cache.release(held.pop(id(request)), time)
+            running_blocks -= len(request.blocks)
+    return cache, prompt_tokens, hit_tokens, saved_prefill, peak_running_blocks
+
+
+def run(traces: List[List[LLMRequest]], capacities: List[Optional[int]], concurrencies: List[int],
+        interleavings: int, block_size: int, seed: int = 0) -> List[CacheResult]:
+    """Simulate every capacity for every concurrency and interleaving of the traces."""
+    rng = random.Random(seed)
+    results = []
+    for concurrency in concurrencies:
+        # One trace order is enough when traces run one after the other
+        orders = 1 if concurrency == 1 else interleavings
+        for interleaving in range(orders):
+            ordered = list(traces)
+            if interleaving:
+                rng.shuffle(ordered)
+            events = schedule(ordered, concurrency, rng if interleaving else None)
+            for capacity in capacities:
+                cache, prompt_tokens, hit_tokens, saved, peak_running = simulate(events, capacity, block_size)
+                results.append(CacheResult(
+                    capacity_blocks=capacity,
+                    concurrency=concurrency,
+                    interleaving=interleaving,
+                    requests=sum(1 for _, kind, _ in events if kind == 1),
+                    prompt_tokens=prompt_tokens,
+                    hit_tokens=hit_tokens,
+                    hit_rate_percent=hit_tokens / prompt_tokens * 100 if prompt_tokens else 0.0,
+                    saved_prefill_tokens=saved,
+                    evictions=cache.evictions,
+                    uncached_blocks=cache.uncached_blocks,
+                    peak_blocks=cache.peak_blocks,
+                    peak_running_blocks=peak_running,
+                ))
+    return results
+
+
+def _size_label(blocks: Optional[int], block_size: int, kv_bytes_per_token: Optional[float]) -> str:
+    if blocks is None:
+        return "unbounded"
+    if kv_bytes_per_token:
+        return f"{blocks} ({blocks * block_size * kv_bytes_per_token / GIB:.2f} GiB)"
+    return str(blocks)
+
+
+def print_results(results: List[CacheResult], block_size: int, kv_bytes_per_token: Optional[float]) -> None:
+    for concurrency in sorted({r.concurrency for r in results}):
+        rows = [r for r in results if r.concurrency == concurrency]
+        orders = len({r.interleaving for r in rows})
+        print(f"\n--- Concurrency {concurrency} ({orders} interleaving{'s' if orders > 1 else ''}) ---")
+        print(f"{'KV blocks':<24} {'Hit rate (min-max)':>22} {'Saved prefill tokens':>21} {'Evictions':>10}")
+        by_capacity: Dict[Optional[int], List[CacheResult]] = {}
+        for r in rows:
+            by_capacity.setdefault(r.capacity_blocks, []).append(r)
+        for capacity, runs in by_capacity.items():
+            rates = [r.hit_rate_percent for r in runs]
+            mean_rate = sum(rates) / len(rates)
+            print(f"{_size_label(capacity, block_size, kv_bytes_per_token):<24} "
+                  f"{f'{mean_rate:.1f}% ({min(rates):.1f}-{max(rates):.1f})':>22} "
+                  f"{sum(r.saved_prefill_tokens for r in runs) / len(runs):>21.0f} "
+                  f"{sum(r.evictions for r in runs) / len(runs):>10.0f}")
+
+        unbounded = by_capacity.get(None)
+        if unbounded:
+            best = sum(r.hit_rate_percent for r in unbounded) / len(unbounded)
+            peak_running = max(r.peak_running_blocks for r in unbounded)
+            print(f"Blocks held by running requests (peak): "
+                  f"{_size_label(peak_running, block_size, kv_bytes_per_token)}")
+            enough = [c for c, runs in by_capacity.items() if c is not None
+                      and min(r.hit_rate_percent for r in runs) >= best * SUFFICIENT_HIT_RATE_SHARE]
+            if enough:
+                print(f"Smallest size within {SUFFICIENT_HIT_RATE_SHARE:.0%} of the unbounded hit rate: "
+                      f"{_size_label(min(enough), block_size, kv_bytes_per_token)}")
+            else:
+                print(f"No simulated size reaches {SUFFICIENT_HIT_RATE_SHARE:.0%} of the unbounded hit rate")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="observation dumps, directories or globs")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="tokens per KV block")
+    parser.add_argument("--capacity", type=int, nargs="+", default=DEFAULT_CAPACITIES,
+                        help="KV-cache sizes to simulate, in blocks (an unbounded cache is always added)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1],
+                        help="traces replayed at the same time against one cache")
+    parser.add_argument("--interleavings", type=int, default=3,
+                        help="random trace orders per concurrency above 1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer name or path (needs transformers)")
+    parser.add_argument("--kv-bytes-per-token", type=float,
+                        help="KV-cache bytes per token (2 x layers x KV heads x head dim x dtype "
+                             "bytes), to show sizes in GiB")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.tokenizer:
+        try:
+            tokenize = hf_tokenizer(args.tokenizer)
+        except ImportError:
+            print("[WARN] --tokenizer needs the transformers package; pip install transformers")
+            return 2
+    else:
+        tokenize = approximate_tokenizer()
+
+    traces = []
+    for json_path in iter_trace_paths(args.paths):
+        try:
+            requests = load_requests(json_path, tokenize, args.block_size)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not load {json_path}: {e}")
+            continue
+        print(f"[INFO] {json_path}: {len(requests)} LLM calls")
+        traces.append(requests)
+    if not any(traces):
+        print("[WARN] No LLM calls with prompts found")
+        return 1
+
+    span_sec = sum((max(r.end_ns for r in t) - t[0].start_ns) / NS_PER_SEC for t in traces if t)
+    print(f"[INFO] {sum(map(len, traces))} LLM calls over {len(traces)} traces ({span_sec:.0f} s recorded)")
+
+    results = run(traces, sorted(set(args.capacity)) + [None], args.concurrency,
+                  args.interleavings, args.block_size, args.seed)
+    print_results(results, args.block_size, args.kv_bytes_per_token)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(r) for r in results], f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Regression gate for NFR metrics of agent runs.
+
+Compares a baseline set of runs against a candidate set, scenario by
+scenario. For each gated metric it runs a one-sided Mann-Whitney U test
+(is the candidate worse?) and bootstraps a confidence interval for the
+change of the median. A metric regresses when the test is significant at
+--alpha and the median got worse by more than the metric's threshold; any
+regression makes the gate exit with code 1:
+
+    python regression_gate.py --baseline ../runs_main --candidate ../runs_pr
+    python regression_gate.py --baseline ../runs_main --save-baseline nfr_baseline.json
+    python regression_gate.py --baseline nfr_baseline.json --candidate ../runs_pr \\
+        --threshold end_to_end_latency_ms=5
+
+Runs are read with results_store (SRE *_incident_*.json exports and CISO
+analysis.json / analysis.log files); each file is one repeat of its scenario.
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import sys
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+from results_store import iter_source_files, parse_result_file, superseded_by_json
+
+# Samples per scenario: {scenario: {metric name: [value per run]}}
+Samples = Dict[str, Dict[str, List[float]]]
+
+DEFAULT_ALPHA = 0.05
+DEFAULT_BOOTSTRAP_RESAMPLES = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+# Largest C(n + m, n) for which the exact U distribution is computed
+EXACT_MAX_COMBINATIONS = 1_000_000
+
+
+@dataclass
+class GatedMetric:
+    """A metric the gate checks, and how much worse its median may get."""
+    name: str
+    higher_is_worse: bool = True
+    threshold_percent: float = 10.0
+
+
+GATED_METRICS = [
+    GatedMetric("end_to_end_latency_ms", True, 10.0),
+    GatedMetric("llm_stats.total_calls", True, 10.0),
+    GatedMetric("trtt_stats.p50", True, 15.0),
+    GatedMetric("trtt_stats.p95", True, 15.0),
+    GatedMetric("throughput.ultimate_tokens_per_sec", False, 10.0),
+    GatedMetric("llm_stats.planning_overhead_percent", True, 10.0),
+    GatedMetric("tool_error_rate.rate_percent", True, 10.0),
+]
+
+
+@dataclass
+class MetricComparison:
+    scenario: str
+    metric: str
+    baseline_runs: int
+    candidate_runs: int
+    baseline_median: float
+    candidate_median: float
+    # Change of the median in percent of the baseline median (inf if it was 0)
+    change_percent: float
+    ci_low_percent: float
+    ci_high_percent: float
+    p_value: float
+    threshold_percent: float
+    higher_is_worse: bool
+    regression: bool
+    # Too few runs for the test to reach --alpha even if every candidate run is worse
+    underpowered: bool
+
+
+def _saved_samples(data: dict) -> Samples:
+    """Check the scenario -> metric -> values layout of a --save-baseline file."""
+    saved = data["baseline_samples"]
+    if not isinstance(saved, dict):
+        raise ValueError("'baseline_samples' is not a scenario -> metrics mapping")
+    for scenario, metrics in saved.items():
+        if not isinstance(metrics, dict):
+            raise ValueError(f"baseline_samples[{scenario!r}] is not a metric -> values mapping")
+        for name, values in metrics.items():
+            if not isinstance(values, list):
+                raise ValueError(f"baseline_samples[{scenario!r}][{name!r}] is not a list of values")
+    return saved
+
+
+def load_samples(paths: List[str]) -> Samples:
+    """
+    Group the NFR runs under paths by scenario. A JSON file written by
+    --save-baseline is loaded as is.
+    """
+    samples: Samples = {}
+    for path in iter_source_files(paths):
+        if superseded_by_json(path):
+            continue
+        try:
+            if path.endswith(".json"):
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if isinstance(data, dict) and "baseline_samples" in data:
+                    for scenario, metrics in _saved_samples(data).items():
+                        for name, values in metrics.items():
+                            samples.setdefault(scenario, {}).setdefault(name, []).extend(values)
+                    continue
+            records = parse_result_file(path)
+        except KeyError as e:
+            print(f"[WARN] Could not parse {path}: missing key {e}")
+            continue
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[WARN] Could not parse {path}: {e}")
+            continue
+        for record in records:
+            if record.kind != "nfr" or not record.scenario:
+                continue
+            scenario = f"{record.domain}/{record.scenario}" if record.domain else record.scenario
+            if record.streaming:
+                scenario += "-streaming"
+            for name, value in record.metrics.items():
+                samples.setdefault(scenario, {}).setdefault(name, []).append(value)
+    return samples
+
+
+def _change_percent(baseline: float, candidate: float) -> float:
+    if baseline == 0:
+        return 0.0 if candidate == 0 else math.copysign(math.inf, candidate)
+    return (candidate - baseline) / abs(baseline) * 100
+
+
+def _u_distribution(n: int, m: int) -> List[int]:
+    """Number of orderings of n vs m untied values giving each U = 0..n*m."""
+    # previous[j]: distribution for (i - 1, j) values; U counts pairs with x > y
+    previous = [[1] for _ in range(m + 1)]
+    for i in range(1, n + 1):
+        row = [[1]]
+        for j in range(1, m + 1):
+            merged = [0] * (i * j + 1)
+            # Largest value from x: it beats all j values of y
+            for u, count in enumerate(previous[j]):
+                merged[u + j] += count
+            # Largest value from y: it beats none of x
+            for u, count in enumerate(row[j - 1]):
+                merged[u] += count
+            row.append(merged)
+        previous = row
+    return previous[m]
+
+
+def mann_whitney_greater(x: List[float], y: List[float]) -> float:
+    """
+    One-sided Mann-Whitney U test p-value for "x tends to be larger than y".
+    Exact when there are no ties and the sample sizes are small, otherwise
+    the normal approximation with tie and continuity correction.
+    """
+    n, m = len(x), len(y)
+    pooled = sorted((v, side) for side, values in ((0, x), (1, y)) for v in values)
+    ranks = [0.0] * len(pooled)
+    tie_term = 0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tie_term += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = sum(rank for rank, (_, side) in zip(ranks, pooled) if side == 0) - n * (n + 1) / 2
+
+    if tie_term == 0 and math.comb(n + m, n) <= EXACT_MAX_COMBINATIONS:
+        distribution = _u_distribution(n, m)
+        return sum(distribution[math.ceil(u):]) / math.comb(n + m, n)
+
+    mean = n * m / 2
+    variance = n * m / 12 * ((n + m + 1) - tie_term / ((n + m) * (n + m - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_change_ci(baseline: List[float], candidate: List[float], resamples: int,
+                        confidence: float, rng: random.Random) -> Tuple[float, float]:
+    """Percentile bootstrap CI of the change of the median, in percent of the baseline median."""
+    changes = sorted(
+        _change_percent(statistics.median(rng.choices(baseline, k=len(baseline))),
+                        statistics.median(rng.choices(candidate, k=len(candidate))))
+        for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2
+    low = changes[int(tail * (resamples - 1))]
+    high = changes[int(math.ceil((1 - tail) * (resamples - 1)))]
+    return low, high
+
+
+def compare_metric(scenario: str, gated: GatedMetric, baseline: List[float], candidate: List[float],
+                   alpha: float, resamples: int, confidence: float,
+                   rng: random.Random) -> MetricComparison:
+    baseline_median = statistics.median(baseline)
+    candidate_median = statistics.median(candidate)
+    change = _change_percent(baseline_median, candidate_median)
+    if gated.higher_is_worse:
+        p_value = mann_whitney_greater(candidate, baseline)
+    else:
+        p_value = mann_whitney_greater(baseline, candidate)
+    ci_low, ci_high = bootstrap_change_ci(baseline, candidate, resamples, confidence, rng)
+    worsening = change if gated.higher_is_worse else -change
+    return MetricComparison(
+        scenario=scenario,
+        metric=gated.name,
+        baseline_runs=len(baseline),
+        candidate_runs=len(candidate),
+        baseline_median=baseline_median,
+        candidate_median=candidate_median,
+        change_percent=change,
+        ci_low_percent=ci_low,
+        ci_high_percent=ci_high,
+        p_value=p_value,
+        threshold_percent=gated.threshold_percent,
+        higher_is_worse=gated.higher_is_worse,
+        regression=p_value < alpha and worsening > gated.threshold_percent,
+        # Smallest p-value the test can give: all candidate runs worse than all baseline runs
+        underpowered=1 / math.comb(len(baseline) + len(candidate), len(baseline)) >= alpha,
+    )
+
+
+def compare_samples(baseline: Samples, candidate: Samples, gated_metrics: List[GatedMetric],
+                    alpha: float = DEFAULT_ALPHA, resamples: int = DEFAULT_BOOTSTRAP_RESAMPLES,
+                    confidence: float = DEFAULT_CONFIDENCE, seed: int = 0) -> List[MetricComparison]:
+    """Compare every gated metric of every scenario present in both sets."""
+    rng = random.Random(seed)
+    comparisons = []
+    for scenario in sorted(set(baseline) & set(candidate)):
+        for gated in gated_metrics:
+            baseline_values = baseline[scenario].get(gated.name)
+            candidate_values = candidate[scenario].get(gated.name)
+            if not baseline_values or not candidate_values:
+                continue
+            comparisons.append(compare_metric(scenario, gated, baseline_values, candidate_values,
+                                              alpha, resamples, confidence, rng))
+    return comparisons
+
+
+def print_comparisons(comparisons: List[MetricComparison], confidence: float) -> None:
+    scenario = None
+    for c in comparisons:
+        if c.scenario != scenario:
+            scenario = c.scenario
+            print(f"\n--- {scenario} ({c.baseline_runs} baseline vs {c.candidate_runs} candidate runs) ---")
+            print(f"{'Metric':<38} {'Baseline':>12} {'Candidate':>12} {'Change':>9} "
+                  f"{f'{confidence:.0%} CI':>20} {'p':>7}")
+        verdict = " REGRESSION" if c.regression else ""
+        print(f"{c.metric:<38} {c.baseline_median:>12.2f} {c.candidate_median:>12.2f} "
+              f"{c.change_percent:>+8.1f}% {f'[{c.ci_low_percent:+.1f}%, {c.ci_high_percent:+.1f}%]':>20} "
+              f"{c.p_value:>7.3f}{verdict}")
+
+
+def parse_threshold(value: str) -> Tuple[str, float]:
+    name, sep, percent = value.partition("=")
+    try:
+        return name, float(percent)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=PERCENT, got {value!r}") from None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--baseline", nargs="+", required=True,
+                        help="baseline result files, directories, globs or a --save-baseline file")
+    parser.add_argument("--candidate", nargs="+", help="candidate result files, directories or globs")
+    parser.add_argument("--save-baseline", metavar="PATH",
+                        help="write the baseline runs to PATH for later comparisons and exit")
+    parser.add_argument("--threshold", type=parse_threshold, action="append", default=[],
+                        metavar="NAME=PERCENT",
+                        help="allowed worsening of a metric's median (repeatable); unknown "
+                             "metrics are gated as higher-is-worse")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA,
+                        help="significance level of the Mann-Whitney test")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_BOOTSTRAP_RESAMPLES,
+                        help="bootstrap resamples for the confidence interval")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the comparisons as JSON")
+    args = parser.parse_args(argv)
+
+    baseline = load_samples(args.baseline)
+    if not baseline:
+        print(f"[WARN] No NFR runs found in: {' '.join(args.baseline)}")
+        return 2
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"baseline_samples": baseline}, f, indent=2)
+        runs = sum(max(map(len, metrics.values())) for metrics in baseline.values())
+        print(f"[INFO] Baseline of {runs} runs over {len(baseline)} scenarios saved to: {args.save_baseline}")
+        return 0
+    if not args.candidate:
+        parser.error("--candidate is required unless --save-baseline is given")
+
+    candidate = load_samples(args.candidate)
+    if not set(baseline) & set(candidate):
+        print("[WARN] No scenario has runs in both the baseline and the candidate")
+        return 2
+
+    gated_metrics = {g.name: GatedMetric(g.name, g.higher_is_worse, g.threshold_percent)
+                     for g in GATED_METRICS}
+    for name, percent in args.threshold:
+        gated_metrics.setdefault(name, GatedMetric(name)).threshold_percent = percent
+
+    comparisons = compare_samples(baseline, candidate, list(gated_metrics.values()),
+                                  args.alpha, args.bootstrap, args.confidence, args.seed)
+    print_comparisons(comparisons, args.confidence)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(c) for c in comparisons], f, indent=2)
+
+    print()
+    for scenario in sorted(set(baseline) ^ set(candidate)):
+        side = "baseline" if scenario in baseline else "candidate"
+        print(f"[WARN] {scenario}: only in the {side}, not compared")
+    underpowered = sorted({c.scenario for c in comparisons if c.underpowered})
+    for scenario in underpowered:
+        print(f"[WARN] {scenario}: too few runs to reach p < {args.alpha}; add repeats")
+    regressions = [c for c in comparisons if c.regression]
+    for c in regressions:
+        direction = "up" if c.change_percent > 0 else "down"
+        print(f"[REGRESSION] {c.scenario}: {c.metric} {direction} {abs(c.change_percent):.1f}% "
+              f"(median {c.baseline_median:.2f} -> {c.candidate_median:.2f}, p={c.p_value:.3f}, "
+              f"threshold {c.threshold_percent:g}%)")
+    if not regressions:
+        print("[INFO] No significant regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Background sampling of container and process resource usage from cgroup v2.
+
+A ResourceSampler thread reads, every --interval seconds, the cgroup v2
+counters of each target: cpu.stat (usage_usec), memory.current, the anon
+line of memory.stat (RSS), memory.peak and io.stat (rbytes/wbytes). Targets are
+docker containers (by name, resolved through `docker inspect` whenever
+they are not running, so a container that is started several times during
+a benchmark is followed across its runs) and processes (by pid). A process
+that shares the sampler's own cgroup, such as a vLLM server started by the
+benchmark runner, is read from procfs instead: the CPU time, RSS and I/O of
+the process and its children.
+
+The runner marks phases (vllm_startup, scenario, ...) as it goes. The
+samples are kept as a compact columnar time series per target and summarized
+per target and per phase: CPU-seconds, peak memory, peak RSS and bytes read
+and written. ciso_vllm_benchmark.py and sre_benchmark_runner.py sample their
+containers this way. It can also sample around any command:
+
+    python resource_sampler.py --container ciso-agent -o resources.json -- bash ciso_scripts/scripts_1.sh
+"""
+
+import argparse
+import bisect
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_INTERVAL_SEC = 1.0
+# How often a target that is not running (yet) is looked up again
+RESOLVE_INTERVAL_SEC = 5.0
+DOCKER_TIMEOUT_SEC = 5.0
+
+# Columns of a target's time series. Counters are cumulative since the
+# target was first seen (or since sampling started, if it was already running).
+COUNTERS = ("cpu_seconds", "io_read_bytes", "io_write_bytes")
+GAUGES = ("memory_bytes", "rss_bytes")
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def cgroup2_root() -> Optional[str]:
+    """Mount point of the cgroup v2 hierarchy (also in hybrid setups), or None."""
+    try:
+        with open("/proc/self/mountinfo", "r") as f:
+            for line in f:
+                mount, _, filesystem = line.partition(" - ")
+                if filesystem.split(" ", 1)[0] == "cgroup2":
+                    return mount.split()[4]
+    except OSError:
+        pass
+    return None
+
+
+def process_cgroup(pid) -> Optional[str]:
+    """The cgroup v2 path of a process, relative to the hierarchy root."""
+    try:
+        with open(f"/proc/{pid}/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return line[3:].strip()
+    except OSError:
+        pass
+    return None
+
+
+def _read_keyed(path: str) -> Dict[str, int]:
+    """A flat-keyed cgroup file ("key value" per line)."""
+    values = {}
+    with open(path, "r") as f:
+        for line in f:
+            key, _, value = line.partition(" ")
+            if value.strip().isdigit():
+                values[key] = int(value)
+    return values
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path, "r") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def read_cgroup(path: str) -> Optional[Dict[str, Optional[float]]]:
+    """
+    One reading of a cgroup, or None once the cgroup is gone. Counters of
+    controllers that are not enabled for it are None.
+    """
+    reading = dict.fromkeys(COUNTERS + GAUGES + ("memory_peak_bytes",))
+    try:
+        reading["cpu_seconds"] = _read_keyed(os.path.join(path, "cpu.stat"))["usage_usec"] / 1e6
+    except (OSError, KeyError):
+        if not os.path.isdir(path):
+            return None
+    reading["memory_bytes"] = _read_int(os.path.join(path, "memory.current"))
+    reading["memory_peak_bytes"] = _read_int(os.path.join(path, "memory.peak"))
+    try:
+        reading["rss_bytes"] = _read_keyed(os.path.join(path, "memory.stat")).get("anon")
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(path, "io.stat"), "r") as f:
+            read_bytes = write_bytes = 0
+            for line in f:
+                for field in line.split()[1:]:
+                    key, _, value = field.partition("=")
+                    if key == "rbytes":
+                        read_bytes += int(value)
+                    elif key == "wbytes":
+                        write_bytes += int(value)
+        reading["io_read_bytes"], reading["io_write_bytes"] = read_bytes, write_bytes
+    except (OSError, ValueError):
+        pass
+    return reading
+
+
+def _process_tree(pid: int) -> List[int]:
+    """A process and its descendants (children of each process's main thread)."""
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children", "r") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def read_process(pid: int) -> Optional[Dict[str, Optional[float]]]:
+    """
+    One procfs reading of a process and its children, or None once the
+    process is gone. CPU time includes children that have already exited
+    and been waited for; I/O counters the sampler may not read are None.
+    """
+    reading = dict.fromkeys(COUNTERS + GAUGES + ("memory_peak_bytes",))
+    cpu_ticks = rss_pages = 0
+    read_bytes = write_bytes = 0
+    io_readable = True
+    for index, p in enumerate(_process_tree(pid)):
+        try:
+            with open(f"/proc/{p}/stat", "r") as f:
+                # Fields after the parenthesized command name, which may contain spaces
+                fields = f.read().rpartition(")")[2].split()
+        except OSError:
+            if index == 0:
+                return None
+            continue
+        # utime, stime, cutime, cstime and rss (fields 14-17 and 24 of proc(5))
+        cpu_ticks += sum(int(v) for v in fields[11:15])
+        rss_pages += int(fields[21])
+        try:
+            io = _read_keyed(f"/proc/{p}/io")
+            read_bytes += io.get("read_bytes", 0)
+            write_bytes += io.get("write_bytes", 0)
+        except OSError:
+            io_readable = False
+    reading["cpu_seconds"] = cpu_ticks / CLOCK_TICKS
+    reading["memory_bytes"] = reading["rss_bytes"] = rss_pages * PAGE_SIZE
+    if io_readable:
+        reading["io_read_bytes"], reading["io_write_bytes"] = read_bytes, write_bytes
+    return reading
+
+
+def docker_container_pid(name: str) -> Optional[int]:
+    """Pid of a running docker container's init process, or None."""
+    result = subprocess.run(["docker", "inspect", "--format", "{{.State.Pid}}", name],
+                            capture_output=True, text=True, timeout=DOCKER_TIMEOUT_SEC)
+    if result.returncode != 0:
+        return None
+    pid = int(result.stdout.strip() or 0)
+    return pid or None
+
+
+class _Target:
+    """A sampled container or process and its time series."""
+
+    def __init__(self, name: str, resolve_pid: Callable[[], Optional[int]]):
+        self.name = name
+        self.resolve_pid = resolve_pid
+        self.source: Optional[str] = None
+        self.read: Optional[Callable[[], Optional[dict]]] = None
+        # Resolved but not read yet
+        self.fresh = False
+        self.new_instance = False
+        self.baseline: Dict[str, float] = {}
+        self.carried = dict.fromkeys(COUNTERS, 0.0)
+        self.last: Dict[str, Optional[float]] = {}
+        self.next_resolve = 0.0
+        self.disabled = False
+        self.peak_memory: Optional[int] = None
+        self.series: Dict[str, list] = {"t": [], **{column: [] for column in COUNTERS + GAUGES}}
+
+
+class ResourceSampler:
+    """
+    Samples the resource usage of containers and processes in a background
+    thread, split into phases:
+
+        sampler = ResourceSampler(interval=1.0)
+        sampler.add_container("ciso-agent")
+        sampler.add_process("vllm", lambda: server.process.pid if server.process else None)
+        with sampler:
+            sampler.mark_phase("scenario")
+            ...
+        summary = sampler.summary()
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL_SEC):
+        self.interval = interval
+        self.targets: Dict[str, _Target] = {}
+        self.phases: List[list] = []
+        self.start_time: Optional[str] = None
+        self.sampler_cpu_seconds = 0.0
+        self._cgroup_root = cgroup2_root()
+        self._own_cgroup = process_cgroup("self")
+        self._started: Optional[float] = None
+        self._ticks = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_container(self, name: str, label: Optional[str] = None) -> None:
+        """Sample a docker container by name, whenever it is running."""
+        with self._lock:
+            self.targets[label or name] = _Target(label or name, lambda: docker_container_pid(name))
+
+    def add_process(self, label: str, pid) -> None:
+        """Sample a process (and its children): a pid, or a callable returning the current pid."""
+        resolve_pid = pid if callable(pid) else (lambda: pid)
+        with self._lock:
+            self.targets[label] = _Target(label, resolve_pid)
+
+    def _elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def mark_phase(self, name: str) -> None:
+        """End the current phase (if any) and start a new one."""
+        with self._lock:
+            now = round(self._elapsed(), 3)
+            if self.phases:
+                self.phases[-1][2] = now
+            self.phases.append([name, now, None])
+
+    def _resolve(self, target: _Target) -> None:
+        """Find the target's current instance and decide whether to read it from cgroup or procfs."""
+        try:
+            pid = target.resolve_pid()
+        except FileNotFoundError:
+            print(f"[WARN] Cannot sample {target.name}: docker is not installed")
+            target.disabled = True
+            return
+        except (subprocess.SubprocessError, ValueError):
+            pid = None
+        if pid is None:
+            return
+        cgroup = process_cgroup(pid)
+        if self._cgroup_root and cgroup is not None and cgroup != self._own_cgroup:
+            path = os.path.join(self._cgroup_root, cgroup.lstrip("/"))
+            target.source = "cgroup"
+            target.read = lambda: read_cgroup(path)
+        else:
+            # Same cgroup as the sampler: its counters would include the runner itself
+            target.source = "procfs"
+            target.read = lambda: read_process(pid)
+
+    def _resolve_due(self, target: _Target, now: float) -> None:
+        if target.read is not None or target.disabled or now < target.next_resolve:
+            return
+        target.next_resolve = now + max(RESOLVE_INTERVAL_SEC, self.interval)
+        self._resolve(target)
+        target.fresh = target.read is not None
+
+    def _sample(self, target: _Target, now: float) -> None:
+        if target.read is None:
+            return
+        if target.fresh:
+            target.fresh = False
+            reading = target.read()
+            if reading is None:
+                target.read = None
+                return
+            # Counters of an instance that was already running are taken from
+            # its first reading; one that appeared later started from zero
+            target.baseline = {c: reading[c] or 0 for c in COUNTERS} if self._ticks == 0 else {}
+            target.new_instance = self._ticks > 0
+        else:
+            reading = target.read()
+            if reading is None:
+                # The container or process is gone: keep its totals and look for the next one
+                for column in COUNTERS:
+                    if target.last.get(column) is not None:
+                        target.carried[column] = target.last[column]
+                target.read = None
+                target.next_resolve = 0.0
+                return
+        series = target.series
+        series["t"].append(round(now, 3))
+        for column in COUNTERS:
+            value = reading[column]
+            if value is not None:
+                value = target.carried[column] + value - target.baseline.get(column, 0)
+                value = round(value, 3) if column == "cpu_seconds" else int(value)
+            series[column].append(value)
+            target.last[column] = value
+        for column in GAUGES:
+            series[column].append(reading[column])
+        # memory.peak covers the whole life of a cgroup, so it only counts for one created while sampling
+        peak = reading["memory_peak_bytes"] if target.new_instance else None
+        peak = max((v for v in (peak, reading["memory_bytes"], target.peak_memory) if v is not None), default=None)
+        target.peak_memory = peak
+
+    def _tick(self) -> None:
+        # Resolving a container runs docker inspect, which can take seconds:
+        # do it outside the lock so mark_phase is never held up by it
+        with self._lock:
+            targets = list(self.targets.values())
+        now = self._elapsed()
+        for target in targets:
+            self._resolve_due(target, now)
+        with self._lock:
+            now = self._elapsed()
+            for target in targets:
+                self._sample(target, now)
+            self._ticks += 1
+
+    def _run(self) -> None:
+        while True:
+            self._tick()
+            if self._stop.wait(self.interval):
+                break
+        # One last sample, so the series reach the end of the run
+        self._tick()
+        self.sampler_cpu_seconds = time.thread_time()
+
+    def start(self) -> None:
+        self.start_time = datetime.now(timezone.utc).isoformat()
+        self._started = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        with self._lock:
+            if self.phases and self.phases[-1][2] is None:
+                self.phases[-1][2] = round(self._elapsed(), 3)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @staticmethod
+    def _usage(target: _Target, start: float, end: float) -> Optional[dict]:
+        """Resource use of a target between two offsets, or None if it has no samples then."""
+        t = target.series["t"]
+        first, last = bisect.bisect_left(t, start), bisect.bisect_right(t, end)
+        if first == last:
+            return None
+
+        def counter(column: str) -> Optional[float]:
+            values = target.series[column]
+            at_end = values[last - 1]
+            if at_end is None:
+                return None
+            # Counters before the phase: the last sample preceding it (0 if none)
+            before = values[first - 1] if first else 0
+            return round(at_end - (before or 0), 3)
+
+        def peak(column: str) -> Optional[int]:
+            return max((v for v in target.series[column][first:last] if v is not None), default=None)
+
+        return {
+            "cpu_seconds": counter("cpu_seconds"),
+            "peak_memory_bytes": peak("memory_bytes"),
+            "peak_rss_bytes": peak("rss_bytes"),
+            "io_read_bytes": counter("io_read_bytes"),
+            "io_write_bytes": counter("io_write_bytes"),
+            "samples": last - first,
+        }
+
+    def summary(self) -> dict:
+        """CPU-seconds, peak memory/RSS and I/O bytes of each target, overall and per phase."""
+        targets = {}
+        for target in self.targets.values():
+            usage = self._usage(target, 0.0, float("inf"))
+            if usage is None:
+                continue
+            if target.peak_memory is not None:
+                usage["peak_memory_bytes"] = target.peak_memory
+            targets[target.name] = {"source": target.source, **usage}
+        phases = {}
+        for name, start, end in self.phases:
+            # A phase marked more than once gets numbered: scenario, scenario_2, ...
+            count = 1
+            while (f"{name}_{count}" if count > 1 else name) in phases:
+                count += 1
+            name = f"{name}_{count}" if count > 1 else name
+            end = end if end is not None else float("inf")
+            usage = {target.name: self._usage(target, start, end) for target in self.targets.values()}
+            phases[name] = {
+                "duration_sec": round(end - start, 3) if end != float("inf") else None,
+                "targets": {k: v for k, v in usage.items() if v is not None},
+            }
+        return {
+            "start_time": self.start_time,
+            "interval_sec": self.interval,
+            "sampler_cpu_seconds": round(self.sampler_cpu_seconds, 3),
+            "targets": targets,
+            "phases": phases,
+        }
+
+    def series(self) -> dict:
+        """The raw samples: phase boundaries and one set of columns per target."""
+        return {
+            "start_time": self.start_time,
+            "interval_sec": self.interval,
+            "phases": [{"name": name, "start": start, "end": end} for name, start, end in self.phases],
+            "targets": {t.name: {"source": t.source, **t.series} for t in self.targets.values() if t.series["t"]},
+        }
+
+    def save(self, path: str) -> None:
+        """Write the summary and the time series to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "series": self.series()}, f, separators=(",", ":"))
+
+
+def _mib(value) -> str:
+    return f"{value / 2**20:.1f}" if value is not None else "-"
+
+
+def _number(value, digits: int = 1) -> str:
+    return f"{value:.{digits}f}" if value is not None else "-"
+
+
+def print_resource_summary(summary: dict) -> None:
+    """Print a summary() as one table per phase plus the totals."""
+    print(f"\n--- Resource Usage (sampled every {summary['interval_sec']:g}s, "
+          f"sampler CPU {summary['sampler_cpu_seconds']:.2f}s) ---")
+    sections = [(f"{name} ({phase['duration_sec']}s)", phase["targets"]) for name, phase in summary["phases"].items()]
+    sections.append(("total", summary["targets"]))
+    header = f"  {'Target':<24} {'CPU s':>9} {'Peak mem MiB':>13} {'Peak RSS MiB':>13} {'Read MiB':>10} {'Write MiB':>10}"
+    for title, targets in sections:
+        if not targets:
+            continue
+        print(f"{title}:")
+        print(header)
+        for name, usage in targets.items():
+            print(f"  {name:<24} {_number(usage['cpu_seconds'], 2):>9} {_mib(usage['peak_memory_bytes']):>13} "
+                  f"{_mib(usage['peak_rss_bytes']):>13} {_mib(usage['io_read_bytes']):>10} "
+                  f"{_mib(usage['io_write_bytes']):>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--container", action="append", default=[], help="docker container name (repeatable)")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="process id (repeatable)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_SEC, help="seconds between samples")
+    parser.add_argument("-o", "--output", help="write the summary and time series to this JSON file")
+    parser.add_argument("command", nargs=argparse.REMAINDER,
+                        help="command to run and sample (after --); without one, sample until interrupted")
+    args = parser.parse_args(argv)
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    sampler = ResourceSampler(args.interval)
+    for name in args.container:
+        sampler.add_container(name)
+    for pid in args.pid:
+        sampler.add_process(f"pid_{pid}", pid)
+    returncode = 0
+    with sampler:
+        sampler.mark_phase("run")
+        if command:
+            process = subprocess.Popen(command)
+            sampler.add_process("command", process.pid)
+            returncode = process.wait()
+        else:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                pass
+    print_resource_summary(sampler.summary())
+    if args.output:
+        sampler.save(args.output)
+        print(f"[INFO] Resource samples saved to {args.output}")
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
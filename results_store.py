@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+SQLite store for NFR and vLLM benchmark results.
+
+Loads the result files the benchmarks leave behind into one database:
+
+- {prefix}_incident_{id}.json   SRE metrics exported by run_dumps.py
+- rep_<n>/analysis_incident_{id}.json  SRE metrics of adaptive repeats (sre_benchmark_runner.py)
+- analysis.json / analysis.log  CISO metrics from analyze_traces.py
+- vllm_metrics_<timestamp>.json vLLM metrics from ciso_vllm_benchmark.py
+- streaming_metrics.json        streaming metrics from the CISO agent
+- resources_incident_{id}.json  SRE container resource usage from sre_benchmark_runner.py
+
+Every run becomes a row in `runs` (scenario, agent variant, model, streaming,
+timestamp; all indexed) and its numeric metrics become rows in `metrics`,
+keyed by their dotted JSON path (e.g. "trtt_stats.p95"). Ingest is
+incremental: files whose size and mtime are unchanged are skipped, and so
+are files that failed to parse until they change.
+
+    python results_store.py ingest [path ...]
+    python results_store.py compare --by agent_variant [--metric NAME ...]
+    python results_store.py runs [--scenario PATTERN] [--model PATTERN]
+    python results_store.py metrics
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import re
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from adaptive_repeats import SAMPLES_FILENAME
+
+DEFAULT_DB_PATH = "nfr_results.sqlite"
+
+# Where ingest looks when no paths are given, relative to the working directory
+DEFAULT_SOURCES = [
+    "*_incident_*.json",
+    "../benchmark_results*/rep_*/analysis_incident_*.json",
+    "../ciso_traces*/**/analysis.json",
+    "../ciso_traces*/**/analysis.log",
+    "../ciso_traces*/**/vllm_metrics_*.json",
+    "../streaming_metrics.json",
+    "../benchmark_results/**/resources_incident_*.json",
+]
+
+# Metrics shown by `compare` when none are requested
+DEFAULT_COMPARE_METRICS = [
+    "end_to_end_latency_ms",
+    "llm_stats.total_calls",
+    "llm_stats.total_input_tokens",
+    "llm_stats.total_output_tokens",
+    "llm_stats.planning_overhead_percent",
+    "prompt_completion_ratio",
+    "tool_reuse_rate.total_usages",
+    "parallel_tool_calls.saved_ms",
+    "tool_error_rate.rate_percent",
+    "throughput.ultimate_tokens_per_sec",
+    "trtt_stats.avg",
+    "llm_execution_stats.avg",
+]
+
+# Columns of `runs` that compare can group by
+GROUP_COLUMNS = ("agent_variant", "model", "streaming", "domain", "kind")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed_sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source_path TEXT NOT NULL REFERENCES sources(path) ON DELETE CASCADE,
+    record INTEGER NOT NULL DEFAULT 0,
+    kind TEXT NOT NULL,
+    domain TEXT,
+    scenario TEXT,
+    agent_variant TEXT,
+    model TEXT,
+    streaming INTEGER NOT NULL DEFAULT 0,
+    timestamp TEXT,
+    UNIQUE (source_path, record)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_scenario ON runs(scenario);
+CREATE INDEX IF NOT EXISTS runs_agent_variant ON runs(agent_variant);
+CREATE INDEX IF NOT EXISTS runs_model ON runs(model);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs(timestamp);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics(name, run_id);
+"""
+
+SRE_EXPORT_RE = re.compile(r"(?P<variant>[A-Za-z0-9]+)_(?P<domain>[a-z]+)_(?P<scenario>incident_\d+)\.json$")
+SRE_ANALYSIS_RE = re.compile(r"^analysis_(?P<scenario>incident_\d+)\.json$")
+RESOURCES_RE = re.compile(r"resources_(?P<scenario>incident_\d+)\.json$")
+VLLM_METRICS_RE = re.compile(r"vllm_metrics_(\d{8}_\d{6})\.json$")
+STREAMING_SUFFIX_RE = re.compile(r"[-_]streaming$")
+REPEAT_DIR_RE = re.compile(r"rep_\d+$")
+
+# analysis.log lines -> (metric name, scale). The first match of each wins.
+LOG_PATTERNS = [
+    (re.compile(r"^End to End Latency\s+([\d.]+) ms"), "end_to_end_latency_ms", 1),
+    (re.compile(r"^Total LLM Calls: (\d+)"), "llm_stats.total_calls", 1),
+    (re.compile(r"^Total Reasoning Tokens: (\d+)"), "llm_stats.total_reasoning_tokens", 1),
+    (re.compile(r"^Total Output Tokens: (\d+)"), "llm_stats.total_output_tokens", 1),
+    (re.compile(r"^Total Prompt Tokens: (\d+)"), "llm_stats.total_input_tokens", 1),
+    (re.compile(r"^Planning Overhead \(Reasoning/Output\): ([\d.]+)%"), "llm_stats.planning_overhead_percent", 1),
+    (re.compile(r"^Prompt vs Completion Ratio: ([\d.]+)"), "prompt_completion_ratio", 1),
+    (re.compile(r"^Total Tool Usages: (\d+)"), "tool_reuse_rate.total_usages", 1),
+    (re.compile(r"^Repeated Tool Usages: (\d+)"), "tool_reuse_rate.repeated_usages", 1),
+    (re.compile(r"^Overall Tool Reuse Rate: ([\d.]+)%"), "tool_reuse_rate.overall_rate_percent", 1),
+    (re.compile(r"^Tool Error Rate: ([\d.]+)%"), "tool_error_rate.rate_percent", 1),
+    (re.compile(r"^Error Rate: ([\d.]+)%"), "error_rate.rate_percent", 1),
+    (re.compile(r"^Context Window Utilization \(Average\): ([\d.]+)%"), "context_window_utilization.average", 0.01),
+    (re.compile(r"^Context Window Utilization \(Max\): ([\d.]+)%"), "context_window_utilization.max", 0.01),
+    (re.compile(r"^Average Per-Call Token Throughput: ([\d.]+)"), "throughput.average_per_call_tokens_per_sec", 1),
+    (re.compile(r"^Ultimate Token Throughput .*: ([\d.]+) tokens/sec"), "throughput.ultimate_tokens_per_sec", 1),
+    (re.compile(r"^Average TRTT: ([\d.]+) ms"), "trtt_stats.avg", 1),
+    (re.compile(r"^TRTT P95: ([\d.]+) ms"), "trtt_stats.p95", 1),
+    (re.compile(r"^Average Processing Time: ([\d.]+) ms"), "processing_stats.avg", 1),
+    (re.compile(r"^Average LLM Execution Time: ([\d.]+) ms"), "llm_execution_stats.avg", 1),
+    (re.compile(r"^LLM Execution Time P95: ([\d.]+) ms"), "llm_execution_stats.p95", 1),
+]
+LOG_MODEL_RE = re.compile(r"^Context Window Size \((.+)\): ")
+
+
+@dataclass
+class RunRecord:
+    """One benchmark run and its numeric metrics, ready to be stored."""
+    kind: str  # "nfr", "vllm", "streaming" or "resources"
+    scenario: Optional[str] = None
+    domain: Optional[str] = None
+    agent_variant: Optional[str] = None
+    model: Optional[str] = None
+    streaming: bool = False
+    timestamp: Optional[str] = None
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+
+def flatten_metrics(data, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a nested dict, keyed by dotted path. Lists are skipped."""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_metrics(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def _mtime_timestamp(path: str) -> str:
+    return datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat()
+
+
+def _split_scenario(name: str):
+    """(scenario, streaming) for a CISO scenario directory name."""
+    if STREAMING_SUFFIX_RE.search(name):
+        return STREAMING_SUFFIX_RE.sub("", name), True
+    return name, False
+
+
+def _ciso_context(path: str) -> RunRecord:
+    """Scenario and variant of a file under ../ciso_traces[_<variant>]/<scenario>/."""
+    scenario_dir = os.path.dirname(os.path.abspath(path))
+    # Adaptive repeats keep each run in <scenario>/rep_<n>/
+    if REPEAT_DIR_RE.match(os.path.basename(scenario_dir)):
+        scenario_dir = os.path.dirname(scenario_dir)
+    scenario, streaming = _split_scenario(os.path.basename(scenario_dir))
+    variant = None
+    for part in reversed(os.path.abspath(path).split(os.sep)):
+        if part.startswith("ciso_traces_"):
+            variant = part[len("ciso_traces_"):]
+            break
+    return RunRecord(kind="nfr", domain="ciso", scenario=scenario, agent_variant=variant,
+                     streaming=streaming, timestamp=_mtime_timestamp(path))
+
+
+def _sre_context(path: str, scenario: str) -> RunRecord:
+    """Variant of a file under ../benchmark_results[_<variant>_sre]/[rep_<n>/]."""
+    variant = None
+    for part in reversed(os.path.abspath(path).split(os.sep)):
+        if part.startswith("benchmark_results_"):
+            variant = re.sub(r"_sre$", "", part[len("benchmark_results_"):])
+            break
+    return RunRecord(kind="nfr", domain="sre", scenario=scenario, agent_variant=variant,
+                     timestamp=_mtime_timestamp(path))
+
+
+def _main_model(metrics: dict) -> Optional[str]:
+    """The model with the most LLM calls in an exported TraceMetrics dict."""
+    per_model = (metrics.get("token_costs") or {}).get("per_model") or {}
+    if not per_model:
+        return None
+    return max(per_model, key=lambda m: per_model[m].get("calls", 0))
+
+
+def parse_analysis_json(path: str) -> List[RunRecord]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    name = os.path.basename(path)
+    analysis_match = SRE_ANALYSIS_RE.match(name)
+    match = SRE_EXPORT_RE.search(name)
+    if analysis_match:
+        record = _sre_context(path, analysis_match.group("scenario"))
+    elif match:
+        record = RunRecord(kind="nfr", domain=match.group("domain"), scenario=match.group("scenario"),
+                           agent_variant=match.group("variant"), timestamp=_mtime_timestamp(path))
+    else:
+        record = _ciso_context(path)
+    record.model = _main_model(data)
+    record.metrics = flatten_metrics(data)
+    return [record]
+
+
+def parse_analysis_log(path: str) -> List[RunRecord]:
+    record = _ciso_context(path)
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if record.model is None:
+                model_match = LOG_MODEL_RE.match(line)
+                if model_match:
+                    record.model = model_match.group(1)
+                    continue
+            for pattern, name, scale in LOG_PATTERNS:
+                if name in record.metrics:
+                    continue
+                match = pattern.match(line)
+                if match:
+                    record.metrics[name] = float(match.group(1)) * scale
+                    break
+    return [record] if record.metrics else []
+
+
+def parse_vllm_metrics(path: str) -> List[RunRecord]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    scenario, streaming = _split_scenario(data.get("test_name") or os.path.basename(os.path.dirname(path)))
+    timestamp = data.get("start_time")
+    if not timestamp:
+        match = VLLM_METRICS_RE.search(path)
+        timestamp = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat() if match else None
+    return [RunRecord(kind="vllm", domain="ciso", scenario=scenario, streaming=streaming,
+                      model=data.get("model"), timestamp=timestamp, metrics=flatten_metrics(data))]
+
+
+def parse_streaming_metrics(path: str) -> List[RunRecord]:
+    """streaming_metrics.json: one object, a list of objects, or objects keyed by scenario."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and data and all(isinstance(v, dict) for v in data.values()):
+        entries = [dict(v, scenario=v.get("scenario", k)) for k, v in data.items()]
+    elif isinstance(data, dict):
+        entries = [data]
+    else:
+        entries = [e for e in data if isinstance(e, dict)]
+    records = []
+    for entry in entries:
+        scenario = entry.get("scenario") or entry.get("test_name") or entry.get("scenario_name")
+        if scenario:
+            scenario, _ = _split_scenario(scenario)
+        records.append(RunRecord(kind="streaming", domain="ciso", scenario=scenario, streaming=True,
+                                 model=entry.get("model"),
+                                 timestamp=entry.get("timestamp") or _mtime_timestamp(path),
+                                 metrics=flatten_metrics(entry)))
+    return records
+
+
+def parse_resources(path: str) -> List[RunRecord]:
+    """resources_incident_<id>.json: the summary part, under the same names as in vLLM metrics."""
+    with open(path, "r") as f:
+        summary = json.load(f)["summary"]
+    return [RunRecord(kind="resources", domain="sre", scenario=RESOURCES_RE.search(path).group("scenario"),
+                      timestamp=summary.get("start_time") or _mtime_timestamp(path),
+                      metrics=flatten_metrics({"resources": summary}))]
+
+
+def parse_result_file(path: str) -> List[RunRecord]:
+    """Parse any supported result file into run records."""
+    name = os.path.basename(path)
+    if name == "analysis.log":
+        return parse_analysis_log(path)
+    if VLLM_METRICS_RE.search(name):
+        return parse_vllm_metrics(path)
+    if name == "streaming_metrics.json":
+        return parse_streaming_metrics(path)
+    if RESOURCES_RE.search(name):
+        return parse_resources(path)
+    return parse_analysis_json(path)
+
+
+def superseded_by_json(path: str) -> bool:
+    """analysis.log is only a fallback for runs without analysis.json."""
+    return (os.path.basename(path) == "analysis.log"
+            and os.path.exists(os.path.join(os.path.dirname(path), "analysis.json")))
+
+
+# File names the directory walk picks up as result files
+RESULT_FILE_PATTERNS = ("*_incident_*.json", "analysis.json", "analysis.log",
+                        "vllm_metrics_*.json", "streaming_metrics.json", "resources_incident_*.json")
+
+
+def _is_raw_file(name: str) -> bool:
+    return name.startswith("observations_") or name == SAMPLES_FILENAME
+
+
+def _is_result_file(name: str) -> bool:
+    # Raw observation dumps and adaptive repeat samples are not result files
+    return not _is_raw_file(name) and any(fnmatch.fnmatch(name, p) for p in RESULT_FILE_PATTERNS)
+
+
+def _result_files_under(directory: str) -> List[str]:
+    candidates = []
+    for pattern in RESULT_FILE_PATTERNS:
+        candidates.extend(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+    return [c for c in candidates if _is_result_file(os.path.basename(c))]
+
+
+def iter_source_files(paths: List[str]) -> Iterator[str]:
+    """
+    Expand paths (files, directories or globs) into result files. Files named
+    explicitly are always returned; directories and glob matches are filtered
+    by the result file names.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = _result_files_under(path)
+        elif glob.has_magic(path):
+            candidates = []
+            for match in glob.glob(path, recursive=True):
+                if os.path.isdir(match):
+                    candidates.extend(_result_files_under(match))
+                elif _is_result_file(os.path.basename(match)):
+                    candidates.append(match)
+        else:
+            candidates = glob.glob(path)
+        yield from sorted(set(candidates))
+
+
+class ResultsStore:
+    """The results database: incremental ingest plus the comparison queries."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def ingest(self, paths: List[str]) -> Dict[str, int]:
+        """Load new or changed result files. Returns counts of files loaded/skipped/failed."""
+        counts = {"loaded": 0, "skipped": 0, "failed": 0, "runs": 0}
+        for path in iter_source_files(paths):
+            path = os.path.abspath(path)
+            stat = os.stat(path)
+            if superseded_by_json(path):
+                counts["skipped"] += 1
+                continue
+            known = self.conn.execute("SELECT size, mtime FROM sources WHERE path = ?", (path,)).fetchone()
+            if known is None:
+                # Files that failed before are retried only once they change
+                known = self.conn.execute("SELECT size, mtime FROM failed_sources WHERE path = ?",
+                                          (path,)).fetchone()
+            if known == (stat.st_size, stat.st_mtime):
+                counts["skipped"] += 1
+                continue
+            try:
+                records = parse_result_file(path)
+            except (OSError, ValueError, KeyError, AttributeError) as e:
+                print(f"[WARN] Could not parse {path}: {e}")
+                counts["failed"] += 1
+                with self.conn:
+                    self.conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+                    self.conn.execute("INSERT OR REPLACE INTO failed_sources (path, size, mtime, error)"
+                                      " VALUES (?, ?, ?, ?)", (path, stat.st_size, stat.st_mtime, str(e)))
+                continue
+            with self.conn:
+                # Replacing the source drops its old runs and metrics
+                self.conn.execute("DELETE FROM failed_sources WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM sources WHERE path = ?", (path,))
+                self.conn.execute("INSERT INTO sources (path, size, mtime) VALUES (?, ?, ?)",
+                                  (path, stat.st_size, stat.st_mtime))
+                for index, record in enumerate(records):
+                    cursor = self.conn.execute(
+                        "INSERT INTO runs (source_path, record, kind, domain, scenario, agent_variant,"
+                        " model, streaming, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (path, index, record.kind, record.domain, record.scenario, record.agent_variant,
+                         record.model, int(record.streaming), record.timestamp))
+                    self.conn.executemany(
+                        "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                        [(cursor.lastrowid, name, value) for name, value in record.metrics.items()])
+            counts["loaded"] += 1
+            counts["runs"] += len(records)
+        return counts
+
+    def _filters(self, scenario: Optional[str], model: Optional[str], kind: Optional[str],
+                 streaming: Optional[bool] = None):
+        clauses, params = [], []
+        for column, value in (("r.scenario", scenario), ("r.model", model)):
+            if value:
+                clauses.append(f"{column} LIKE ?")
+                params.append(value)
+        if kind:
+            clauses.append("r.kind = ?")
+            params.append(kind)
+        if streaming is not None:
+            clauses.append("r.streaming = ?")
+            params.append(int(streaming))
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def compare(self, group_by: str, metric_names: List[str], scenario: Optional[str] = None,
+                model: Optional[str] = None, kind: Optional[str] = None,
+                streaming: Optional[bool] = None) -> List[tuple]:
+        """
+        Average of each metric per (scenario, group) as rows of
+        (scenario, metric, group value, average, run count).
+        """
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group by {group_by}; choose from {', '.join(GROUP_COLUMNS)}")
+        where, params = self._filters(scenario, model, kind, streaming)
+        placeholders = ", ".join("?" for _ in metric_names)
+        return self.conn.execute(
+            f"SELECT r.scenario, m.name, r.{group_by}, AVG(m.value), COUNT(*)"
+            f" FROM metrics m JOIN runs r ON r.id = m.run_id"
+            f" WHERE m.name IN ({placeholders}){where}"
+            f" GROUP BY r.scenario, m.name, r.{group_by}"
+            f" ORDER BY r.scenario, m.name, r.{group_by}",
+            [*metric_names, *params]).fetchall()
+
+    def runs(self, scenario: Optional[str] = None, model: Optional[str] = None,
+             kind: Optional[str] = None, streaming: Optional[bool] = None) -> List[tuple]:
+        where, params = self._filters(scenario, model, kind, streaming)
+        return self.conn.execute(
+            "SELECT r.id, r.kind, r.domain, r.scenario, r.agent_variant, r.model, r.streaming, r.timestamp,"
+            " r.source_path FROM runs r WHERE 1 = 1" + where + " ORDER BY r.timestamp, r.id",
+            params).fetchall()
+
+    def metric_names(self) -> List[tuple]:
+        return self.conn.execute(
+            "SELECT name, COUNT(*) FROM metrics GROUP BY name ORDER BY name").fetchall()
+
+
+def _group_label(group_by: str, group) -> str:
+    if group is None:
+        return "-"
+    if group_by == "streaming":
+        return "streaming" if group else "non-streaming"
+    return str(group)
+
+
+def print_comparison(rows: List[tuple], group_by: str) -> None:
+    """Print compare() rows as one table per scenario, one column per group value."""
+    if not rows:
+        print(f"No runs found to compare by {group_by}.")
+        return
+    groups = sorted({row[2] for row in rows}, key=lambda g: (g is None, str(g)))
+    by_scenario: Dict[str, Dict[str, Dict[object, str]]] = {}
+    for scenario, name, group, average, count in rows:
+        cell = f"{average:.2f}" + (f" (n={count})" if count > 1 else "")
+        by_scenario.setdefault(scenario, {}).setdefault(name, {})[group] = cell
+
+    labels = [_group_label(group_by, g) for g in groups]
+    width = max(len(text) for text in labels + [cell for s in by_scenario.values()
+                                                 for values in s.values() for cell in values.values()])
+    name_width = max(len("Metric"), *(len(row[1]) for row in rows))
+    for scenario, metrics in by_scenario.items():
+        print(f"\n--- {scenario or '(unknown scenario)'} ---")
+        print(f"{'Metric':<{name_width}}" + "".join(f"  {label:>{width}}" for label in labels))
+        for name, values in metrics.items():
+            print(f"{name:<{name_width}}" + "".join(f"  {values.get(g, '-'):>{width}}" for g in groups))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="database file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="load new or changed result files")
+    ingest.add_argument("paths", nargs="*", default=DEFAULT_SOURCES,
+                        help="result files, directories or globs")
+
+    for name, help_text in (("compare", "average metrics per scenario and group"),
+                            ("runs", "list ingested runs")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--scenario", help="SQL LIKE pattern, e.g. 'incident_%%'")
+        sub.add_argument("--model", help="SQL LIKE pattern, e.g. '%%qwen%%'")
+        sub.add_argument("--kind", choices=["nfr", "vllm", "streaming", "resources"])
+        streaming = sub.add_mutually_exclusive_group()
+        streaming.add_argument("--streaming", action="store_const", const=True,
+                               help="only runs against streaming APIs")
+        streaming.add_argument("--no-streaming", action="store_const", const=False, dest="streaming",
+                               help="only runs against non-streaming APIs")
+        if name == "compare":
+            sub.add_argument("--by", default="agent_variant", choices=GROUP_COLUMNS,
+                             help="column to compare across (default: agent_variant)")
+            sub.add_argument("--metric", action="append", dest="metrics",
+                             help="metric to compare (repeatable; default: the README metrics)")
+
+    subparsers.add_parser("metrics", help="list stored metric names")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    try:
+        if args.command == "ingest":
+            counts = store.ingest(args.paths)
+            print(f"[INFO] Loaded {counts['loaded']} files ({counts['runs']} runs), "
+                  f"skipped {counts['skipped']} unchanged, {counts['failed']} failed")
+        elif args.command == "compare":
+            rows = store.compare(args.by, args.metrics or DEFAULT_COMPARE_METRICS,
+                                 args.scenario, args.model, args.kind, args.streaming)
+            print_comparison(rows, args.by)
+        elif args.command == "runs":
+            for run in store.runs(args.scenario, args.model, args.kind, args.streaming):
+                run_id, kind, domain, scenario, variant, model, streaming, timestamp, source = run
+                print(f"{run_id:>5} {kind:<9} {domain or '-':<5} {scenario or '-':<32} {variant or '-':<10} "
+                      f"{model or '-':<32} {'streaming' if streaming else '':<9} {timestamp or '-'}  {source}")
+        elif args.command == "metrics":
+            for name, count in store.metric_names():
+                print(f"{name:<60} {count:>6} runs")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,37 @@
 import os
+import json
+import argparse
 import analyze_traces
 
-def run_dumps():
+
+def print_run_summary(metrics):
+    """One line per run: E2E latency, LLM calls and tokens, tool calls and error rate."""
+    e2e = metrics.end_to_end_latency_ms
+    errors = metrics.error_rate.rate_percent
+    print(f"  E2E {f'{e2e / 1000:.1f} s' if e2e is not None else 'n/a'}, "
+          f"{metrics.llm_stats.total_calls} LLM calls "
+          f"({metrics.llm_stats.total_input_tokens} in / {metrics.llm_stats.total_output_tokens} out tokens), "
+          f"{metrics.tool_reuse_rate.total_usages} tool calls, "
+          f"error rate {f'{errors:.1f}%' if errors is not None else 'n/a'}")
+
+
+def rank_by_prefill_waste(run_metrics):
+    """Ranks analyzed runs (run name -> TraceMetrics) by redundant prefill tokens, most wasteful first."""
+    ranking = []
+    for run_name, metrics in run_metrics.items():
+        if metrics.token_costs:
+            ranking.append((run_name, metrics.token_costs['totals']))
+    ranking.sort(key=lambda r: r[1]['redundant_prefill_tokens'], reverse=True)
+
+    print("\n--- Runs Ranked by Redundant Prefill ---")
+    for run_name, totals in ranking:
+        print(f"{run_name:<35} {int(totals['redundant_prefill_tokens']):>10} tokens "
+              f"({totals['redundant_prefill_percent'] or 0:.2f}% of input), "
+              f"${totals['redundant_cost_usd']:.4f}")
+    return ranking
+
+
+def run_dumps(verbose=False):
     incidents = [1, 16, 23, 30, 102]
     
     # Map from directory name to output prefix
@@ -12,6 +42,7 @@ def run_dumps():
     
     # Base directory is one level up from itbench-nfr
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    run_metrics = {}
     
     for subdir, prefix in sources.items():
         source_dir = os.path.join(base_dir, subdir)
@@ -29,10 +60,27 @@ def run_dumps():
             
             print(f"\nProcessing Incident {incident_id} from {subdir}...")
             
-            if os.path.exists(input_path):
-                analyze_traces.load_and_print_observations(input_path, output_path)
-            else:
+            if not os.path.exists(input_path):
                 print(f"  Input file not found: {input_path}")
+                continue
+
+            try:
+                metrics = analyze_traces.analyze_trace(input_path)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"  Could not analyze {input_path}: {e}")
+                continue
+            if verbose:
+                analyze_traces.print_metrics(metrics)
+            else:
+                print_run_summary(metrics)
+            analyze_traces.export_metrics(metrics, output_path)
+            print(f"  Metrics exported to {output_path}")
+            run_metrics[f"{prefix}_incident_{incident_id}"] = metrics
+
+    if run_metrics:
+        rank_by_prefill_waste(run_metrics)
 
 if __name__ == "__main__":
-    run_dumps()
+    parser = argparse.ArgumentParser(description="Analyze the SRE observation dumps of every agent variant")
+    parser.add_argument("--verbose", action="store_true", help="print the full NFR report of every run")
+    run_dumps(parser.parse_args().verbose)
@@ -5,12 +5,22 @@ import subprocess
 import time
 import shutil
 import glob
+import argparse
+from datetime import datetime, timezone
+
+from adaptive_repeats import SAMPLES_FILENAME, add_repeat_arguments, analyze_repeat, policy_from_args, run_adaptive
+from langfuse_fetch import LangfuseError, client_from_env, fetch_dump
+from resource_sampler import DEFAULT_INTERVAL_SEC, ResourceSampler, print_resource_summary
 
 # Configuration
 INCIDENTS_MD_PATH = "../ITBench-Scenarios/sre/docs/incidents.md"
 AGENTS_DIR = "../ITBench-SRE-Agent"
 SCENARIOS_DIR = "../ITBench-Scenarios/sre"
 RESULTS_DIR = "../benchmark_results"
+# Name given to the agent container so its resource usage can be sampled
+AGENT_CONTAINER = "itbench-sre-agent"
+# How long to wait for Langfuse to finish ingesting a run's traces (seconds)
+TRACE_SETTLE_SEC = 300
 
 def get_incidents():
     """Parses incidents.md to find all incident IDs."""
@@ -22,6 +32,23 @@ def get_incidents():
         incidents = [int(m) for m in matches]
     return sorted(list(set(incidents)))
 
+def fetch_traces(since, until, dest_file):
+    """
+    Fetches the Langfuse traces started between since and until into
+    dest_file, once Langfuse has finished ingesting them.
+    """
+    client = client_from_env()
+    if client is None:
+        return False
+    try:
+        count = fetch_dump(client, dest_file, since=since, until=until, settle_sec=TRACE_SETTLE_SEC)
+    except LangfuseError as e:
+        print(f"Could not fetch traces from Langfuse: {e}")
+        return False
+    finally:
+        client.close()
+    return count > 0
+
 def run_command(command, cwd=None, env=None, background=False, quiet=False):
     """Runs a shell command."""
     print(f"Running: {command}")
@@ -38,121 +65,182 @@ def run_command(command, cwd=None, env=None, background=False, quiet=False):
         return False
     return True
 
-def main():
+def run_incident(inc_id, root_dir, dest_file, resource_interval=DEFAULT_INTERVAL_SEC, containers=()):
+    """
+    Runs the agent on one incident and saves its traces to dest_file. Returns whether they were saved.
+    The resource usage of the agent (and of any extra containers) is saved next to it,
+    as resources_incident_<id>.json.
+    """
+    print(f"\n{'='*50}")
+    print(f"Starting Incident {inc_id}")
+    print(f"{'='*50}")
+
+    sampler = ResourceSampler(resource_interval)
+    for container in [AGENT_CONTAINER, *containers]:
+        sampler.add_container(container)
+    sampler.start()
+    try:
+        return _run_incident(inc_id, root_dir, dest_file, sampler)
+    finally:
+        sampler.stop()
+        resources_file = os.path.join(os.path.dirname(dest_file), f"resources_incident_{inc_id}.json")
+        sampler.save(resources_file)
+        print_resource_summary(sampler.summary())
+        print(f"Saved resource samples to {resources_file}")
+
+def _run_incident(inc_id, root_dir, dest_file, sampler):
+    # 1. Start Incident
+    sampler.mark_phase("start_incident")
+    env = os.environ.copy()
+    env["INCIDENT_NUMBER"] = str(inc_id)
+    
+    # We wrap the make command in 'conda run -n sre' to ensure the 'sre' environment 
+    # (containing ansible-playbook) is used.
+    # Note: This assumes 'conda' is in the PATH.
+    start_cmd = f"conda run -n sre make start_incident"
+    
+    if not run_command(start_cmd, cwd=SCENARIOS_DIR, env=env):
+        print(f"Failed to start incident {inc_id}. Skipping.")
+        return False
+
+    # Wait a bit for things to settle
+    sampler.mark_phase("setup")
+    print("Waiting 30s for incident stack to stabilize...")
+    time.sleep(30)
+
+    # 2. Port Forwarding
+    # Cleanup any existing port forward on 8080
+    run_command("fuser -k 8080/tcp", quiet=True)
+    
+    # Wait for ingress controller to be ready
+    print("Waiting for ingress-nginx-controller deployment...")
+    run_command("kubectl wait --namespace ingress-nginx --for=condition=available deployment/ingress-nginx-controller --timeout=300s", quiet=True)
+    
+    # kubectl port-forward svc/ingress-nginx-controller -n ingress-nginx 8080:80 &
+    print("Starting port forwarding...")
+    pf_log = open(f"pf_incident_{inc_id}.log", "w")
+    pf_process = subprocess.Popen(
+        "kubectl port-forward svc/ingress-nginx-controller -n ingress-nginx 8080:80",
+        shell=True,
+        stdout=pf_log,
+        stderr=pf_log
+    )
+    
+    # Wait for port 8080 to be listening
+    print("Waiting for port 8080 to be ready...")
+    import socket
+    port_ready = False
+    for _ in range(60): # Wait up to 60 seconds
+        try:
+            with socket.create_connection(("localhost", 8080), timeout=1):
+                port_ready = True
+                break
+        except (ConnectionRefusedError, OSError):
+            time.sleep(1)
+    
+    if not port_ready:
+        print("timeout waiting for port 8080. Checking logs...")
+        pf_process.terminate()
+        pf_log.close()
+        with open(f"pf_incident_{inc_id}.log", "r") as f:
+            print(f.read())
+        return False # Skip this incident if port forward fails
+
+    # 3. Run Agent
+    # We execute 'python -c ... run()' to start the agent automatically without user interaction.
+    # We pass EXP_NAME because the agent code uses it for output path generation.
+    
+    # Use absolute path for mount to avoid ambiguity
+    agents_abs_path = os.path.abspath(AGENTS_DIR)
+    
+    agent_cmd = (
+        f"docker run --rm --name {AGENT_CONTAINER} --network=host "
+        f"--mount type=bind,src=\"{agents_abs_path}\",target=/app/lumyn "
+        f"-e KUBECONFIG=/app/lumyn/config "
+        f"-e INCIDENT_NUMBER={inc_id} "
+        f"-e EXP_NAME=benchmark_run "
+        f"-e PYTHONPATH=$PYTHONPATH:/app/lumyn/src "
+        f"itbench-sre-agent "
+        f"sudo -E uv run python -c 'from lumyn.main import run; run()'"
+    )
+
+    sampler.mark_phase("agent")
+    agent_started = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    run_command(agent_cmd, cwd=root_dir)
+    agent_finished = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+    # 4. Cleanup Port Forward
+    sampler.mark_phase("collect_traces")
+    if pf_process:
+        pf_process.terminate()
+        pf_process.wait()
+        pf_log.close()
+        # Verify killed
+        run_command("fuser -k 8080/tcp", quiet=True)
+
+    # 5. Collect Traces
+    # The agent should have produced 'observations_dump.json' in the AGENTS_DIR (mapped to /app/lumyn)
+    # If it did not, fetch the traces of the agent's run from Langfuse instead
+    dump_file = os.path.join(AGENTS_DIR, "observations_dump.json")
+    saved = True
+    if os.path.exists(dump_file):
+        shutil.move(dump_file, dest_file)
+        print(f"Saved traces to {dest_file}")
+    elif fetch_traces(agent_started, agent_finished, dest_file):
+        print(f"Saved traces fetched from Langfuse to {dest_file}")
+    else:
+        print(f"Warning: No observations_dump.json found for incident {inc_id}")
+        saved = False
+
+    # 6. Stop Incident
+    sampler.mark_phase("stop_incident")
+    stop_cmd = f"conda run -n sre make stop_incident"
+    run_command(stop_cmd, cwd=SCENARIOS_DIR, env=env)
+    
+    # Wait for cleanup
+    time.sleep(10)
+    return saved
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the SRE agent on every ITBench incident")
+    parser.add_argument("--incidents", type=int, nargs="+", help="incident ids to run (default: all)")
+    parser.add_argument("--resource-interval", type=float, default=DEFAULT_INTERVAL_SEC,
+                        help="seconds between container resource samples (default: %(default)s)")
+    parser.add_argument("--sample-containers", nargs="+", default=[],
+                        help="more containers to sample besides the agent, e.g. the cluster's kind nodes")
+    add_repeat_arguments(parser)
+    args = parser.parse_args(argv)
+
     if not os.path.exists(RESULTS_DIR):
         os.makedirs(RESULTS_DIR)
 
-    incidents = get_incidents()
+    incidents = args.incidents or get_incidents()
     print(f"Found {len(incidents)} incidents: {incidents}")
 
     # Ensure we are in the root directory
     root_dir = os.getcwd()
     root_dir = os.path.dirname(root_dir)
 
+    if args.adaptive:
+        # Each repeat keeps its traces and metrics in RESULTS_DIR/rep_<n>/
+        def run_once(scenario, repeat):
+            inc_id = int(scenario.rsplit("_", 1)[1])
+            repeat_dir = os.path.join(RESULTS_DIR, f"rep_{repeat}")
+            os.makedirs(repeat_dir, exist_ok=True)
+            dest_file = os.path.join(repeat_dir, f"observations_incident_{inc_id}.json")
+            if not run_incident(inc_id, root_dir, dest_file, args.resource_interval, args.sample_containers):
+                return None
+            return analyze_repeat(dest_file, os.path.join(repeat_dir, f"analysis_incident_{inc_id}.json"))
+
+        samples_path = os.path.join(RESULTS_DIR, SAMPLES_FILENAME)
+        run_adaptive([f"sre/incident_{inc_id}" for inc_id in incidents], run_once,
+                     policy_from_args(args), samples_path)
+        print(f"Samples saved to {samples_path}")
+        return
+
     for inc_id in incidents:
-        print(f"\n{'='*50}")
-        print(f"Starting Incident {inc_id}")
-        print(f"{'='*50}")
-
-        # 1. Start Incident
-        env = os.environ.copy()
-        env["INCIDENT_NUMBER"] = str(inc_id)
-        
-        # We wrap the make command in 'conda run -n sre' to ensure the 'sre' environment 
-        # (containing ansible-playbook) is used.
-        # Note: This assumes 'conda' is in the PATH.
-        start_cmd = f"conda run -n sre make start_incident"
-        
-        if not run_command(start_cmd, cwd=SCENARIOS_DIR, env=env):
-            print(f"Failed to start incident {inc_id}. Skipping.")
-            continue
-
-        # Wait a bit for things to settle
-        print("Waiting 30s for incident stack to stabilize...")
-        time.sleep(30)
-
-        # 2. Port Forwarding
-        # Cleanup any existing port forward on 8080
-        run_command("fuser -k 8080/tcp", quiet=True)
-        
-        # Wait for ingress controller to be ready
-        print("Waiting for ingress-nginx-controller deployment...")
-        run_command("kubectl wait --namespace ingress-nginx --for=condition=available deployment/ingress-nginx-controller --timeout=300s", quiet=True)
-        
-        # kubectl port-forward svc/ingress-nginx-controller -n ingress-nginx 8080:80 &
-        print("Starting port forwarding...")
-        pf_log = open(f"pf_incident_{inc_id}.log", "w")
-        pf_process = subprocess.Popen(
-            "kubectl port-forward svc/ingress-nginx-controller -n ingress-nginx 8080:80",
-            shell=True,
-            stdout=pf_log,
-            stderr=pf_log
-        )
-        
-        # Wait for port 8080 to be listening
-        print("Waiting for port 8080 to be ready...")
-        import socket
-        port_ready = False
-        for _ in range(60): # Wait up to 60 seconds
-            try:
-                with socket.create_connection(("localhost", 8080), timeout=1):
-                    port_ready = True
-                    break
-            except (ConnectionRefusedError, OSError):
-                time.sleep(1)
-        
-        if not port_ready:
-            print("timeout waiting for port 8080. Checking logs...")
-            pf_process.terminate()
-            pf_log.close()
-            with open(f"pf_incident_{inc_id}.log", "r") as f:
-                print(f.read())
-            continue # Skip this incident if port forward fails
-
-        # 3. Run Agent
-        # We execute 'python -c ... run()' to start the agent automatically without user interaction.
-        # We pass EXP_NAME because the agent code uses it for output path generation.
-        
-        # Use absolute path for mount to avoid ambiguity
-        agents_abs_path = os.path.abspath(AGENTS_DIR)
-        
-        agent_cmd = (
-            f"docker run --rm --network=host "
-            f"--mount type=bind,src=\"{agents_abs_path}\",target=/app/lumyn "
-            f"-e KUBECONFIG=/app/lumyn/config "
-            f"-e INCIDENT_NUMBER={inc_id} "
-            f"-e EXP_NAME=benchmark_run "
-            f"-e PYTHONPATH=$PYTHONPATH:/app/lumyn/src "
-            f"itbench-sre-agent "
-            f"sudo -E uv run python -c 'from lumyn.main import run; run()'"
-        )
-
-        run_command(agent_cmd, cwd=root_dir)
-
-        # 4. Cleanup Port Forward
-        if pf_process:
-            pf_process.terminate()
-            pf_process.wait()
-            pf_log.close()
-            # Verify killed
-            run_command("fuser -k 8080/tcp", quiet=True)
-
-        # 5. Collect Traces
-        # The agent should have produced 'observations_dump.json' in the AGENTS_DIR (mapped to /app/lumyn)
-        dump_file = os.path.join(AGENTS_DIR, "observations_dump.json")
-        if os.path.exists(dump_file):
-            dest_file = os.path.join(RESULTS_DIR, f"observations_incident_{inc_id}.json")
-            shutil.move(dump_file, dest_file)
-            print(f"Saved traces to {dest_file}")
-        else:
-            print(f"Warning: No observations_dump.json found for incident {inc_id}")
-
-        # 6. Stop Incident
-        stop_cmd = f"conda run -n sre make stop_incident"
-        run_command(stop_cmd, cwd=SCENARIOS_DIR, env=env)
-        
-        # Wait for cleanup
-        time.sleep(10)
+        run_incident(inc_id, root_dir, os.path.join(RESULTS_DIR, f"observations_incident_{inc_id}.json"),
+                     args.resource_interval, args.sample_containers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Seeded generator of synthetic Langfuse observation dumps.
+
+Produces traces shaped like the observations_dump.json files written by the
+SRE/CISO agents: a Crew_*.kickoff root span, nested task/agent spans, LLM
+generations whose prompts grow over a task, TOOL calls (some repeated, some
+failing) and the CrewAI "Tool Usage" / "Tool Repeated Usage" events.
+
+Observations are yielded one at a time and streamed to disk, so dumps with
+millions of observations can be written without holding them in memory:
+
+    python synthetic_traces.py <output.json> [n_observations] [seed]
+"""
+
+import json
+import random
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+TOOLS = {
+    "kubectl": ["get pods -n {ns}", "describe pod {pod} -n {ns}", "logs {pod} -n {ns} --tail=200",
+                "get events -n {ns}", "apply -f policy-{n}.yaml"],
+    "prometheus": ["rate(http_requests_total{{service=\"{svc}\"}}[5m])",
+                   "histogram_quantile(0.99, rate(latency_bucket{{service=\"{svc}\"}}[5m]))"],
+    "jaeger": ["service={svc} limit=20", "service={svc} operation=GET lookback=1h"],
+    "clickhouse": ["SELECT * FROM logs WHERE service='{svc}' LIMIT {n}"],
+}
+SERVICES = ["frontend", "cart", "checkout", "payment", "shipping", "ad"]
+NAMESPACES = ["otel-demo", "default", "kube-system"]
+
+TIMESTAMP_FORMATS = ("z", "offset", "naive", "seconds", "mixed")
+BASE_TIME = datetime(2025, 11, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class TraceProfile:
+    """Shape of a synthetic trace."""
+    n_observations: int = 1000
+    # Share of leaf steps that are LLM calls / tool calls; the rest are events
+    llm_ratio: float = 0.35
+    tool_ratio: float = 0.45
+    # Levels of spans between the root and the leaf steps
+    nesting_depth: int = 2
+    repeated_tool_ratio: float = 0.2
+    error_ratio: float = 0.05
+    timestamp_format: str = "z"
+    model: str = "gemini/gemini-2.5-pro"
+    seed: int = 0
+
+
+def _format_time(seconds: float, fmt: str, rng: random.Random) -> str:
+    dt = BASE_TIME + timedelta(seconds=seconds)
+    if fmt == "mixed":
+        fmt = rng.choice(TIMESTAMP_FORMATS[:-1])
+    if fmt == "z":
+        return dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if fmt == "offset":
+        return dt.isoformat(timespec="microseconds")
+    if fmt == "naive":
+        return dt.replace(tzinfo=None).isoformat(timespec="microseconds")
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _TraceBuilder:
+    def __init__(self, profile: TraceProfile):
+        if profile.timestamp_format not in TIMESTAMP_FORMATS:
+            raise ValueError(f"Unknown timestamp format: {profile.timestamp_format}")
+        self.profile = profile
+        self.rng = random.Random(profile.seed)
+        self.trace_id = f"trace-{profile.seed:08x}"
+        self.next_id = 0
+        self.emitted = 0
+        self.clock = 0.0
+        self.tool_history = []
+
+    def new_id(self) -> str:
+        self.next_id += 1
+        return f"obs-{self.profile.seed:x}-{self.next_id:08x}"
+
+    def observation(self, obs_id, name, obs_type, start, end, parent_id, reserved=False, **fields) -> dict:
+        """One observation dict; reserved ones were counted against the budget when their span opened."""
+        fmt, rng = self.profile.timestamp_format, self.rng
+        if not reserved:
+            self.emitted += 1
+        obs = {
+            "id": obs_id,
+            "trace_id": self.trace_id,
+            "type": obs_type,
+            "name": name,
+            "start_time": _format_time(start, fmt, rng),
+            "end_time": _format_time(end, fmt, rng),
+            "parent_observation_id": parent_id,
+            "latency": round(end - start, 6),
+            "level": "DEFAULT",
+            "metadata": {"attributes": {}},
+        }
+        obs.update(fields)
+        return obs
+
+    def tool_call(self, parent_id: str) -> Iterator[dict]:
+        rng, profile = self.rng, self.profile
+        if self.tool_history and rng.random() < profile.repeated_tool_ratio:
+            tool, arguments = rng.choice(self.tool_history)
+            repeated = True
+        else:
+            tool = rng.choice(list(TOOLS))
+            arguments = rng.choice(TOOLS[tool]).format(
+                ns=rng.choice(NAMESPACES), svc=rng.choice(SERVICES),
+                pod=f"{rng.choice(SERVICES)}-{rng.randrange(16 ** 5):05x}", n=rng.randrange(100))
+            self.tool_history.append((tool, arguments))
+            repeated = False
+
+        failed = rng.random() < profile.error_ratio
+        start = self.clock + rng.uniform(0.05, 1.5)
+        end = start + rng.lognormvariate(0.5, 1.0)
+        self.clock = end
+        tool_id = self.new_id()
+        calling = f"Tool: {tool}, arguments={{'query': '{arguments}'}}"
+        if failed:
+            output = {"return_code": 1, "stdout": "",
+                      "stderr": f"Error from server (NotFound): {arguments} not found"}
+        else:
+            output = {"return_code": 0, "stdout": "x" * rng.randrange(200, 4000), "stderr": ""}
+        yield self.observation(tool_id, f"{tool}._use", "TOOL", start, end, parent_id,
+                               input={"calling": calling}, output=output,
+                               metadata={"attributes": {"tool.name": tool}})
+        if self.emitted >= profile.n_observations:
+            return
+        yield self.observation(self.new_id(), "Tool Usage Error" if failed else "Tool Usage",
+                               "EVENT", end, end, tool_id,
+                               metadata={"attributes": {"tool_name": tool}})
+        if repeated and self.emitted < profile.n_observations:
+            yield self.observation(self.new_id(), "Tool Repeated Usage", "EVENT", end, end, tool_id,
+                                   metadata={"attributes": {"tool_name": tool}})
+
+    def llm_call(self, parent_id: str, context: list) -> dict:
+        rng = self.rng
+        start = self.clock + rng.uniform(0.05, 2.0)
+        output_tokens = rng.randrange(50, 1500)
+        input_tokens = context[0] + rng.randrange(100, 2000)
+        reasoning = rng.randrange(0, output_tokens // 2)
+        # Decode dominates: ~30-90 tokens/sec plus a prefill term
+        end = start + output_tokens / rng.uniform(30, 90) + input_tokens / 5000
+        self.clock = end
+        context[0] = min(input_tokens + output_tokens, 30000)
+        return self.observation(
+            self.new_id(), "litellm.completion", "GENERATION", start, end, parent_id,
+            model=self.profile.model,
+            usage_details={"input": input_tokens, "output": output_tokens,
+                           "total": input_tokens + output_tokens,
+                           "completion_details.reasoning": reasoning},
+            input=[{"role": "user", "content": "step"}],
+            output="Thought: continue",
+        )
+
+    def span(self, name: str, parent_id: Optional[str], depth: int, task_id=None) -> Iterator[dict]:
+        rng, profile = self.rng, self.profile
+        span_id = self.new_id()
+        # The span itself is emitted after its children; reserve it so they stay within the budget
+        self.emitted += 1
+        start = self.clock
+        self.clock += rng.uniform(0.01, 0.5)
+        if depth < profile.nesting_depth:
+            for _ in range(rng.randint(1, 3)):
+                if self.emitted >= profile.n_observations:
+                    break
+                yield from self.span("Agent.execute_task", span_id, depth + 1)
+        else:
+            context = [0]
+            for _ in range(rng.randint(3, 12)):
+                if self.emitted >= profile.n_observations:
+                    break
+                roll = rng.random()
+                if roll < profile.llm_ratio:
+                    yield self.llm_call(span_id, context)
+                elif roll < profile.llm_ratio + profile.tool_ratio:
+                    yield from self.tool_call(span_id)
+                else:
+                    at = self.clock + rng.uniform(0.0, 0.2)
+                    self.clock = at
+                    yield self.observation(self.new_id(), "Agent Step", "EVENT", at, at, span_id)
+        self.clock += rng.uniform(0.01, 0.5)
+        attributes = {"crewai.task_id": task_id} if task_id else {}
+        yield self.observation(span_id, name, "SPAN", start, self.clock, parent_id, reserved=True,
+                               metadata={"attributes": attributes})
+
+    def observations(self) -> Iterator[dict]:
+        root_id = self.new_id()
+        # Reserve the root; every span reserves itself too, so the total matches n_observations
+        self.emitted += 1
+        start = self.clock
+        task = 0
+        while self.emitted < self.profile.n_observations:
+            task += 1
+            yield from self.span("Task.execute", root_id, 1, task_id=f"task-{task}")
+        yield self.observation(root_id, f"Crew_{self.profile.seed:04x}-synthetic.kickoff", "SPAN",
+                               start, self.clock + 0.1, None, reserved=True)
+
+
+def generate_observations(profile: TraceProfile = None) -> Iterator[dict]:
+    """Yield the observations of a synthetic trace (children before parents)."""
+    return _TraceBuilder(profile or TraceProfile()).observations()
+
+
+def write_observations(path: str, profile: TraceProfile = None) -> int:
+    """Stream a synthetic trace to path as a JSON array. Returns the observation count."""
+    count = 0
+    with open(path, "w") as f:
+        f.write("[")
+        for obs in generate_observations(profile):
+            if count:
+                f.write(",\n")
+            f.write(json.dumps(obs))
+            count += 1
+        f.write("]\n")
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python synthetic_traces.py <output.json> [n_observations] [seed]")
+        sys.exit(1)
+    profile = TraceProfile()
+    if len(sys.argv) > 2:
+        profile.n_observations = int(sys.argv[2])
+    if len(sys.argv) > 3:
+        profile.seed = int(sys.argv[3])
+    written = write_observations(sys.argv[1], profile)
+    print(f"Wrote {written} observations to {sys.argv[1]}")
@@ -0,0 +1,141 @@
+import json
+
+from analyze_traces import Observation, analyze_error_categories, build_span_tree, write_reports
+
+
+def _obs(obs_id, parent_id=None, start=0.0, end=1.0, **fields):
+    """An observation dict as Langfuse dumps it, with start/end in seconds after 12:00:00."""
+    def timestamp(seconds):
+        return f"2025-11-01T12:00:{seconds:09.6f}Z" if seconds is not None else None
+    return {"id": obs_id, "parent_observation_id": parent_id, "type": "SPAN", "name": obs_id,
+            "start_time": timestamp(start), "end_time": timestamp(end), **fields}
+
+
+def _tool(obs_id, parent_id, start, end, return_code=0, stderr="", stdout="ok", tool="kubectl"):
+    return _obs(obs_id, parent_id, start, end, type="TOOL", name=f"{tool}._use",
+                input={"calling": f"Tool: {tool}, arguments={{'query': 'get pods'}}"},
+                output={"return_code": return_code, "stdout": stdout, "stderr": stderr})
+
+
+def _categories(raw):
+    data = [Observation(obs) for obs in raw]
+    spans, children, _ = build_span_tree(data)
+    return analyze_error_categories(data, spans, children, len(data))
+
+
+def test_failed_root_and_orphaned_failures_are_counted_without_retries():
+    result = _categories([
+        # A failed LLM call that is the root of its trace
+        _obs("root", model="gpt-4o", type="GENERATION", level="ERROR", status_message="Request timed out"),
+        # A failed tool call whose parent is not in the trace
+        _tool("orphan", "missing", 2.0, 3.0, return_code=1, stderr="Error from server (NotFound): not found"),
+        # A failed tool call whose parent has no timing
+        _obs("untimed", start=None, end=None),
+        _tool("child", "untimed", 4.0, 5.0, return_code=1, stderr="permission denied"),
+    ])
+    per_category = result["per_category"]
+    assert per_category["timeout"]["errors"] == 1
+    assert per_category["not_found"]["errors"] == 1
+    assert per_category["auth"]["errors"] == 1
+    assert result["total_errors"] == 3
+    assert all(stats["retries"] == 0 for stats in per_category.values())
+
+
+def _record(**fields):
+    return Observation(_obs("x", **fields))
+
+
+def test_error_text_in_successful_output_is_not_an_error():
+    # kubectl reports an empty listing on stderr with exit code 0
+    assert _record(type="TOOL", name="kubectl._use",
+                   output={"return_code": 0, "stdout": "", "stderr": "No resources found in otel-demo namespace."}
+                   ).error_category is None
+    assert _record(type="TOOL", name="shell._use", output="user forbidden from listing; not found").error_category is None
+    assert _record(type="GENERATION", model="gpt-4o", output="Error: could not parse the logs").error_category is None
+
+
+def test_errored_observations_are_categorized_by_their_text():
+    assert _record(type="TOOL", name="kubectl._use",
+                   output={"return_code": 1, "stdout": "", "stderr": "Error from server (Forbidden): forbidden"}
+                   ).error_category == "auth"
+    assert _record(type="TOOL", name="shell._use", level="ERROR", output="deadline exceeded").error_category == "timeout"
+    assert _record(type="TOOL", name="shell._use", level="ERROR", output="boom").error_category == "other"
+    assert _record(type="GENERATION", model="gpt-4o", status="failed",
+                   status_message="OutputParserException: invalid json").error_category == "llm_format"
+    # stderr without a return code still marks a structured output as failed
+    assert _record(type="TOOL", name="kubectl._use", output={"stderr": "no such file or directory"}
+                   ).error_category == "not_found"
+
+
+def test_retries_are_the_next_matching_sibling():
+    result = _categories([
+        _obs("task", None, 0.0, 30.0),
+        _tool("t1", "task", 1.0, 2.0, return_code=1, stderr="Error from server (NotFound): pod not found"),
+        # Another tool does not retry the kubectl call; the next kubectl call does
+        _tool("t2", "task", 3.0, 4.0, tool="prometheus"),
+        _tool("t3", "task", 5.5, 6.0),
+        _obs("l1", "task", 7.0, 8.0, type="GENERATION", model="gpt-4o", status="error",
+             status_message="request timeout"),
+        _tool("t4", "task", 9.0, 10.0),
+        _obs("l2", "task", 12.0, 13.0, type="GENERATION", model="gpt-4o"),
+        # A failure with no later match is not retried
+        _tool("t5", "task", 20.0, 21.0, return_code=1, stderr="permission denied", tool="jaeger"),
+    ])
+    per_category = result["per_category"]
+    assert per_category["not_found"]["retries"] == 1
+    assert per_category["not_found"]["retry_latency_ms"] == 4500.0
+    assert per_category["timeout"]["retries"] == 1
+    assert per_category["timeout"]["retry_latency_ms"] == 5000.0
+    assert per_category["auth"]["retries"] == 0
+    assert result["retry_latency_ms"] == 9500.0
+    # Categories are listed most specific first
+    assert list(per_category) == ["timeout", "auth", "not_found"]
+
+
+def test_write_reports_logs_each_dump_and_counts_failures(tmp_path, capsys):
+    good = tmp_path / "good" / "observations_dump.json"
+    bad = tmp_path / "bad" / "observations_dump.json"
+    good.parent.mkdir()
+    bad.parent.mkdir()
+    good.write_text(json.dumps([
+        _obs("root", None, 0.0, 10.0, name="Crew_x.kickoff"),
+        _tool("t1", "root", 1.0, 2.0, return_code=1, stderr="Error from server (NotFound): not found"),
+        _tool("t2", "root", 3.0, 4.0),
+        _obs("l1", "root", 5.0, 6.0, type="GENERATION", model="gpt-4o",
+             usage_details={"input": 100, "output": 10, "total": 110}),
+    ]))
+    bad.write_text("[{")
+
+    assert write_reports([str(good), str(bad)], "analysis.log") == 1
+
+    report = (good.parent / "analysis.log").read_text()
+    assert "--- Error Categories ---" in report
+    assert "not_found: 1 errors" in report
+    assert "1 retried" in report
+    assert "Error decoding JSON" in (bad.parent / "analysis.log").read_text()
+    summary = capsys.readouterr().out
+    assert summary.count("✓ Done") == 1 and summary.count("✗ Failed") == 1
+
+
+def test_cacheable_calls_follow_the_tool_cache_policy():
+    from analyze_traces import analyze_duplicate_tool_calls
+
+    def kubectl(obs_id, start, query):
+        return _obs(obs_id, "task", start, start + 1.0, type="TOOL", name="kubectl._use",
+                    input={"calling": f"Tool: kubectl, arguments={{'query': '{query}'}}"},
+                    output={"return_code": 0, "stdout": "ok", "stderr": ""})
+
+    data = [Observation(obs) for obs in [
+        _obs("task", None, 0.0, 60.0),
+        kubectl("t1", 1.0, "get pods"),
+        kubectl("t2", 3.0, "get pods"),
+        # The apply invalidates the cached listing, so the next one runs again
+        kubectl("t3", 5.0, "apply -f policy.yaml"),
+        kubectl("t4", 7.0, "get pods"),
+        kubectl("t5", 9.0, "get pods"),
+    ]]
+    spans, _, _ = build_span_tree(data)
+    duplicates = analyze_duplicate_tool_calls(spans)
+    assert duplicates["exact_duplicates"] == 3
+    assert duplicates["cacheable_calls"] == 2
+    assert duplicates["cacheable_trtt_ms"] == 2000.0
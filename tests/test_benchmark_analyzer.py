@@ -0,0 +1,37 @@
+import json
+
+import benchmark_analyzer
+from synthetic_traces import TraceProfile, generate_observations
+
+
+def test_cached_dumps_are_keyed_by_generator_version(tmp_path):
+    path = benchmark_analyzer.trace_for_size(300, 0, tmp_path)
+    assert benchmark_analyzer.generator_version() in path.name
+    with open(path) as f:
+        assert len(json.load(f)) == 300
+    assert benchmark_analyzer.trace_for_size(300, 0, tmp_path) == path
+
+
+def test_synthetic_traces_have_the_requested_size():
+    for n in (1, 17, 1000):
+        assert sum(1 for _ in generate_observations(TraceProfile(n_observations=n))) == n
+
+
+def test_benchmark_smoke_run_against_baseline(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    common = ["--sizes", "300", "--repeats", "1", "--cache-dir", str(tmp_path), "--baseline", str(baseline)]
+
+    # Without a baseline nothing is compared, which must not pass
+    assert benchmark_analyzer.main(common) == 2
+    assert benchmark_analyzer.main(common + ["--save-baseline"]) == 0
+    assert json.loads(baseline.read_text())["300"]["wall_sec"] > 0
+    # A generous tolerance keeps timing noise from failing the smoke run
+    assert benchmark_analyzer.main(common + ["--tolerance", "100"]) == 0
+    assert "No regressions against baseline" in capsys.readouterr().out
+
+
+def test_compare_flags_slowdowns_beyond_tolerance():
+    baseline = {"1000": {"wall_sec": 1.0, "peak_rss_kb": 1000}}
+    results = {"1000": {"wall_sec": 1.3, "peak_rss_kb": 1000}}
+    assert benchmark_analyzer.compare(results, baseline, 0.25)
+    assert not benchmark_analyzer.compare(results, baseline, 0.5)
@@ -0,0 +1,19 @@
+import json
+
+from regression_gate import load_samples
+
+
+def test_malformed_files_are_reported_not_raised(tmp_path, capsys):
+    (tmp_path / "saved.json").write_text(json.dumps({"baseline_samples": {"s1": {"end_to_end_latency_ms": 5}}}))
+    (tmp_path / "resources_incident_3.json").write_text(json.dumps({"start_time": 1}))
+
+    assert load_samples([str(tmp_path / "saved.json"), str(tmp_path / "resources_incident_3.json")]) == {}
+    out = capsys.readouterr().out
+    assert "baseline_samples['s1']['end_to_end_latency_ms'] is not a list of values" in out
+    assert "missing key 'summary'" in out
+
+
+def test_saved_baseline_samples_are_merged(tmp_path):
+    for i, values in enumerate(([1.0, 2.0], [3.0])):
+        (tmp_path / f"b{i}.json").write_text(json.dumps({"baseline_samples": {"s1": {"llm_calls": values}}}))
+    assert load_samples([str(tmp_path / "b0.json"), str(tmp_path / "b1.json")]) == {"s1": {"llm_calls": [1.0, 2.0, 3.0]}}
@@ -0,0 +1,29 @@
+import json
+
+from results_store import ResultsStore, iter_source_files
+
+
+def test_globs_skip_raw_dumps_like_directory_walks(tmp_path):
+    run = tmp_path / "run1"
+    (run / "rep_1").mkdir(parents=True)
+    (run / "observations_dump.json").write_text("[]")
+    (run / "repeat_samples.json").write_text("{}")
+    (run / "analysis.json").write_text("{}")
+    (run / "rep_1" / "analysis_incident_3.json").write_text("{}")
+
+    expected = [str(run / "analysis.json"), str(run / "rep_1" / "analysis_incident_3.json")]
+    assert list(iter_source_files([str(tmp_path)])) == expected
+    assert list(iter_source_files([str(tmp_path / "**" / "*.json")])) == expected
+    assert list(iter_source_files([str(tmp_path / "run*")])) == expected
+    # A file named explicitly is still taken as given
+    assert list(iter_source_files([str(run / "repeat_samples.json")])) == [str(run / "repeat_samples.json")]
+
+
+def test_glob_ingest_does_not_record_dumps_as_failed(tmp_path):
+    (tmp_path / "observations_dump.json").write_text(json.dumps([{"id": "a"}]))
+    store = ResultsStore(str(tmp_path / "results.db"))
+    try:
+        store.ingest([str(tmp_path / "*.json")])
+        assert store.conn.execute("SELECT COUNT(*) FROM failed_sources").fetchone() == (0,)
+    finally:
+        store.close()
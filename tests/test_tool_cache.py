@@ -0,0 +1,49 @@
+from tool_cache import CachePolicy, ToolResultCache
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _wrapped_kubectl(policy=None):
+    calls = []
+
+    def kubectl(*args, **kwargs):
+        calls.append((args, kwargs))
+        return f"result {len(calls)}"
+
+    cache = ToolResultCache(policy, clock=_Clock())
+    return cache, cache.wrap(kubectl), calls
+
+
+def test_wrapped_positional_mutating_call_invalidates():
+    cache, kubectl, calls = _wrapped_kubectl()
+    assert kubectl("get", "pods") == "result 1"
+    assert kubectl("get", "pods") == "result 1"
+    kubectl("apply", "-f", "policy.yaml")
+    assert cache.stats.invalidations == 1
+    # The listing from before the apply is not served again
+    assert kubectl("get", "pods") == "result 3"
+    assert len(calls) == 3
+
+
+def test_wrapped_keyword_mutating_call_invalidates():
+    cache, kubectl, calls = _wrapped_kubectl()
+    kubectl(command="get pods -n otel-demo")
+    kubectl(command="apply -f policy.yaml")
+    kubectl(command="get pods -n otel-demo")
+    assert cache.stats.invalidations == 1
+    assert cache.stats.hits == 0
+    assert len(calls) == 3
+
+
+def test_mutating_calls_are_never_served_from_cache():
+    cache, kubectl, calls = _wrapped_kubectl(CachePolicy(invalidate_on_mutation=False))
+    kubectl("delete", "pod", "cart-1")
+    kubectl("delete", "pod", "cart-1")
+    assert len(calls) == 2
+    assert cache.stats.invalidations == 0
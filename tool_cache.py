@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Tool-result memoization for agent tool calls.
+
+ToolResultCache wraps the SRE/CISO agents' tool functions and serves repeated
+calls with identical (normalized) arguments from memory. Entries expire after
+a TTL, and calls that mutate the cluster (kubectl apply, helm upgrade, ...)
+invalidate cached results through an invalidation hook.
+
+replay_trace() runs a recorded observations_dump.json through a cache policy,
+using the trace's own timestamps as the clock, so policies can be compared
+without a live cluster:
+
+    python tool_cache.py <path_to_observations_dump.json> [ttl_seconds ...]
+"""
+
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from analyze_traces import (
+    NS_PER_SEC,
+    build_span_tree,
+    canonical_tool_arguments,
+    is_mutating_call,
+    load_observations,
+    span_category,
+)
+
+# TTLs compared by the replay CLI when none are given (None = never expire)
+DEFAULT_REPLAY_TTLS = [None, 300.0, 60.0, 10.0]
+
+
+@dataclass
+class CachePolicy:
+    """How the cache stores, expires and invalidates tool results."""
+    ttl_seconds: Optional[float] = None
+    # Drop cached results when a mutating call goes through
+    invalidate_on_mutation: bool = True
+    # "all" clears every tool's results, "tool" only the mutating tool's
+    invalidation_scope: str = "all"
+    # Failed calls are normally retried rather than served from cache
+    cache_errors: bool = False
+    max_entries: Optional[int] = None
+    is_mutating: Callable[[str, str], bool] = is_mutating_call
+
+    @property
+    def name(self) -> str:
+        ttl = "no-ttl" if self.ttl_seconds is None else f"ttl={self.ttl_seconds:g}s"
+        invalidation = self.invalidation_scope if self.invalidate_on_mutation else "no-invalidation"
+        return f"{ttl}, {invalidation}"
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters of a cache, with the tool time saved by hits."""
+    hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    invalidations: int = 0
+    saved_seconds: float = 0.0
+    per_tool_hits: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+
+class ToolResultCache:
+    """Memoizes tool results keyed by tool name and normalized arguments."""
+
+    def __init__(self, policy: CachePolicy = None, clock: Callable[[], float] = time.monotonic):
+        self.policy = policy or CachePolicy()
+        self.clock = clock
+        self.stats = CacheStats()
+        # (tool, arguments) -> (stored_at, result, duration_seconds)
+        self._entries: Dict[Tuple[str, str], Tuple[float, Any, float]] = {}
+        self._invalidation_hooks: List[Callable[[str, str], None]] = []
+
+    def add_invalidation_hook(self, hook: Callable[[str, str], None]) -> None:
+        """Register a callback run with (tool_name, arguments) after a mutating call."""
+        self._invalidation_hooks.append(hook)
+
+    def invalidate(self, tool_name: Optional[str] = None) -> None:
+        """Drop cached results, for one tool or for all tools."""
+        if tool_name is None:
+            self._entries.clear()
+        else:
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != tool_name}
+        self.stats.invalidations += 1
+
+    def lookup(self, tool_name: str, arguments: str,
+               saved_seconds: Optional[float] = None) -> Tuple[bool, Any]:
+        """
+        Return (True, result) on a hit, (False, None) on a miss. A hit is
+        credited with saved_seconds, or the cached call's duration if unknown.
+        """
+        key = (tool_name, arguments)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, result, duration = entry
+            ttl = self.policy.ttl_seconds
+            if ttl is None or self.clock() - stored_at <= ttl:
+                self.stats.hits += 1
+                self.stats.saved_seconds += duration if saved_seconds is None else saved_seconds
+                self.stats.per_tool_hits[tool_name] = self.stats.per_tool_hits.get(tool_name, 0) + 1
+                return True, result
+            del self._entries[key]
+            self.stats.expired += 1
+        self.stats.misses += 1
+        return False, None
+
+    def store(self, tool_name: str, arguments: str, result: Any,
+              duration: float = 0.0, failed: bool = False) -> None:
+        """Record the result of an executed call, invalidating on mutation."""
+        policy = self.policy
+        if policy.is_mutating(tool_name, arguments):
+            if policy.invalidate_on_mutation:
+                self.invalidate(tool_name if policy.invalidation_scope == "tool" else None)
+                for hook in self._invalidation_hooks:
+                    hook(tool_name, arguments)
+            # Never serve a mutating call from cache
+            return
+        if failed and not policy.cache_errors:
+            return
+        if policy.max_entries is not None and len(self._entries) >= policy.max_entries:
+            # Evict the oldest entry (dicts keep insertion order)
+            del self._entries[next(iter(self._entries))]
+        self._entries[(tool_name, arguments)] = (self.clock(), result, duration)
+
+    def wrap(self, func: Callable[..., Any], tool_name: str = None,
+             is_error: Callable[[Any], bool] = None) -> Callable[..., Any]:
+        """Wrap a tool function so repeated calls are served from the cache."""
+        name = tool_name or getattr(func, "__name__", "tool")
+
+        def cached(*args, **kwargs):
+            arguments = canonical_tool_arguments({"args": list(args), "kwargs": kwargs})
+            hit, result = self.lookup(name, arguments)
+            if hit:
+                return result
+            started = self.clock()
+            result = func(*args, **kwargs)
+            failed = bool(is_error and is_error(result))
+            self.store(name, arguments, result, self.clock() - started, failed)
+            return result
+
+        cached.__wrapped__ = func
+        cached.__name__ = getattr(func, "__name__", name)
+        return cached
+
+
+class _TraceClock:
+    """Clock advanced by the replay loop to the trace's own timestamps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _replay_spans(spans: dict, policy: CachePolicy) -> Tuple[ToolResultCache, list, List[str]]:
+    """Replay the TOOL spans of a span tree in start order; returns (cache, tool calls, hit ids)."""
+    tool_calls = sorted(
+        ((start, end, obs) for start, end, obs in spans.values()
+         if span_category(obs) == "tool"),
+        key=lambda c: (c[0], c[1]))
+
+    clock = _TraceClock()
+    cache = ToolResultCache(policy, clock=clock)
+    hit_ids = []
+    for start_ns, end_ns, obs in tool_calls:
+        tool_name = obs.tool_name
+        arguments = obs.arguments
+        duration = (end_ns - start_ns) / NS_PER_SEC
+        clock.now = start_ns / NS_PER_SEC
+        hit, _ = cache.lookup(tool_name, arguments, saved_seconds=duration)
+        if hit:
+            hit_ids.append(obs.id)
+        else:
+            clock.now = end_ns / NS_PER_SEC
+            # Records do not keep the output, so the replay caches the call id
+            cache.store(tool_name, arguments, obs.id, duration, obs.failed)
+    return cache, tool_calls, hit_ids
+
+
+def cached_tool_calls(spans: dict, policy: CachePolicy = None) -> List[str]:
+    """Ids of the TOOL spans (from build_span_tree) a cache with this policy would have served."""
+    return _replay_spans(spans, policy or CachePolicy())[2]
+
+
+def replay_observations(observations: list, policy: CachePolicy) -> Dict[str, Any]:
+    """Replay the TOOL observations (Observation records) of a trace through a cache policy."""
+    spans, _, _ = build_span_tree(observations)
+    cache, tool_calls, _ = _replay_spans(spans, policy)
+    total_seconds = sum((end - start) / NS_PER_SEC for start, end, _ in tool_calls)
+
+    stats = cache.stats
+    return {
+        'policy': policy.name,
+        'tool_calls': len(tool_calls),
+        'hits': stats.hits,
+        'misses': stats.misses,
+        'expired': stats.expired,
+        'invalidations': stats.invalidations,
+        'hit_rate_percent': stats.hit_rate * 100 if stats.hit_rate is not None else None,
+        'saved_trtt_ms': stats.saved_seconds * 1000,
+        'saved_trtt_percent': (stats.saved_seconds / total_seconds * 100) if total_seconds > 0 else None,
+        'per_tool_hits': dict(stats.per_tool_hits),
+    }
+
+
+def replay_trace(json_path: str, policies: List[CachePolicy]) -> List[Dict[str, Any]]:
+    """Replay an observations_dump.json through each cache policy."""
+    observations = load_observations(json_path)
+    return [replay_observations(observations, policy) for policy in policies]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python tool_cache.py <path_to_observations_dump.json> [ttl_seconds ...]")
+        sys.exit(1)
+
+    json_path = sys.argv[1]
+    ttls = [float(t) for t in sys.argv[2:]] or DEFAULT_REPLAY_TTLS
+    policies = [CachePolicy(ttl_seconds=ttl) for ttl in ttls]
+    policies.append(CachePolicy(ttl_seconds=ttls[0], invalidation_scope="tool"))
+    policies.append(CachePolicy(ttl_seconds=ttls[0], invalidate_on_mutation=False))
+
+    print(f"Replaying tool calls from: {json_path}")
+    for result in replay_trace(json_path, policies):
+        hit_rate = result['hit_rate_percent']
+        saved = result['saved_trtt_percent']
+        print(f"{result['policy']:<28} hits {result['hits']:>4}/{result['tool_calls']:<4} "
+              f"hit rate {hit_rate or 0:6.2f}%  saved TRTT {result['saved_trtt_ms']:.2f} ms "
+              f"({saved or 0:.2f}%)  invalidations {result['invalidations']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+Multi-replica vLLM scaling benchmark behind a local load-balancing proxy.
+
+For each replica count N it launches N `vllm serve` replicas on the ports
+after the configured vLLM port and puts a proxy on the vLLM port itself, so
+agents configured for a single server reach the replicas unchanged. The
+proxy routes each request round-robin or to the replica with the fewest
+outstanding requests. Then it either runs a CISO scenario through the
+proxy, or replays the LLM calls of recorded observation dumps against it
+as concurrent agent sessions. Each call is sent with its recorded prompt,
+output length and tool time between calls.
+
+Every request is timed at the proxy, which gives the throughput, the TTFT
+and latency tails and each replica's share of the work for each N:
+
+    python vllm_scaling.py --replicas 1 2 4 --replay <dump.json | directory | glob> ...
+    python vllm_scaling.py --replicas 2 --policy round_robin --scenario 1
+    python vllm_scaling.py --backends http://gpu1:8000 http://gpu2:8000 --replay ../ciso_traces
+
+On CPU, serve a small model, e.g. --model Qwen/Qwen2.5-0.5B-Instruct
+--vllm-arg=--max-model-len=4096 --replica-env VLLM_CPU_KVCACHE_SPACE=2.
+Replicas sharing GPUs need --gpus and --vllm-arg=--gpu-memory-utilization=...
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import ciso_vllm_benchmark as ciso
+from analyze_traces import DistributionStats, iter_json_array, parse_timestamp_ns
+from prefix_cache_sim import render_messages
+from whatif_simulator import iter_trace_paths
+
+POLICIES = ("least_outstanding", "round_robin")
+
+# Concurrent replayed agent sessions per replica, so the offered load grows with N
+DEFAULT_SESSIONS_PER_REPLICA = 4
+# Output length of replayed calls without recorded usage
+DEFAULT_MAX_TOKENS = 256
+BACKEND_TIMEOUT_SEC = 600.0
+
+# Headers that apply to one connection and are not forwarded by the proxy
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+                      "te", "trailer", "transfer-encoding", "upgrade", "content-length", "host"}
+
+# Completion tokens in a JSON response or in the usage chunk that ends a stream
+COMPLETION_TOKENS_RE = re.compile(rb'"completion_tokens"\s*:\s*(\d+)')
+STREAM_RE = re.compile(rb'"stream"\s*:\s*true')
+# Bytes of each response kept to find its usage
+USAGE_TAIL_BYTES = 4096
+
+CHAT_ROLES = {"system", "user", "assistant"}
+
+
+@dataclass
+class ProxiedRequest:
+    """One request as the proxy saw it. Times are time.monotonic() seconds."""
+    replica: int
+    start: float
+    end: float
+    # First body byte: the first token of a streamed completion
+    first_byte: Optional[float]
+    status: int
+    streaming: bool
+    completion_tokens: Optional[int]
+
+
+class Replica:
+    """A backend and its outstanding requests. Each proxy thread keeps its own connection to it."""
+
+    def __init__(self, index: int, url: str):
+        parsed = urlparse(url)
+        self.index = index
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.outstanding = 0
+        self.peak_outstanding = 0
+        self._local = threading.local()
+
+    def connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or fresh:
+            if connection is not None:
+                connection.close()
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=BACKEND_TIMEOUT_SEC)
+            self._local.connection = connection
+        return connection
+
+
+class LoadBalancer:
+    """Picks a replica for each request and records how each request went."""
+
+    def __init__(self, backend_urls: List[str], policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}; choose from {', '.join(POLICIES)}")
+        self.replicas = [Replica(i, url) for i, url in enumerate(backend_urls)]
+        self.policy = policy
+        self.records: List[ProxiedRequest] = []
+        self._next = itertools.cycle(range(len(self.replicas)))
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def acquire(self) -> Replica:
+        with self._lock:
+            if self.policy == "round_robin":
+                replica = self.replicas[next(self._next)]
+            else:
+                # Fewest outstanding requests; ties rotate so idle replicas share the load
+                offset = next(self._next)
+                replica = min(self.replicas[offset:] + self.replicas[:offset], key=lambda r: r.outstanding)
+            replica.outstanding += 1
+            replica.peak_outstanding = max(replica.peak_outstanding, replica.outstanding)
+            return replica
+
+    def release(self, replica: Replica, record: ProxiedRequest) -> None:
+        with self._lock:
+            replica.outstanding -= 1
+            self.records.append(record)
+
+    def reset(self) -> None:
+        """Forget recorded requests, e.g. after a warm-up."""
+        with self._lock:
+            self.records = []
+            for replica in self.replicas:
+                replica.peak_outstanding = replica.outstanding
+
+    def serve(self, port: int, host: str = "0.0.0.0") -> None:
+        """Start proxying on a port, in a background thread."""
+        self._server = ThreadingHTTPServer((host, port), make_proxy_handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="vllm-proxy", daemon=True).start()
+        print(f"[INFO] Proxy ({self.policy}) on port {port} -> {', '.join(r.url for r in self.replicas)}")
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def make_proxy_handler(balancer: LoadBalancer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _forward(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+            streaming = bool(body and STREAM_RE.search(body))
+            replica = balancer.acquire()
+            start = time.monotonic()
+            first_byte = None
+            status = 502
+            tail = b""
+            try:
+                response = None
+                for fresh in (False, True):
+                    connection = replica.connection(fresh)
+                    try:
+                        connection.request(self.command, self.path, body=body, headers=headers)
+                        response = connection.getresponse()
+                        break
+                    except (OSError, http.client.HTTPException) as e:
+                        # A reused keep-alive connection may have been closed by the replica
+                        if fresh:
+                            self.send_error(502, f"Replica {replica.url} failed: {e}")
+                            return
+                status = response.status
+                self.send_response(status)
+                for key, value in response.getheaders():
+                    if key.lower() not in HOP_BY_HOP_HEADERS:
+                        self.send_header(key, value)
+                # Relay the body as it arrives, so streamed tokens are not held back
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                while True:
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        break
+                    if first_byte is None:
+                        first_byte = time.monotonic()
+                    tail = (tail + chunk)[-USAGE_TAIL_BYTES:]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (OSError, http.client.HTTPException):
+                # Client went away or the replica dropped the response midway
+                replica.connection(fresh=True)
+                self.close_connection = True
+            finally:
+                usage = COMPLETION_TOKENS_RE.findall(tail)
+                balancer.release(replica, ProxiedRequest(
+                    replica=replica.index, start=start, end=time.monotonic(), first_byte=first_byte,
+                    status=status, streaming=streaming,
+                    completion_tokens=int(usage[-1]) if usage else None))
+
+        do_GET = do_POST = _forward
+
+    return Handler
+
+
+@dataclass
+class ReplayCall:
+    """One recorded LLM call to send again."""
+    messages: List[Dict[str, str]]
+    max_tokens: int
+    # Recorded time between the previous call's end and this call's start (tools, agent code)
+    think_sec: float
+
+
+def chat_messages(prompt) -> List[Dict[str, str]]:
+    """A recorded prompt as plain system/user/assistant chat messages with string content."""
+    if isinstance(prompt, dict) and isinstance(prompt.get("messages"), list):
+        prompt = prompt["messages"]
+    if not isinstance(prompt, list):
+        return [{"role": "user", "content": render_messages(prompt)}]
+    messages = []
+    for message in prompt:
+        if isinstance(message, dict) and "content" in message:
+            role = message.get("role") if message.get("role") in CHAT_ROLES else "user"
+            content = message["content"]
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") if isinstance(part, dict) else str(part)
+                                  for part in content)
+            elif not isinstance(content, str):
+                content = render_messages(content)
+            messages.append({"role": role, "content": content})
+        else:
+            messages.append({"role": "user", "content": render_messages(message)})
+    return messages
+
+
+def load_session(json_path: str) -> List[ReplayCall]:
+    """The LLM calls of an observations dump, in start order, as one replayable agent session."""
+    calls = []
+    with open(json_path, "r") as f:
+        for obs in iter_json_array(f):
+            if not (obs.get("model") or obs.get("type") == "GENERATION"):
+                continue
+            start_ns = parse_timestamp_ns(obs.get("start_time"))
+            if start_ns is None or obs.get("input") is None:
+                continue
+            end_ns = parse_timestamp_ns(obs.get("end_time")) or start_ns
+            output_tokens = (obs.get("usage_details") or {}).get("output")
+            calls.append((start_ns, max(end_ns, start_ns), chat_messages(obs["input"]),
+                          output_tokens or DEFAULT_MAX_TOKENS))
+    calls.sort(key=lambda c: c[0])
+    session = []
+    previous_end = None
+    for start_ns, end_ns, messages, max_tokens in calls:
+        think_sec = max(0, start_ns - previous_end) / 1e9 if previous_end is not None else 0.0
+        session.append(ReplayCall(messages, max_tokens, think_sec))
+        previous_end = end_ns if previous_end is None else max(previous_end, end_ns)
+    return session
+
+
+def replay_session(url: str, model: str, session: List[ReplayCall], think_scale: float) -> int:
+    """Send a session's calls one after the other, as its agent did. Returns the failed calls."""
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=BACKEND_TIMEOUT_SEC)
+    failures = 0
+    try:
+        for call in session:
+            if call.think_sec and think_scale:
+                time.sleep(call.think_sec * think_scale)
+            body = json.dumps({
+                "model": model,
+                "messages": call.messages,
+                "max_tokens": call.max_tokens,
+                # vLLM extension: generate the recorded number of tokens
+                "ignore_eos": True,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            })
+            try:
+                connection.request("POST", "/v1/chat/completions", body=body,
+                                   headers={"Content-Type": "application/json"})
+                response = connection.getresponse()
+                response.read()
+                failures += response.status != 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                failures += 1
+    finally:
+        connection.close()
+    return failures
+
+
+def replay(url: str, model: str, sessions: List[List[ReplayCall]], concurrency: int,
+           think_scale: float) -> int:
+    """
+    Replay sessions against url with `concurrency` of them running at a time,
+    cycling through them so every worker has one. Returns the failed calls.
+    """
+    count = max(len(sessions), concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(lambda i: replay_session(url, model, sessions[i % len(sessions)], think_scale),
+                                range(count)))
+
+
+@dataclass
+class ReplicaLoad:
+    requests: int
+    share_percent: float
+    # Time with at least one request outstanding (concurrent requests count once)
+    busy_sec: float
+    peak_outstanding: int
+
+
+@dataclass
+class ScalingResult:
+    """The load balancer's view of one run with N replicas."""
+    replicas: int
+    policy: str
+    wall_sec: float
+    requests: int
+    errors: int
+    requests_per_sec: float
+    output_tokens_per_sec: Optional[float]
+    ttft_ms: Optional[DistributionStats]
+    latency_ms: Optional[DistributionStats]
+    per_replica: List[ReplicaLoad]
+    # Busiest replica's busy time over the mean: 1.0 is a perfect balance
+    imbalance: Optional[float]
+    # Throughput per replica relative to the smallest replica count measured
+    scaling_efficiency_percent: Optional[float] = None
+    failed_calls: int = 0
+
+
+def busy_seconds(intervals: List[tuple]) -> float:
+    """Length of the union of (start, end) intervals."""
+    busy = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                busy += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        busy += current_end - current_start
+    return busy
+
+
+def summarize(balancer: LoadBalancer, wall_sec: float) -> ScalingResult:
+    records = balancer.records
+    ok = [r for r in records if r.status < 400]
+    tokens = [r.completion_tokens for r in ok if r.completion_tokens is not None]
+    per_replica = []
+    for replica in balancer.replicas:
+        mine = [r for r in records if r.replica == replica.index]
+        per_replica.append(ReplicaLoad(
+            requests=len(mine),
+            share_percent=round(len(mine) / len(records) * 100, 1) if records else 0.0,
+            busy_sec=round(busy_seconds([(r.start, r.end) for r in mine]), 3),
+            peak_outstanding=replica.peak_outstanding,
+        ))
+    busy = [load.busy_sec for load in per_replica]
+    mean_busy = sum(busy) / len(busy) if busy else 0
+    return ScalingResult(
+        replicas=len(balancer.replicas),
+        policy=balancer.policy,
+        wall_sec=round(wall_sec, 3),
+        requests=len(records),
+        errors=len(records) - len(ok),
+        requests_per_sec=round(len(ok) / wall_sec, 3) if wall_sec else 0.0,
+        output_tokens_per_sec=round(sum(tokens) / wall_sec, 2) if tokens and wall_sec else None,
+        ttft_ms=DistributionStats.from_values(
+            [(r.first_byte - r.start) * 1000 for r in ok if r.streaming and r.first_byte is not None]),
+        latency_ms=DistributionStats.from_values([(r.end - r.start) * 1000 for r in ok]),
+        per_replica=per_replica,
+        imbalance=round(max(busy) / mean_busy, 3) if mean_busy else None,
+    )
+
+
+class ReplicaSet:
+    """N vLLM servers on consecutive ports after the configured one, started and stopped together."""
+
+    def __init__(self, count: int, extra_args: List[str], env: Dict[str, str], gpus: List[str]):
+        self.servers = []
+        for i in range(count):
+            replica_env = dict(env)
+            if gpus:
+                replica_env["CUDA_VISIBLE_DEVICES"] = gpus[i % len(gpus)]
+            config = dict(ciso.VLLM_CONFIG, port=ciso.VLLM_CONFIG["port"] + 1 + i,
+                          extra_args=extra_args, env=replica_env)
+            self.servers.append(ciso.VLLMServer(config))
+
+    @property
+    def urls(self) -> List[str]:
+        return [server.url for server in self.servers]
+
+    def __enter__(self):
+        # Start all replicas first, so they load the model in parallel
+        for server in self.servers:
+            server.start()
+        if not all(server.wait_until_ready() for server in self.servers):
+            self.__exit__()
+            raise RuntimeError("vLLM replicas failed to start")
+        return self
+
+    def __exit__(self, *args):
+        for server in self.servers:
+            server.stop()
+
+
+def run_workload(balancer: LoadBalancer, args, sessions: List[List[ReplayCall]]) -> ScalingResult:
+    """Run the scenario or replay through the proxy and summarize what it saw."""
+    proxy_url = f"http://127.0.0.1:{args.proxy_port}"
+    balancer.serve(args.proxy_port)
+    try:
+        failed_calls = 0
+        if sessions and args.warmup:
+            # One call per replica, so model warm-up does not count against N=1
+            replay(proxy_url, args.model, [sessions[0][:1]], len(balancer.replicas), 0)
+            balancer.reset()
+        started = time.monotonic()
+        if args.scenario:
+            test_name = f"scaling_{len(balancer.replicas)}x_{args.scenario}"
+            ciso.run_test_script(args.scenario, test_name, ciso.RESULTS_DIR / test_name / "run.log")
+        else:
+            concurrency = args.sessions or args.sessions_per_replica * len(balancer.replicas)
+            failed_calls = replay(proxy_url, args.model, sessions, concurrency, args.think_scale)
+        result = summarize(balancer, time.monotonic() - started)
+        result.failed_calls = failed_calls
+        return result
+    finally:
+        balancer.shutdown()
+
+
+def _ms(stats: Optional[DistributionStats], attribute: str) -> str:
+    return f"{getattr(stats, attribute):.0f}" if stats else "-"
+
+
+def print_results(results: List[ScalingResult]) -> None:
+    print("\n--- vLLM Replica Scaling ---")
+    print(f"{'Replicas':>8} {'Policy':<18} {'Req/s':>7} {'Tok/s':>9} {'Eff %':>6} {'TTFT p50':>9} "
+          f"{'TTFT p95':>9} {'TTFT p99':>9} {'Lat p95':>8} {'Errors':>6} {'Imbal':>6}")
+    for r in results:
+        tokens = f"{r.output_tokens_per_sec:.1f}" if r.output_tokens_per_sec is not None else "-"
+        efficiency = f"{r.scaling_efficiency_percent:.0f}" if r.scaling_efficiency_percent is not None else "-"
+        imbalance = f"{r.imbalance:.2f}" if r.imbalance is not None else "-"
+        print(f"{r.replicas:>8} {r.policy:<18} {r.requests_per_sec:>7.2f} {tokens:>9} {efficiency:>6} "
+              f"{_ms(r.ttft_ms, 'p50'):>9} {_ms(r.ttft_ms, 'p95'):>9} {_ms(r.ttft_ms, 'p99'):>9} "
+              f"{_ms(r.latency_ms, 'p95'):>8} {r.errors + r.failed_calls:>6} {imbalance:>6}")
+    print("\nPer-replica load (share of requests, busy seconds, peak outstanding):")
+    for r in results:
+        loads = "  ".join(f"#{i}: {load.share_percent:.0f}% {load.busy_sec:.0f}s {load.peak_outstanding}"
+                          for i, load in enumerate(r.per_replica))
+        print(f"  N={r.replicas}: {loads}")
+
+
+def _parse_env(value: str):
+    key, sep, env_value = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got {value!r}")
+    return key, env_value
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    workload = parser.add_mutually_exclusive_group(required=True)
+    workload.add_argument("--replay", nargs="+", metavar="PATH",
+                          help="observation dumps, directories or globs whose LLM calls to replay")
+    workload.add_argument("--scenario", choices=["1", "2", "4"], help="CISO test id to run through the proxy")
+    backends = parser.add_mutually_exclusive_group()
+    backends.add_argument("--replicas", type=int, nargs="+", default=[1, 2],
+                          help="replica counts to launch and measure (default: 1 2)")
+    backends.add_argument("--backends", nargs="+", metavar="URL", help="already running servers to balance over")
+    parser.add_argument("--policy", choices=POLICIES, nargs="+", default=[POLICIES[0]])
+    parser.add_argument("--model", help="model to serve (default: OPENAI_MODEL_NAME or the CISO default)")
+    parser.add_argument("--vllm-arg", action="append", default=[], dest="vllm_args",
+                        help="extra `vllm serve` argument, e.g. --vllm-arg=--max-model-len=4096 (repeatable)")
+    parser.add_argument("--replica-env", type=_parse_env, action="append", default=[],
+                        help="KEY=VALUE environment variable for every replica (repeatable)")
+    parser.add_argument("--gpus", nargs="+", default=[], help="CUDA devices, assigned to replicas in turn")
+    parser.add_argument("--proxy-port", type=int, help="default: the vLLM port of LLM_BASE_URL")
+    parser.add_argument("--sessions", type=int, help="concurrent replayed sessions (fixed for every N)")
+    parser.add_argument("--sessions-per-replica", type=int, default=DEFAULT_SESSIONS_PER_REPLICA)
+    parser.add_argument("--think-scale", type=float, default=1.0,
+                        help="scale of the recorded time between calls (0: back to back)")
+    parser.add_argument("--no-warmup", action="store_false", dest="warmup")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.backends or args.scenario:
+        ciso.load_env_config()
+    if args.model:
+        ciso.VLLM_CONFIG["model"] = args.model
+    args.model = ciso.VLLM_CONFIG["model"]
+    args.proxy_port = args.proxy_port or ciso.VLLM_CONFIG["port"]
+
+    sessions = []
+    if args.replay:
+        sessions = [s for s in (load_session(path) for path in iter_trace_paths(args.replay)) if s]
+        if not sessions:
+            print("[WARN] No LLM calls found to replay")
+            return 2
+        print(f"[INFO] Replaying {sum(len(s) for s in sessions)} LLM calls from {len(sessions)} sessions")
+
+    results = []
+    for replica_count in ([len(args.backends)] if args.backends else args.replicas):
+        for policy in args.policy:
+            print(f"\n[INFO] {replica_count} replica(s), {policy}")
+            if args.backends:
+                result = run_workload(LoadBalancer(args.backends, policy), args, sessions)
+            else:
+                with ReplicaSet(replica_count, args.vllm_args, dict(args.replica_env), args.gpus) as replica_set:
+                    result = run_workload(LoadBalancer(replica_set.urls, policy), args, sessions)
+            results.append(result)
+
+    for policy in args.policy:
+        runs = [r for r in results if r.policy == policy and r.output_tokens_per_sec]
+        if runs:
+            base = min(runs, key=lambda r: r.replicas)
+            for r in runs:
+                r.scaling_efficiency_percent = round(
+                    r.output_tokens_per_sec / r.replicas / (base.output_tokens_per_sec / base.replicas) * 100, 1)
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "model": args.model,
+                       "results": [asdict(r) for r in results]}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
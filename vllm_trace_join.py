@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Joins vLLM server-side metrics with the LLM calls of an agent trace.
+
+vLLM counts a request in its queue, prefill, decode and end-to-end time
+histograms when the request finishes. For each LLM-call observation, the
+increase of those counters over the Prometheus scrape interval in which the
+call ended gives the server-side time of the request(s) that finished then,
+split into queueing, prefill and decode; whatever remains of the
+client-observed latency is client/network/framework overhead:
+
+    python vllm_trace_join.py <observations_dump.json> [vllm_series.json] [--offset SEC]
+
+vllm_series_<timestamp>.json files are saved by ciso_vllm_benchmark.py next to
+each test's metrics. Without one, the series for the trace's time window are
+queried from Prometheus (PROMETHEUS_URL).
+"""
+
+import argparse
+import bisect
+import json
+import sys
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from analyze_traces import (
+    NS_PER_MS,
+    NS_PER_SEC,
+    analyze_timeline,
+    build_span_tree,
+    load_observations,
+    select_root,
+    span_category,
+)
+
+# Server-side phases: (name, histogram metric prefix)
+PHASES = [
+    ("queue", "vllm:request_queue_time_seconds"),
+    ("prefill", "vllm:request_prefill_time_seconds"),
+    ("decode", "vllm:request_decode_time_seconds"),
+]
+E2E_METRIC = "vllm:e2e_request_latency_seconds"
+TTFT_METRIC = "vllm:time_to_first_token_seconds"
+
+# A call is matched only if a scrape happened within this long after it ended
+DEFAULT_SCRAPE_SLACK_SEC = 15.0
+
+
+class Series:
+    """Step function over [timestamp, value] samples."""
+
+    def __init__(self, samples: List[List[float]]):
+        samples = sorted(samples)
+        self.times = [t for t, _ in samples]
+        self.values = [v for _, v in samples]
+
+    def __bool__(self):
+        return bool(self.times)
+
+    def before(self, t: float) -> Optional[float]:
+        """Value of the last sample at or before t."""
+        i = bisect.bisect_right(self.times, t)
+        return self.values[i - 1] if i else None
+
+    def interval_at(self, t: float, limit: float) -> Optional[int]:
+        """Index of the first sample at or after t (the scrape that first sees an event at t)."""
+        i = bisect.bisect_left(self.times, t)
+        return i if i < len(self.times) and self.times[i] <= limit else None
+
+    def increase_at(self, t: float, slack: float) -> Optional[float]:
+        """
+        Counter increase over the scrape interval in which t falls: from the
+        last sample before t to the first change within slack after it. Raw
+        scrapes change at the first sample after t; series resampled by a
+        query_range (older vllm_series files) repeat the previous scrape's
+        value until the next scrape shows up.
+        """
+        i = self.interval_at(t, t + slack)
+        if i is None:
+            return None
+        # Before the first sample the counter did not exist yet (e.g. first request of the server)
+        before = self.values[i - 1] if i else 0.0
+        j = i
+        while j + 1 < len(self.times) and self.times[j + 1] <= t + slack and self.values[j] == before:
+            j += 1
+        # A counter reset (server restart) makes the increase meaningless
+        return self.values[j] - before if self.values[j] >= before else None
+
+    def max_between(self, start: float, end: float) -> Optional[float]:
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_right(self.times, end)
+        window = self.values[lo:hi]
+        return max(window) if window else self.before(start)
+
+
+@dataclass
+class LLMCallBreakdown:
+    """Where the time of one LLM call went, client- and server-side (all ms)."""
+    id: str
+    name: str
+    model: Optional[str]
+    offset_ms: float
+    client_ms: float
+    input_tokens: int
+    output_tokens: int
+    # Requests that finished on the server in the scrape interval the call
+    # ended in; the times below are per-request averages over that interval,
+    # so they are approximate when this is not 1
+    server_requests: Optional[int] = None
+    queue_ms: Optional[float] = None
+    prefill_ms: Optional[float] = None
+    decode_ms: Optional[float] = None
+    server_ms: Optional[float] = None
+    ttft_ms: Optional[float] = None
+    client_overhead_ms: Optional[float] = None
+    max_requests_waiting: Optional[float] = None
+    max_requests_running: Optional[float] = None
+    prefix_cache_hit_percent: Optional[float] = None
+    dominant: Optional[str] = None
+
+
+def load_series(path: str) -> Dict[str, Series]:
+    with open(path, "r") as f:
+        return {metric: Series(samples) for metric, samples in json.load(f).items()}
+
+
+def fetch_series(start_sec: float, end_sec: float, slack: float) -> Dict[str, Series]:
+    """Query the SERIES_METRICS of ciso_vllm_benchmark from Prometheus for a time window."""
+    from ciso_vllm_benchmark import PrometheusMetrics, load_env_config
+
+    load_env_config()
+    prom = PrometheusMetrics()
+    # Start a scrape interval early so the first call has a sample before it
+    prom.start_time = datetime.fromtimestamp(start_sec - slack, timezone.utc)
+    prom.end_time = datetime.fromtimestamp(end_sec + slack, timezone.utc)
+    return {metric: Series(samples) for metric, samples in prom.collect_series().items()}
+
+
+def _per_request_ms(series: Dict[str, Series], metric: str, end: float,
+                    slack: float, requests: Optional[float]) -> Optional[float]:
+    total = series.get(f"{metric}_sum")
+    if not total or not requests:
+        return None
+    increase = total.increase_at(end, slack)
+    return increase / requests * 1000 if increase is not None else None
+
+
+def join_call(obs, start_ns: int, end_ns: int, trace_start_ns: int, series: Dict[str, Series],
+              offset_sec: float = 0.0, slack: float = DEFAULT_SCRAPE_SLACK_SEC) -> LLMCallBreakdown:
+    """Break one LLM call down using the vLLM series around its window."""
+    start = start_ns / NS_PER_SEC + offset_sec
+    end = end_ns / NS_PER_SEC + offset_sec
+    call = LLMCallBreakdown(
+        id=obs.id, name=obs.name, model=obs.model,
+        offset_ms=(start_ns - trace_start_ns) / NS_PER_MS,
+        client_ms=(end_ns - start_ns) / NS_PER_MS,
+        input_tokens=obs.input_tokens, output_tokens=obs.output_tokens,
+    )
+
+    count = series.get(f"{E2E_METRIC}_count")
+    requests = count.increase_at(end, slack) if count else None
+    if requests is not None:
+        call.server_requests = int(round(requests))
+
+    for phase, metric in PHASES:
+        setattr(call, f"{phase}_ms", _per_request_ms(series, metric, end, slack, requests))
+    call.ttft_ms = _per_request_ms(series, TTFT_METRIC, end, slack, requests)
+    call.server_ms = _per_request_ms(series, E2E_METRIC, end, slack, requests)
+    if call.server_ms is None and call.decode_ms is not None:
+        call.server_ms = sum(getattr(call, f"{phase}_ms") or 0.0 for phase, _ in PHASES)
+    if call.server_ms is not None:
+        # Clamped: on intervals shared with other requests the per-request
+        # average can exceed this call's own latency
+        call.client_overhead_ms = max(call.client_ms - call.server_ms, 0.0)
+
+    for gauge, attribute in (("vllm:num_requests_waiting", "max_requests_waiting"),
+                             ("vllm:num_requests_running", "max_requests_running")):
+        samples = series.get(gauge)
+        if samples:
+            setattr(call, attribute, samples.max_between(start, end))
+
+    queries, hits = series.get("vllm:prefix_cache_queries_total"), series.get("vllm:prefix_cache_hits_total")
+    if queries and hits:
+        queried = queries.increase_at(end, slack)
+        hit = hits.increase_at(end, slack)
+        if queried and hit is not None:
+            call.prefix_cache_hit_percent = hit / queried * 100
+
+    parts = {phase: getattr(call, f"{phase}_ms") for phase, _ in PHASES}
+    parts["client"] = call.client_overhead_ms
+    parts = {k: v for k, v in parts.items() if v is not None}
+    if parts:
+        call.dominant = max(parts, key=parts.get)
+    return call
+
+
+def join_trace(observations: list, series: Dict[str, Series], offset_sec: float = 0.0,
+               slack: float = DEFAULT_SCRAPE_SLACK_SEC) -> Dict[str, object]:
+    """
+    Breaks down every LLM call of a trace (Observation records) against the
+    vLLM series. Returns the per-call breakdowns plus trace-level totals.
+    """
+    spans, _, roots = build_span_tree(observations)
+    if not spans:
+        return {"calls": [], "totals": {}}
+    trace_start = spans[select_root(spans, roots)][0]
+    llm_calls = sorted(((start, end, obs) for start, end, obs in spans.values()
+                        if span_category(obs) == "llm"), key=lambda c: (c[0], c[1]))
+    calls = [join_call(obs, start, end, trace_start, series, offset_sec, slack)
+             for start, end, obs in llm_calls]
+
+    totals = {"llm_calls": len(calls),
+              "matched_calls": sum(1 for c in calls if c.server_ms is not None),
+              "client_ms": sum(c.client_ms for c in calls)}
+    for key in ("queue_ms", "prefill_ms", "decode_ms", "server_ms", "client_overhead_ms"):
+        totals[key] = sum(getattr(c, key) or 0.0 for c in calls)
+    timeline = analyze_timeline(spans, roots)
+    if timeline:
+        totals["wall_time_ms"] = timeline["wall_time_ms"]
+        # Time outside any LLM call: tools, framework and idle time
+        totals["outside_llm_ms"] = timeline["wall_time_ms"] - timeline["llm_only_ms"] - timeline["overlap_ms"]
+    return {"calls": calls, "totals": totals}
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_join(result: Dict[str, object]) -> None:
+    calls, totals = result["calls"], result["totals"]
+    print("\n--- LLM Calls: Client vs vLLM Server Time (ms) ---")
+    print(f"{'#':>3} {'offset s':>9} {'client':>9} {'queue':>9} {'prefill':>9} {'decode':>9} "
+          f"{'overhead':>9} {'reqs':>4} {'wait':>4} {'cache%':>6}  dominant")
+    for index, call in enumerate(calls, 1):
+        waiting = f"{call.max_requests_waiting:4.0f}" if call.max_requests_waiting is not None else f"{'-':>4}"
+        cache = f"{call.prefix_cache_hit_percent:6.1f}" if call.prefix_cache_hit_percent is not None else f"{'-':>6}"
+        requests = f"{call.server_requests:4d}" if call.server_requests is not None else f"{'-':>4}"
+        print(f"{index:>3} {call.offset_ms / 1000:9.1f} {call.client_ms:9.1f} {_ms(call.queue_ms)} "
+              f"{_ms(call.prefill_ms)} {_ms(call.decode_ms)} {_ms(call.client_overhead_ms)} "
+              f"{requests} {waiting} {cache}  {call.dominant or '-'}")
+
+    if not totals:
+        print("No LLM calls found with valid timing data.")
+        return
+    print(f"\nMatched {totals['matched_calls']}/{totals['llm_calls']} LLM calls with vLLM requests")
+    client = totals["client_ms"]
+    for label, key in (("Queueing", "queue_ms"), ("Prefill", "prefill_ms"), ("Decode", "decode_ms"),
+                       ("Client/Network Overhead", "client_overhead_ms")):
+        share = totals[key] / client * 100 if client > 0 else 0.0
+        print(f"{label:<25} {totals[key]:.2f} ms ({share:.2f}% of LLM call time)")
+    if "wall_time_ms" in totals:
+        wall = totals["wall_time_ms"]
+        share = totals["outside_llm_ms"] / wall * 100 if wall > 0 else 0.0
+        print(f"{'Outside LLM Calls':<25} {totals['outside_llm_ms']:.2f} ms ({share:.2f}% of wall time)")
+    server, framework = totals["server_ms"], totals["client_overhead_ms"] + totals.get("outside_llm_ms", 0.0)
+    if totals["matched_calls"]:
+        verdict = "vLLM server" if server > framework else "agent framework, tools and network"
+        print(f"Most time spent in: {verdict} ({server:.2f} ms server vs {framework:.2f} ms elsewhere)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("observations", help="observations_dump.json of the run")
+    parser.add_argument("series", nargs="?", help="vllm_series_<timestamp>.json (default: query Prometheus)")
+    parser.add_argument("--offset", type=float, default=0.0,
+                        help="seconds to add to trace timestamps to match the Prometheus clock")
+    parser.add_argument("--slack", type=float, default=DEFAULT_SCRAPE_SLACK_SEC,
+                        help="how long after a call ends its completion may be scraped (seconds)")
+    parser.add_argument("--json", dest="output_json", help="also write the breakdown to this file")
+    args = parser.parse_args(argv)
+
+    observations = load_observations(args.observations)
+    if args.series:
+        series = load_series(args.series)
+    else:
+        times = [(o.start_ns, o.end_ns) for o in observations if o.start_ns is not None and o.end_ns is not None]
+        if not times:
+            print("No observations with valid timing data.")
+            return 1
+        start = min(t[0] for t in times) / NS_PER_SEC + args.offset
+        end = max(t[1] for t in times) / NS_PER_SEC + args.offset
+        series = fetch_series(start, end, args.slack)
+
+    result = join_trace(observations, series, args.offset, args.slack)
+    print_join(result)
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump({"calls": [asdict(c) for c in result["calls"]], "totals": result["totals"]}, f, indent=4)
+        print(f"[INFO] Breakdown saved to: {args.output_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
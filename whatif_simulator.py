@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+What-if simulator for agent traces.
+
+Re-schedules the span tree of a recorded trace under hypothetical changes and
+projects the end-to-end latency each change would give:
+
+- faster LLM decode (X% less decode time per call)
+- prompt caching (the re-sent history of each prompt skips prefill)
+- tool-result caching (repeated tool calls served from ToolResultCache)
+- parallel tools (independent, read-only tool calls between two LLM calls run at once)
+
+Every span keeps its dependency on the sibling that finished last before it
+started (or on its parent's start), and the framework time between the two,
+so only the changed spans and whatever waited on them move:
+
+    python whatif_simulator.py <dump.json | directory | glob> ... [--decode-speedup 50]
+"""
+
+import argparse
+import glob
+import heapq
+import os
+import sys
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Set
+
+from analyze_traces import (
+    NS_PER_MS,
+    NS_PER_SEC,
+    analyze_token_costs,
+    build_span_tree,
+    find_parallel_tool_batches,
+    load_observations,
+    model_spec,
+    select_root,
+    span_category,
+)
+from tool_cache import cached_tool_calls
+
+# Prefill throughput assumed for models without a prefill_tokens_per_sec spec
+DEFAULT_PREFILL_TOKENS_PER_SEC = 5000
+
+
+@dataclass
+class Scenario:
+    """A hypothetical change, applied to the spans of one trace."""
+    name: str
+    decode_speedup_percent: float = 0.0
+    prompt_caching: bool = False
+    cached_tools: bool = False
+    parallel_tools: bool = False
+
+
+DEFAULT_SCENARIOS = [
+    Scenario("decode 25% faster", decode_speedup_percent=25),
+    Scenario("decode 50% faster", decode_speedup_percent=50),
+    Scenario("prompt caching", prompt_caching=True),
+    Scenario("cached tools", cached_tools=True),
+    Scenario("parallel tools", parallel_tools=True),
+    Scenario("all of the above", decode_speedup_percent=50, prompt_caching=True,
+             cached_tools=True, parallel_tools=True),
+]
+
+
+class TraceModel:
+    """The span tree of a trace plus the per-span facts the scenarios need."""
+
+    def __init__(self, observations: list):
+        self.spans, self.children, self.roots = build_span_tree(observations)
+        self.root = select_root(self.spans, self.roots) if self.spans else None
+        self._cached_tools: Optional[Set[str]] = None
+        self._redundant_tokens: Optional[Dict[str, int]] = None
+        self._tool_batches: Optional[Dict[str, str]] = None
+
+    def cached_tools(self) -> Set[str]:
+        if self._cached_tools is None:
+            self._cached_tools = set(cached_tool_calls(self.spans))
+        return self._cached_tools
+
+    def redundant_tokens(self) -> Dict[str, int]:
+        if self._redundant_tokens is None:
+            costs = analyze_token_costs(self.spans)
+            self._redundant_tokens = {call['id']: call['redundant_prefill_tokens']
+                                      for call in (costs['calls'] if costs else [])}
+        return self._redundant_tokens
+
+    def tool_batches(self) -> Dict[str, str]:
+        """
+        Maps each tool call that could start together with an earlier sibling
+        to the first call of its batch (see find_parallel_tool_batches).
+        """
+        if self._tool_batches is None:
+            self._tool_batches = {call_id: batch[0]
+                                  for batch in find_parallel_tool_batches(self.spans, self.children)
+                                  for call_id in batch[1:]}
+        return self._tool_batches
+
+
+def _llm_duration_ns(model: TraceModel, obs, duration_ns: int, scenario: Scenario) -> int:
+    """Split an LLM call into prefill and decode, then apply the scenario to each."""
+    spec = model_spec(obs.model)
+    prefill_tps = spec['prefill_tokens_per_sec'] or DEFAULT_PREFILL_TOKENS_PER_SEC
+    prefill_ns = min(duration_ns, int((obs.input_tokens or 0) / prefill_tps * NS_PER_SEC))
+    decode_ns = duration_ns - prefill_ns
+    if scenario.prompt_caching and obs.input_tokens:
+        redundant = model.redundant_tokens().get(obs.id, 0)
+        prefill_ns = int(prefill_ns * (1 - redundant / obs.input_tokens))
+    decode_ns = int(decode_ns * (1 - scenario.decode_speedup_percent / 100))
+    return prefill_ns + decode_ns
+
+
+def span_duration_fn(model: TraceModel, scenario: Scenario) -> Callable[[str], Optional[int]]:
+    """New duration of a leaf-like span (LLM or tool call), or None to keep the schedule's own."""
+    cached = model.cached_tools() if scenario.cached_tools else set()
+
+    def duration(obs_id: str) -> Optional[int]:
+        start, end, obs = model.spans[obs_id]
+        category = span_category(obs)
+        if category == "llm":
+            return _llm_duration_ns(model, obs, end - start, scenario)
+        if category == "tool":
+            return 0 if obs_id in cached else end - start
+        return None
+
+    return duration
+
+
+def simulate(model: TraceModel, scenario: Scenario) -> int:
+    """Projected wall time (ns) of the trace's root span under a scenario."""
+    spans, children = model.spans, model.children
+    duration = span_duration_fn(model, scenario)
+    batches = model.tool_batches() if scenario.parallel_tools else {}
+    new_start: Dict[str, int] = {}
+    new_end: Dict[str, int] = {}
+
+    # Iterative post-order walk: a span's children are scheduled in start
+    # order, each after the siblings that had finished when it started. The
+    # framework gap after the last of them is kept.
+    root = model.root
+    new_start[root] = spans[root][0]
+    # (span id, next child index, unfinished siblings heap, latest finished
+    #  sibling, latest new end among finished siblings)
+    stack = [(root, 0, [], None, None)]
+    while stack:
+        span_id, index, pending, dependency, finished_end = stack.pop()
+        start, end, _ = spans[span_id]
+        child_ids = children.get(span_id, [])
+        if index < len(child_ids):
+            child_id = child_ids[index]
+            child_start = spans[child_id][0]
+            while pending and pending[0][0] <= child_start:
+                sibling_end, sibling_id = heapq.heappop(pending)
+                if dependency is None or sibling_end >= spans[dependency][1]:
+                    dependency = sibling_id
+                if finished_end is None or new_end[sibling_id] > finished_end:
+                    finished_end = new_end[sibling_id]
+            batch_first = batches.get(child_id)
+            if batch_first is not None:
+                new_start[child_id] = new_start[batch_first]
+            elif dependency is not None:
+                new_start[child_id] = finished_end + (child_start - spans[dependency][1])
+            else:
+                new_start[child_id] = new_start[span_id] + (child_start - start)
+            heapq.heappush(pending, (spans[child_id][1], child_id))
+            stack.append((span_id, index + 1, pending, dependency, finished_end))
+            stack.append((child_id, 0, [], None, None))
+            continue
+
+        own = duration(span_id)
+        if own is not None:
+            new_end[span_id] = new_start[span_id] + own
+        elif child_ids:
+            # Framework span: ends after its last child, plus its own tail time
+            last_child_end = max(spans[c][1] for c in child_ids)
+            new_end[span_id] = (max(new_end[c] for c in child_ids)
+                                + max(end - last_child_end, 0))
+        else:
+            new_end[span_id] = new_start[span_id] + (end - start)
+    return new_end[root] - new_start[root]
+
+
+def simulate_trace(json_path: str, scenarios: List[Scenario]) -> Optional[Dict[str, object]]:
+    """Projected E2E latency of one trace per scenario, or None if it has no timed spans."""
+    model = TraceModel(load_observations(json_path))
+    if model.root is None:
+        return None
+    baseline_ns = simulate(model, Scenario("baseline"))
+    results = []
+    for scenario in scenarios:
+        projected_ns = simulate(model, scenario)
+        results.append({
+            'scenario': scenario.name,
+            'projected_ms': projected_ns / NS_PER_MS,
+            'saved_ms': (baseline_ns - projected_ns) / NS_PER_MS,
+            'saved_percent': (baseline_ns - projected_ns) / baseline_ns * 100 if baseline_ns > 0 else 0.0,
+        })
+    return {'trace': json_path, 'baseline_ms': baseline_ns / NS_PER_MS, 'scenarios': results}
+
+
+def iter_trace_paths(paths: List[str]):
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, "**", "observations_*.json"), recursive=True)
+        else:
+            found = glob.glob(path)
+        yield from sorted(found)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="observation dumps, directories or globs")
+    parser.add_argument("--decode-speedup", type=float, action="append",
+                        help="decode speedup in percent to simulate (repeatable); the combined "
+                             "scenario uses the largest one")
+    args = parser.parse_args(argv)
+
+    scenarios = DEFAULT_SCENARIOS
+    if args.decode_speedup:
+        scenarios = [Scenario(f"decode {x:g}% faster", decode_speedup_percent=x) for x in args.decode_speedup]
+        scenarios += [s for s in DEFAULT_SCENARIOS if not s.decode_speedup_percent]
+        # "all of the above" with the largest requested speedup
+        scenarios.append(replace(DEFAULT_SCENARIOS[-1], decode_speedup_percent=max(args.decode_speedup)))
+
+    totals = {s.name: 0.0 for s in scenarios}
+    total_baseline = 0.0
+    for json_path in iter_trace_paths(args.paths):
+        result = simulate_trace(json_path, scenarios)
+        if result is None:
+            print(f"\n{json_path}: no spans with valid timing data")
+            continue
+        total_baseline += result['baseline_ms']
+        print(f"\n--- {json_path} ---")
+        print(f"{'Recorded E2E':<22} {result['baseline_ms'] / 1000:10.2f} s")
+        for entry in result['scenarios']:
+            totals[entry['scenario']] += entry['saved_ms']
+            print(f"{entry['scenario']:<22} {entry['projected_ms'] / 1000:10.2f} s "
+                  f"(-{entry['saved_ms'] / 1000:.2f} s, {entry['saved_percent']:.1f}%)")
+
+    if total_baseline > 0:
+        print("\n--- Changes Ranked by Total E2E Latency Saved ---")
+        for name, saved_ms in sorted(totals.items(), key=lambda t: t[1], reverse=True):
+            print(f"{name:<22} {saved_ms / 1000:10.2f} s ({saved_ms / total_baseline * 100:.1f}%)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())